@@ -0,0 +1,208 @@
+"""Computerized adaptive testing under the Rasch (1PL) model.
+
+Every question gets a difficulty b, seeded from its label (Easy -1,
+Medium 0, Hard 1). Response probabilities, their logs and the item
+information P(1 - P) are tabulated once per distinct b over a fixed
+ability grid, so updating the ability estimate after an answer is one
+pass over the grid and scoring a candidate is a table lookup.
+
+Questions are indexed per (category, type) by sorted distinct b. Under
+the Rasch model the most informative item is the one whose b is closest
+to the ability, found by bisect in each slot that still has category and
+type quota, so picking the next question never scans the bank.
+"""
+import math
+import random
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import chain
+
+from generation import GenerationError
+
+DIFFICULTY_PARAMETERS = {'Easy': -1.0, 'Medium': 0.0, 'Hard': 1.0}
+GRID = tuple(-4.0 + 0.1 * i for i in range(81))  # Ability grid, logits
+_LOG_PRIOR = tuple(-0.5 * theta * theta for theta in GRID)  # Standard normal, unnormalised
+_RANDOM_PROBES = 8
+
+
+def grid_index(theta):
+    return min(len(GRID) - 1, max(0, round((theta - GRID[0]) / 0.1)))
+
+
+class ItemTables:
+    """log P, log(1 - P) and information over GRID for one difficulty"""
+    __slots__ = ('log_p', 'log_q', 'information')
+
+    def __init__(self, b):
+        p = [1.0 / (1.0 + math.exp(b - theta)) for theta in GRID]
+        self.log_p = tuple(math.log(x) for x in p)
+        self.log_q = tuple(math.log(1.0 - x) for x in p)
+        self.information = tuple(x * (1.0 - x) for x in p)
+
+
+class AdaptiveIndex:
+    """Per (category, type) slot, its distinct difficulties in order and the questions of each"""
+
+    def __init__(self, store):
+        self.store = store
+        self.tables = {b: ItemTables(b) for b in set(DIFFICULTY_PARAMETERS.values())}
+        grouped = {}
+        for q in store.questions:
+            b = DIFFICULTY_PARAMETERS.get(q.difficulty)
+            if b is not None:
+                grouped.setdefault((q.category, q.type), {}).setdefault(b, []).append(q.index)
+        self.slots = {
+            key: (tuple(sorted(by_b)), tuple(tuple(by_b[b]) for b in sorted(by_b)))
+            for key, by_b in grouped.items()
+        }  # (category, type) -> (sorted b values, positions per b)
+
+
+class AdaptiveSession:
+    """One student's adaptive test: quotas left, questions seen and the ability likelihood"""
+    __slots__ = ('version', 'total', 'remaining', 'log_likelihood', 'seen', 'seen_per_group',
+                 'pending', 'answered')
+
+    def __init__(self, version, total, category_counts, type_counts):
+        self.version = version
+        self.total = total
+        self.remaining = {'category': dict(category_counts), 'type': dict(type_counts)}
+        self.log_likelihood = list(_LOG_PRIOR)
+        self.seen = set()  # Store positions served in this test
+        self.seen_per_group = {}  # (slot, b index) -> count served
+        self.pending = None  # Position of the question awaiting an answer
+        self.answered = 0
+
+    def ability(self):
+        """Posterior mean and standard deviation of the ability (EAP)"""
+        top = max(self.log_likelihood)
+        weights = [math.exp(x - top) for x in self.log_likelihood]
+        total = sum(weights)
+        mean = sum(w * theta for w, theta in zip(weights, GRID)) / total
+        variance = sum(w * (theta - mean) ** 2 for w, theta in zip(weights, GRID)) / total
+        return mean, math.sqrt(variance)
+
+    def record_answer(self, tables, correct):
+        column = tables.log_p if correct else tables.log_q
+        self.log_likelihood = [x + y for x, y in zip(self.log_likelihood, column)]
+        self.answered += 1
+        self.pending = None
+
+
+class AdaptiveEngine:
+    """Adaptive sessions per user over per-bank-version indexes, both bounded LRUs"""
+
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._indexes = OrderedDict()  # bank version -> AdaptiveIndex, a few banks at most
+        self._sessions = OrderedDict()  # user_key -> AdaptiveSession
+        self._lock = threading.Lock()
+
+    def index(self, store):
+        with self._lock:
+            index = self._indexes.get(store.version)
+            if index is not None and index.store is store:
+                self._indexes.move_to_end(store.version)
+                return index
+        index = AdaptiveIndex(store)
+        with self._lock:
+            self._indexes[store.version] = index
+            while len(self._indexes) > 8:
+                self._indexes.popitem(last=False)
+        return index
+
+    def start(self, user_key, store, data):
+        """New session from the request's quotas, replacing any earlier one"""
+        if not all(field in data for field in ('total_questions', 'category_counts', 'type_counts')):
+            raise GenerationError("Missing required parameters")
+        try:
+            total = int(data['total_questions'])
+        except (TypeError, ValueError):
+            raise GenerationError("total_questions must be an integer")
+        category_counts, type_counts = data['category_counts'], data['type_counts']
+        if not isinstance(category_counts, dict) or not isinstance(type_counts, dict):
+            raise GenerationError("category_counts and type_counts must be objects")
+        if not all(isinstance(n, int) and n >= 0 for n in chain(category_counts.values(), type_counts.values())):
+            raise GenerationError("Quota counts must be non-negative integers")
+        if total <= 0 or sum(category_counts.values()) != total or sum(type_counts.values()) != total:
+            raise GenerationError("Quota sums must match total questions")
+        session = AdaptiveSession(store.version, total, category_counts, type_counts)
+        with self._lock:
+            self._sessions[user_key] = session
+            self._sessions.move_to_end(user_key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def session(self, user_key, store):
+        with self._lock:
+            session = self._sessions.get(user_key)
+            if session is not None:
+                self._sessions.move_to_end(user_key)
+        if session is None:
+            raise GenerationError("No adaptive test in progress, send the quotas to start one", 409)
+        if session.version != store.version:
+            raise GenerationError("The question bank changed, start a new adaptive test", 409)
+        return session
+
+    def answer(self, session, store, question_id, correct):
+        """Update the ability estimate with the answer to the pending question"""
+        if session.pending is None or store.questions[session.pending].id != question_id:
+            raise GenerationError("Answer does not match the question awaiting an answer", 409)
+        q = store.questions[session.pending]
+        session.record_answer(self.index(store).tables[DIFFICULTY_PARAMETERS[q.difficulty]], correct)
+
+    def next_question(self, session, store, rng=random):
+        """Most informative unseen question within the quotas, None when the test is over"""
+        if session.pending is not None:
+            return store.questions[session.pending]  # Unanswered, serve it again
+        if session.answered >= session.total:
+            return None
+        index = self.index(store)
+        point = grid_index(session.ability()[0])
+        theta = GRID[point]
+        remaining = session.remaining
+        best, best_key = None, None
+        for slot, (bs, members) in index.slots.items():
+            category, q_type = slot
+            if remaining['category'].get(category, 0) <= 0 or remaining['type'].get(q_type, 0) <= 0:
+                continue
+            # Closest b first, stepping outwards past difficulties this student exhausted
+            right = bisect_left(bs, theta)
+            left = right - 1
+            while left >= 0 or right < len(bs):
+                if right >= len(bs) or (left >= 0 and theta - bs[left] <= bs[right] - theta):
+                    i, left = left, left - 1
+                else:
+                    i, right = right, right + 1
+                if session.seen_per_group.get((slot, i), 0) < len(members[i]):
+                    key = (index.tables[bs[i]].information[point],
+                           remaining['category'][category] + remaining['type'][q_type], rng.random())
+                    if best_key is None or key > best_key:
+                        best, best_key = (slot, i), key
+                    break
+        if best is None:
+            return None
+        slot, i = best
+        position = self._unseen(session, index.slots[slot][1][i], rng)
+        session.seen.add(position)
+        session.seen_per_group[best] = session.seen_per_group.get(best, 0) + 1
+        q = store.questions[position]
+        remaining['category'][q.category] -= 1
+        remaining['type'][q.type] -= 1
+        session.pending = position
+        return q
+
+    @staticmethod
+    def _unseen(session, positions, rng):
+        # Random probes are O(1) while most are unseen, the scan only runs once a group is nearly used up
+        for _ in range(_RANDOM_PROBES):
+            position = positions[int(rng.random() * len(positions))]
+            if position not in session.seen:
+                return position
+        start = int(rng.random() * len(positions))
+        for offset in range(len(positions)):
+            position = positions[(start + offset) % len(positions)]
+            if position not in session.seen:
+                return position
+        raise RuntimeError("Question group counted as open but fully seen")
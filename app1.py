@@ -1,391 +1,587 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
-import pandas as pd
-import random
+import atexit
+import hmac
+import math
 import os
-from collections import defaultdict
 import secrets
+import threading
+from collections import OrderedDict
+from question_store import QuestionStore
+from question_loader import parse_questions_csv
+from question_import import ERROR_REPORT_SUFFIX, import_questions
+from generation import GenerationCache, GenerationError, TestSpec, candidate_pool, generate
+from progress_store import create_progress_store
+from reloader import QuestionReloader
+from form_pool import FormPools
+from paraphrases import ANY_STYLE, ParaphraseIndex, VariantChooser
+from bank_registry import BankRegistry, parse_bank_sources
+from static_assets import PageCache, StaticAssets
+from exposure import ExposureCounters
+from adaptive import AdaptiveEngine
+from question_search import DEFAULT_LIMIT, FACETS, MAX_LIMIT, SearchIndexBuilder, decode_cursor, encode_cursor
+import bank_cache
+import vector_select
+from near_duplicates import clusters_path_for, load_clusters, update_clusters
+import metrics
+import responses
+from attempt_log import Attempt, AttemptLog
+from retest_scheduler import RetestScheduler
 
 # Configuration
-CSV_FILE_PATH = 'questions.csv'
-TOTAL_QUESTION_BANK_SIZE = 102  # Added constant for total question bank size
-df_questions = pd.DataFrame()
+CSV_FILE_PATH = os.environ.get('QUESTIONS_CSV', 'questions.csv')
+QUESTIONS_WATCH_INTERVAL = float(os.environ.get('QUESTIONS_WATCH_INTERVAL', 0))  # Seconds, 0 disables the watcher
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # Required by admin endpoints
+USE_QUESTION_CACHE = os.environ.get('QUESTION_CACHE', '1') != '0'  # Compiled bank next to the CSV
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.8))  # 0 allows near-duplicates in a test
+# Cluster at load when near_duplicates.py --write hasn't saved clusters for this bank version, slow on large banks
+NEAR_DUPLICATE_BUILD = os.environ.get('NEAR_DUPLICATE_BUILD', '0') != '0'
+VECTORIZED_SELECTION = os.environ.get('VECTORIZED_SELECTION', '1') != '0'  # Needs numpy, else pure Python
+PROGRESS_STORE = os.environ.get('PROGRESS_STORE', 'memory')  # 'memory' or 'sqlite:<path>'
+DEFAULT_BANK = os.environ.get('DEFAULT_BANK', 'default')  # Name of the QUESTIONS_CSV bank
+# More banks served at /api/<bank>/..., e.g. "golf=templatemo_587_tiya_golf_club/questions.csv"
+QUESTION_BANKS = os.environ.get('QUESTION_BANKS', '')
+QUESTION_BANK_MEMORY_MB = float(os.environ.get('QUESTION_BANK_MEMORY_MB', 512))  # Budget for lazily loaded banks
+ATTEMPT_LOG_PATH = os.environ.get('ATTEMPT_LOG', 'attempts.db')  # Empty keeps attempts in memory only
+MAX_ATTEMPTS_PER_SUBMIT = 1000
+MAX_STUDENTS_PER_BATCH = 1000
+FORM_POOL_DIR = os.environ.get('FORM_POOL_DIR', 'form_pools')  # Written by form_pool.py
+FORM_POOL_WORKERS = int(os.environ.get('FORM_POOL_WORKERS', 0)) or None  # Refill processes, CPU count by default
+# (original, paraphrase, style) rows for paraphrase_style requests, empty disables them
+PARAPHRASE_CSV = os.environ.get('PARAPHRASE_CSV', '')
+GENERATION_CACHE_SIZE = int(os.environ.get('GENERATION_CACHE_SIZE', 1024))  # Memoised seeded tests
+# Sympson-Hetter cap on the share of tests a question appears in, 0 disables exposure control
+EXPOSURE_MAX_RATE = float(os.environ.get('EXPOSURE_MAX_RATE', 0))
+ADAPTIVE_SESSIONS = int(os.environ.get('ADAPTIVE_SESSIONS', 10000))  # Adaptive tests kept in memory
+SEARCH_INDEX = os.environ.get('SEARCH_INDEX', '1') != '0'  # Inverted index behind /api/questions/search, built on first use
+ASSET_DIR = os.environ.get('ASSET_DIR', 'static_build')  # Written by static_assets.py, plain /static without it
+question_store = QuestionStore()
+progress_store = create_progress_store(PROGRESS_STORE)
+retest_scheduler = RetestScheduler()
+# Replaying the log on startup also rebuilds every user's retest schedule
+attempt_log = AttemptLog(ATTEMPT_LOG_PATH or None, on_attempt=retest_scheduler.record)
+atexit.register(attempt_log.close)  # The writer is a daemon thread, write what is still queued
+bank_payloads = OrderedDict()  # Bank name -> BankPayload, a few recently used banks
+bank_payloads_lock = threading.Lock()
+generation_cache = GenerationCache(GENERATION_CACHE_SIZE)
+search_index_builders = {}  # Source path -> SearchIndexBuilder
+search_index_lock = threading.Lock()
+adaptive_engine = AdaptiveEngine(ADAPTIVE_SESSIONS)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes during development
-app.secret_key = secrets.token_hex(16)  # Generate a random secret key for sessions
+# Set SECRET_KEY so session ids (and their saved progress) survive restarts
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(16)
+static_assets = StaticAssets(ASSET_DIR)
+static_assets.refresh()
+page_cache = PageCache(static_assets, os.path.join(app.root_path, app.template_folder))
+
+@app.context_processor
+def asset_urls():
+    """Templates' url_for('static', ...) points at the fingerprinted copies"""
+    return {'url_for': static_assets.url_for}
+
+def load_question_store(path):
+    """Load the bank and its selection indexes: encoded arrays and near-duplicate clusters"""
+    store = read_question_store(path)
+    if VECTORIZED_SELECTION:
+        store.vector_index = vector_select.build_index(store)
+    if NEAR_DUPLICATE_THRESHOLD > 0:
+        store.duplicates = load_duplicate_clusters(path, store)
+    builder = search_index_builders.get(path)
+    if SEARCH_INDEX and builder is not None and builder.warm:
+        # The previous version was searched, rebuild now while its tokens can be reused
+        store.search_index = builder.build(store)
+    if EXPOSURE_MAX_RATE > 0 and store:
+        # Shared by every worker serving this bank version
+        store.exposure = ExposureCounters.attach(store, EXPOSURE_MAX_RATE)
+    return store
+
+def load_duplicate_clusters(path, store):
+    """Near-duplicate clusters saved offline for this bank version, mapped and shared between workers"""
+    clusters = load_clusters(clusters_path_for(path), store, NEAR_DUPLICATE_THRESHOLD)
+    if clusters is None and NEAR_DUPLICATE_BUILD:
+        try:
+            clusters = update_clusters(path, store, NEAR_DUPLICATE_THRESHOLD)
+        except OSError as e:
+            print(f"Could not write near-duplicate clusters: {str(e)}")
+    if clusters is None:
+        print(f"No near-duplicate clusters for this version of {path}, "
+              f"run python near_duplicates.py {path} --write")
+    elif clusters:
+        print(f"Found {len(clusters)} near-duplicate clusters in {path}")
+    return clusters
+
+def bank_search_index(bank, store):
+    """The store's search index, built by the bank's first search"""
+    if not SEARCH_INDEX:
+        raise GenerationError("Search is not available", 503)
+    index = store.search_index
+    if index is None:
+        with search_index_lock:
+            index = store.search_index
+            if index is None:
+                builder = search_index_builders.setdefault(bank_registry.path(bank), SearchIndexBuilder())
+                index = store.search_index = builder.build(store)
+                bank_registry.check_budget(bank)
+    return index
+
+def read_question_store(path):
+    """Map the compiled bank cache when it is fresh, otherwise parse the CSV and rebuild it"""
+    if not USE_QUESTION_CACHE:
+        return parse_questions_csv(path)
+    try:
+        store = bank_cache.load_cache(path)
+        if store is not None:
+            return store
+    except Exception as e:
+        print(f"Ignoring unreadable question cache: {str(e)}")
+    try:
+        store = parse_questions_csv(path)
+    except ValueError as e:
+        # A few bad rows shouldn't take the whole bank down, serve the valid ones
+        print(f"{str(e)}, importing valid rows only")
+        report = import_questions(path, error_report=path + ERROR_REPORT_SUFFIX)
+        print(f"{report.summary()}, rejected rows are listed in {path + ERROR_REPORT_SUFFIX}")
+        # The cache is marked incomplete, so the next startup imports and reports again
+        store = bank_cache.load_cache(path, allow_incomplete=True) if report.imported else None
+        if store is None:
+            raise
+        return store
+    try:
+        bank_cache.write_cache(path, store)
+    except OSError as e:
+        print(f"Could not write question cache: {str(e)}")
+    return store
 
 def load_questions_from_csv():
     """Load questions from CSV with robust error handling"""
-    global df_questions
+    global question_store
     try:
-        if not os.path.exists(CSV_FILE_PATH):
-            raise FileNotFoundError(f"CSV file not found at {CSV_FILE_PATH}")
-        
-        df = pd.read_csv(CSV_FILE_PATH)
-        
-        # Validate required columns
-        required_columns = ['id', 'question', 'category', 'difficulty', 'type']
-        if not all(col in df.columns for col in required_columns):
-            missing = [col for col in required_columns if col not in df.columns]
-            raise ValueError(f"Missing required columns: {missing}")
-        
-        # Clean and standardize data
-        df['category'] = df['category'].astype(str).str.upper().str.strip()
-        df['difficulty'] = df['difficulty'].astype(str).str.capitalize().str.strip()
-        df['type'] = df['type'].astype(str).str.strip()
-        
-        # Validate values
-        valid_difficulties = ['Easy', 'Medium', 'Hard']
-        invalid_diffs = df[~df['difficulty'].isin(valid_difficulties)]
-        if not invalid_diffs.empty:
-            raise ValueError(f"Invalid difficulty values: {invalid_diffs['difficulty'].unique()}")
-        
-        df_questions = df
-        print(f"Successfully loaded {len(df)} questions")
+        question_store = load_question_store(CSV_FILE_PATH)
+        print(f"Successfully loaded {len(question_store)} questions")
         return True
         
     except Exception as e:
         print(f"Error loading CSV: {str(e)}")
-        df_questions = pd.DataFrame(columns=required_columns)
+        question_store = QuestionStore()
+        return False
+
+def reload_questions_from_csv():
+    """Re-parse the CSV and swap the store in, keeping the old bank on failure"""
+    global question_store
+    try:
+        new_store = load_question_store(CSV_FILE_PATH)
+    except Exception as e:
+        print(f"Error reloading CSV, keeping {len(question_store)} loaded questions: {str(e)}")
         return False
+    # A single reference swap, requests that already grabbed the old store keep using it
+    old_store, question_store = question_store, new_store
+    if old_store.exposure is not None and old_store.version != new_store.version:
+        # No worker attaches to the old version again, free its shared memory
+        old_store.exposure.unlink_segment()
+    print(f"Reloaded {len(new_store)} questions")
+    return True
 
 # Load questions when starting
 if not load_questions_from_csv():
     print("Warning: Starting with empty question bank")
 
+question_reloader = QuestionReloader(CSV_FILE_PATH, reload_questions_from_csv)
+if QUESTIONS_WATCH_INTERVAL > 0:
+    question_reloader.watch(QUESTIONS_WATCH_INTERVAL)
+
+# Pregenerated forms for the default bank, refilled in the background. Refills
+# map the clusters file load_question_store found or wrote, never build their own
+form_pools = FormPools(FORM_POOL_DIR, CSV_FILE_PATH, FORM_POOL_WORKERS, threshold=NEAR_DUPLICATE_THRESHOLD)
+if form_pools.load():
+    print(f"Loaded form pools: {form_pools.sizes()}")
+
+# Paraphrase variants, indexed once and looked up per store position
+variant_chooser = None
+if PARAPHRASE_CSV:
+    try:
+        paraphrase_index = ParaphraseIndex.from_csv(PARAPHRASE_CSV)
+        matched = paraphrase_index.matches(question_store)
+        if matched:
+            variant_chooser = VariantChooser(paraphrase_index)
+            print(f"Loaded {len(paraphrase_index)} paraphrases in styles {paraphrase_index.style_names} "
+                  f"for {matched} questions")
+        else:
+            print(f"Paraphrases disabled: {PARAPHRASE_CSV} has no variants of the questions in {CSV_FILE_PATH}")
+    except Exception as e:
+        print(f"Paraphrases disabled: {str(e)}")
+
+# Other banks load on first use and share one memory budget
+bank_registry = BankRegistry(load_question_store, int(QUESTION_BANK_MEMORY_MB * 1024 * 1024))
+bank_registry.pin(DEFAULT_BANK, CSV_FILE_PATH, lambda: question_store)
+for bank_name, bank_path in parse_bank_sources(QUESTION_BANKS).items():
+    bank_registry.register(bank_name, bank_path)
+
+def get_session_id():
+    """Return the id keying this browser's progress, only the id lives in the cookie"""
+    if 'sid' not in session:
+        session['sid'] = secrets.token_hex(16)
+    return session['sid']
+
+def bank_user_key(bank, user_key):
+    """Progress and retests are per bank, the default bank keeps the unprefixed keys"""
+    return user_key if bank == DEFAULT_BANK else f"bank:{bank}:{user_key}"
+
 @app.route('/')
 def index():
-    # Initialize session variables if they don't exist
-    if 'used_question_ids' not in session:
-        session['used_question_ids'] = []  # Store as list instead of set
-    if 'question_bank_exhausted' not in session:
-        session['question_bank_exhausted'] = False
-    return render_template('index.html')
+    get_session_id()
+    return page_cache.response('index.html')
 
 @app.route('/test.html')
 def test():
-    return render_template('test.html')
+    return page_cache.response('test.html')
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted static files, cacheable forever since the name changes with the content"""
+    response = static_assets.response(filename)
+    if response is None:
+        return jsonify({"error": "Asset not found"}), 404
+    return response
+
+def is_admin():
+    """True when the request carries the admin token, compared in constant time"""
+    token = request.headers.get('X-Admin-Token')
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+@app.route('/api/admin/reload-questions', methods=['POST'])
+def reload_questions():
+    """Re-parse questions.csv in the background and swap it in when valid"""
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    started = question_reloader.trigger()
+    return jsonify({
+        "reloading": True,
+        "already_running": not started,
+        "questions_loaded": len(question_store)
+    }), 202
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage timings and counters in the Prometheus text format, of this worker process only"""
+    return Response(metrics.registry.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/questions/bank')
+def question_bank():
+    """Every question of a bank, for clients using compact test responses.
+
+    The optional bank query parameter selects the bank, like the
+    /api/<bank>/questions/bank route. The ETag is the bank version, so
+    clients revalidate with If-None-Match and only download the bank again
+    after it changed.
+    """
+    return serve_bank_payload(request.args.get('bank', DEFAULT_BANK))
+
+@app.route('/api/<bank>/questions/bank')
+def named_question_bank(bank):
+    """Every question of a named bank, matching the bank_version of its compact tests"""
+    return serve_bank_payload(bank)
+
+def serve_bank_payload(bank):
+    try:
+        store = bank_store(bank)
+    except GenerationError as e:
+        return jsonify({"error": e.message}), e.status
+    with bank_payloads_lock:
+        payload = bank_payloads.get(bank)
+        if payload is None:
+            payload = bank_payloads[bank] = responses.BankPayload()
+        bank_payloads.move_to_end(bank)
+        while len(bank_payloads) > 4:
+            bank_payloads.popitem(last=False)
+    return payload.response(store)
+
+@app.route('/api/questions/search')
+def search_questions():
+    """Search the bank by text with category, difficulty and type filters.
+
+    q takes words, word* prefixes and "quoted phrases", all of which must
+    match. category, difficulty and type may repeat, values of one filter
+    are alternatives. Results come in bank order, limit at a time, pass
+    next_cursor back as cursor for the following page. facets count the
+    matches per value of each filter.
+    """
+    try:
+        bank = request.args.get('bank', DEFAULT_BANK)
+        store = bank_store(bank)
+        try:
+            limit = int(request.args.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise GenerationError("limit must be an integer")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise GenerationError(f"limit must be between 1 and {MAX_LIMIT}")
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor, store.version) if cursor else -1
+        filters = {name: request.args.getlist(name) for name in FACETS}
+        result = bank_search_index(bank, store).search(request.args.get('q', ''), filters, limit, after)
+    except GenerationError as e:
+        return jsonify({"error": e.message}), e.status
+    next_after = result['next_after']
+    return responses.json_response({
+        'total': result['total'],
+        'questions': [{
+            'id': q.id,
+            'question': q.question,
+            'category': q.category,
+            'difficulty': q.difficulty,
+            'type': q.type
+        } for q in result['questions']],
+        'facets': result['facets'],
+        'next_cursor': encode_cursor(store.version, next_after) if next_after is not None else None,
+        'version': store.version
+    })
+
+@app.route('/api/banks')
+def list_banks():
+    """Registered question banks and the size of those currently loaded"""
+    return jsonify({"default": DEFAULT_BANK, "banks": bank_registry.describe()})
 
 @app.route('/api/generate-test', methods=['POST'])
+@metrics.timed_request(metrics.REQUEST_SECONDS)
 def generate_test():
     """Generate test with partial fulfillment and proper reset logic"""
+    return generate_from_bank(DEFAULT_BANK)
+
+@app.route('/api/<bank>/generate-test', methods=['POST'])
+@metrics.timed_request(metrics.REQUEST_SECONDS)
+def generate_bank_test(bank):
+    """Generate a test from a named question bank, loading it on first use"""
+    return generate_from_bank(bank)
+
+def bank_store(bank):
+    """Loaded store of a bank, raises GenerationError when it can't serve tests"""
+    if bank not in bank_registry:
+        raise GenerationError(f"Unknown question bank '{bank}'", 404)
     try:
-        if df_questions.empty:
-            return jsonify({"error": "No questions available"}), 503
+        store = bank_registry.get(bank)
+    except Exception as e:
+        print(f"Error loading question bank '{bank}': {str(e)}")
+        store = None
+    if not store:
+        raise GenerationError("No questions available", 503)
+    return store
 
-        # Initialize session variables if they don't exist
-        if 'used_question_ids' not in session:
-            session['used_question_ids'] = []
-        if 'question_bank_exhausted' not in session:
-            session['question_bank_exhausted'] = False
+def check_paraphrase_style(spec):
+    style = spec.paraphrase_style
+    if style and variant_chooser is None:
+        raise GenerationError("Paraphrases are not available", 503)
+    if style and style != ANY_STYLE and style not in variant_chooser.index.style_names:
+        raise GenerationError(f"Unknown paraphrase_style '{style}'")
 
-        data = request.get_json()
-        
-        # Validate input
-        required_fields = ['total_questions', 'category_counts', 
-                         'difficulty_counts', 'type_counts']
-        if not all(field in data for field in required_fields):
-            return jsonify({"error": "Missing required parameters"}), 400
-
-        total_requested = int(data['total_questions'])
-        requested_cats = data['category_counts']
-        requested_diffs = data['difficulty_counts']
-        requested_types = data['type_counts']
-        client_used_ids = set(data.get('used_question_ids', []))
-        force_include_ids = set(data.get('force_include_ids', []))  # Wrong answers to retest
-
-        # Convert session list to set for operations
-        server_used_ids = set(session['used_question_ids'])
-        
-        # Combine client and server used IDs
-        all_used_ids = server_used_ids.union(client_used_ids)
-        
-        # Calculate remaining questions
-        remaining_questions = TOTAL_QUESTION_BANK_SIZE - len(all_used_ids)
-        
-        # Check if we need to serve partial batch
-        serve_partial_batch = False
-        if 0 < remaining_questions < total_requested:
-            serve_partial_batch = True
-            total_requested = remaining_questions
-            print(f"Serving partial batch of {remaining_questions} questions")
-
-        # Verify quota sums match total (only if not serving partial batch)
-        if not serve_partial_batch and (
-            sum(requested_cats.values()) != total_requested or 
-            sum(requested_diffs.values()) != total_requested or
-            sum(requested_types.values()) != total_requested
-        ):
-            return jsonify({"error": "Quota sums must match total questions"}), 400
-
-        # Get available questions (not used yet, plus forced includes)
-        available_questions = [
-            q for q in df_questions.to_dict('records') 
-            if (q['id'] not in all_used_ids) or (q['id'] in force_include_ids)
-        ]
-        
-        # Check if we need to reset due to exhaustion
-        reset_question_bank = False
-        reset_message = ""
-        if len(available_questions) < total_requested:
-            reset_question_bank = True
-            reset_message = "Question bank exhausted. All questions have been reset."
-            available_questions = df_questions.to_dict('records')  # Use all questions
-            all_used_ids = set()  # Reset tracking
-            session['used_question_ids'] = []
-            session['question_bank_exhausted'] = True
-        
-        # Initialize selection process
-        selected = []
-        remaining_quotas = {
-            'category': requested_cats.copy(),
-            'difficulty': requested_diffs.copy(),
-            'type': requested_types.copy()
-        }
-        random.shuffle(available_questions)  # Shuffle available questions
+def used_question_ids(store, user_key):
+    # Server-side progress keeps used questions as a bitmap over store positions
+    progress = progress_store.load(user_key, store)
+    return {store.questions[i].id for i in progress.used if i < len(store)}
 
-        # Track actual counts and substitutions
-        actual_counts = {
-            'category': defaultdict(int),
-            'difficulty': defaultdict(int),
-            'type': defaultdict(int)
-        }
-        substitutions = {
-            'category': defaultdict(list),
-            'difficulty': defaultdict(list),
-            'type': defaultdict(list)
-        }
-        
-        # First pass: select questions that match all criteria
-        for q in available_questions:
-            if len(selected) >= total_requested:
-                break
-                
-            # Force include wrong answers
-            if q['id'] in force_include_ids and q['id'] not in [s['id'] for s in selected]:
-                selected.append(q)
-                if q['category'] in remaining_quotas['category']:
-                    remaining_quotas['category'][q['category']] -= 1
-                    actual_counts['category'][q['category']] += 1
-                if q['difficulty'] in remaining_quotas['difficulty']:
-                    remaining_quotas['difficulty'][q['difficulty']] -= 1
-                    actual_counts['difficulty'][q['difficulty']] += 1
-                if q['type'] in remaining_quotas['type']:
-                    remaining_quotas['type'][q['type']] -= 1
-                    actual_counts['type'][q['type']] += 1
-                session['used_question_ids'].append(q['id'])
+def generate_for_user(store, bank, spec, user_key, server_used_ids, clock):
+    """Select one test for user_key, the CPU-bound part of a request"""
+    return generate(store, spec, server_used_ids, clock,
+                    retest_ids=retest_scheduler.due(user_key), cache=generation_cache,
+                    forms=form_pools if bank == DEFAULT_BANK else None)
+
+def finish_test(store, spec, result, user_key, clock):
+    """Record the served questions as used and return the response body"""
+    progress_store.record(user_key, store, (q.index for q in result.selected), reset=result.reset)
+    if store.exposure is not None:
+        store.exposure.record(q.index for q in result.selected)
+    clock.lap('progress_update')
+    response = result.response
+    if spec.paraphrase_style:
+        # Keyed on the user so retakes show the same wording
+        response = variant_chooser.apply(store, response, result.selected, user_key,
+                                         spec.paraphrase_style)
+        clock.lap('paraphrase')
+    return response
+
+def generate_from_bank(bank):
+    try:
+        clock = metrics.StageClock()
+        store = bank_store(bank)  # Keep one snapshot for the whole request
+        user_key = bank_user_key(bank, get_session_id())
+        spec = TestSpec.from_json(request.get_json())
+        check_paraphrase_style(spec)
+
+        result = generate_for_user(store, bank, spec, user_key, used_question_ids(store, user_key), clock)
+        response = finish_test(store, spec, result, user_key, clock)
+        payload = responses.json_response(response)
+        clock.lap('serialization')
+        return payload
+
+    except GenerationError as e:
+        return jsonify({"error": e.message}), e.status
+    except Exception:
+        metrics.ERRORS.inc()
+        app.logger.exception("Error generating test")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/generate-tests', methods=['POST'])
+@metrics.timed_request(metrics.REQUEST_SECONDS)
+def generate_tests():
+    """Generate one test per student in a single streamed NDJSON response.
+
+    Body: the generate-test quota parameters plus "student_ids", an
+    optional "bank" and an optional "no_adjacent_overlap" flag. Each output
+    line is one student's test, progress is tracked server-side per
+    student id.
+    """
+    data = request.get_json(silent=True)
+    try:
+        spec = TestSpec.from_json(data)
+        check_paraphrase_style(spec)
+        bank = data.get('bank', DEFAULT_BANK)
+        store = bank_store(bank)  # One snapshot for the whole batch
+    except GenerationError as e:
+        return jsonify({"error": e.message}), e.status
+    student_ids = data.get('student_ids')
+    if not isinstance(student_ids, list) or not student_ids:
+        return jsonify({"error": "student_ids must be a non-empty list"}), 400
+    if len(student_ids) > MAX_STUDENTS_PER_BATCH:
+        return jsonify({"error": f"At most {MAX_STUDENTS_PER_BATCH} student_ids per request"}), 413
+    no_adjacent_overlap = bool(data.get('no_adjacent_overlap', False))
+
+    def stream():
+        # The Python selector walks the same bucket pool for every student,
+        # vectorised selection works on the store's encoded arrays instead
+        pool = candidate_pool(store, spec) if store.vector_index is None else None
+        previous_ids = ()
+        for student_id in student_ids:
+            clock = metrics.StageClock()
+            key = bank_user_key(bank, f"student:{student_id}")
+            server_used_ids = used_question_ids(store, key)
+            try:
+                result = generate(store, spec, server_used_ids, clock, pool=pool,
+                                  avoid_ids=previous_ids if no_adjacent_overlap else (),
+                                  retest_ids=retest_scheduler.due(key), cache=generation_cache)
+            except GenerationError as e:
+                yield responses.dumps({'student_id': student_id, 'error': e.message}) + b'\n'
                 continue
-                
-            # Check if this question matches all remaining quotas
-            matches_all = (
-                q['category'] in remaining_quotas['category'] and 
-                remaining_quotas['category'][q['category']] > 0 and
-                q['difficulty'] in remaining_quotas['difficulty'] and 
-                remaining_quotas['difficulty'][q['difficulty']] > 0 and
-                q['type'] in remaining_quotas['type'] and 
-                remaining_quotas['type'][q['type']] > 0
-            )
-            
-            if matches_all:
-                selected.append(q)
-                remaining_quotas['category'][q['category']] -= 1
-                remaining_quotas['difficulty'][q['difficulty']] -= 1
-                remaining_quotas['type'][q['type']] -= 1
-                actual_counts['category'][q['category']] += 1
-                actual_counts['difficulty'][q['difficulty']] += 1
-                actual_counts['type'][q['type']] += 1
-                session['used_question_ids'].append(q['id'])
-
-        # Special handling for Medium difficulty substitutions
-        if remaining_quotas['difficulty'].get('Medium', 0) > 0:
-            # Try to fulfill Medium requests with Hard questions first
-            for q in available_questions:
-                if len(selected) >= total_requested:
-                    break
-                if q['id'] in [s['id'] for s in selected]:
-                    continue
-                    
-                if (q['difficulty'] == 'Hard' and 
-                    remaining_quotas['difficulty'].get('Medium', 0) > 0 and
-                    q['category'] in remaining_quotas['category'] and 
-                    remaining_quotas['category'][q['category']] > 0 and
-                    q['type'] in remaining_quotas['type'] and 
-                    remaining_quotas['type'][q['type']] > 0):
-                    
-                    selected.append(q)
-                    remaining_quotas['difficulty']['Medium'] -= 1
-                    actual_counts['difficulty']['Hard'] += 1
-                    substitutions['difficulty']['Medium'].append('Hard')
-                    # Update other quotas
-                    remaining_quotas['category'][q['category']] -= 1
-                    remaining_quotas['type'][q['type']] -= 1
-                    actual_counts['category'][q['category']] += 1
-                    actual_counts['type'][q['type']] += 1
-                    session['used_question_ids'].append(q['id'])
-
-        # Second pass: fill remaining with questions that match any criteria
-        if len(selected) < total_requested:
-            for q in available_questions:
-                if len(selected) >= total_requested:
-                    break
-                if q['id'] in [s['id'] for s in selected]:
-                    continue
-                    
-                matches_any = (
-                    (q['category'] in remaining_quotas['category'] and remaining_quotas['category'][q['category']] > 0) or
-                    (q['difficulty'] in remaining_quotas['difficulty'] and remaining_quotas['difficulty'][q['difficulty']] > 0) or
-                    (q['type'] in remaining_quotas['type'] and remaining_quotas['type'][q['type']] > 0)
-                )
-                
-                if matches_any:
-                    selected.append(q)
-                    # Track what we're substituting
-                    original_target = None
-                    if q['difficulty'] != 'Medium' and remaining_quotas['difficulty'].get('Medium', 0) > 0:
-                        original_target = 'Medium'
-                        remaining_quotas['difficulty']['Medium'] -= 1
-                        substitutions['difficulty']['Medium'].append(q['difficulty'])
-                    elif q['difficulty'] in remaining_quotas['difficulty'] and remaining_quotas['difficulty'][q['difficulty']] > 0:
-                        remaining_quotas['difficulty'][q['difficulty']] -= 1
-                    else:
-                        original_target = None
-                    
-                    # Update counts
-                    actual_counts['difficulty'][q['difficulty']] += 1
-                    if q['category'] in remaining_quotas['category'] and remaining_quotas['category'][q['category']] > 0:
-                        remaining_quotas['category'][q['category']] -= 1
-                        actual_counts['category'][q['category']] += 1
-                    if q['type'] in remaining_quotas['type'] and remaining_quotas['type'][q['type']] > 0:
-                        remaining_quotas['type'][q['type']] -= 1
-                        actual_counts['type'][q['type']] += 1
-                    session['used_question_ids'].append(q['id'])
-
-        # Mark session as modified since we're updating it
-        session.modified = True
-
-        # Generate deviation messages
-        messages = []
-        adjustments = []
-        
-        if serve_partial_batch:
-            msg = f"Only {remaining_questions} questions available in this batch."
-            messages.append(msg)
-            adjustments.append(msg)
-        
-        if reset_question_bank:
-            messages.append(reset_message)
-            adjustments.append(reset_message)
-        
-        # Category deviations
-        for cat, req_count in requested_cats.items():
-            act_count = actual_counts['category'].get(cat, 0)
-            if act_count != req_count:
-                if act_count < req_count:
-                    provided_instead = None
-                    for c, cnt in actual_counts['category'].items():
-                        if cnt > 0 and c != cat:
-                            provided_instead = c
-                            break
-                    
-                    if provided_instead:
-                        msg = (f"Could only provide {act_count} out of {req_count} "
-                              f"{cat} category questions (provided {provided_instead} instead)")
-                    else:
-                        msg = (f"Could only provide {act_count} out of {req_count} "
-                              f"{cat} category questions")
-                    messages.append(msg)
-                    adjustments.append(msg)
-        
-        # Difficulty deviations - with accurate substitution reporting
-        for diff, req_count in requested_diffs.items():
-            act_count = actual_counts['difficulty'].get(diff, 0)
-            if act_count != req_count:
-                if act_count < req_count:
-                    # Check if we have substitution records
-                    if diff in substitutions['difficulty']:
-                        # Get the most common substitution
-                        if substitutions['difficulty'][diff]:
-                            sub_counts = {}
-                            for sub in substitutions['difficulty'][diff]:
-                                sub_counts[sub] = sub_counts.get(sub, 0) + 1
-                            most_common_sub = max(sub_counts.items(), key=lambda x: x[1])[0]
-                            msg = (f"Could only provide {act_count} out of {req_count} "
-                                  f"{diff} difficulty questions (provided {most_common_sub} instead)")
-                        else:
-                            msg = (f"Could only provide {act_count} out of {req_count} "
-                                  f"{diff} difficulty questions")
-                    else:
-                        # Fallback to checking actual counts
-                        provided_instead = None
-                        if diff == 'Medium':
-                            if actual_counts['difficulty'].get('Hard', 0) > 0:
-                                provided_instead = 'Hard'
-                            elif actual_counts['difficulty'].get('Easy', 0) > 0:
-                                provided_instead = 'Easy'
-                        else:
-                            for d, cnt in actual_counts['difficulty'].items():
-                                if cnt > 0 and d != diff:
-                                    provided_instead = d
-                                    break
-                        
-                        if provided_instead:
-                            msg = (f"Could only provide {act_count} out of {req_count} "
-                                  f"{diff} difficulty questions (provided {provided_instead} instead)")
-                        else:
-                            msg = (f"Could only provide {act_count} out of {req_count} "
-                                  f"{diff} difficulty questions")
-                    messages.append(msg)
-                    adjustments.append(msg)
-        
-        # Type deviations
-        for q_type, req_count in requested_types.items():
-            act_count = actual_counts['type'].get(q_type, 0)
-            if act_count != req_count:
-                if act_count < req_count:
-                    provided_instead = None
-                    for t, cnt in actual_counts['type'].items():
-                        if cnt > 0 and t != q_type:
-                            provided_instead = t
-                            break
-                    
-                    if provided_instead:
-                        msg = (f"Could only provide {act_count} out of {req_count} "
-                              f"{q_type} type questions (provided {provided_instead} instead)")
-                    else:
-                        msg = (f"Could only provide {act_count} out of {req_count} "
-                              f"{q_type} type questions")
-                    messages.append(msg)
-                    adjustments.append(msg)
-
-        # Prepare response
-        response = {
-            'test': [{
-                'id': q['id'],
-                'question': q['question'],
-                'category': q['category'],
-                'difficulty': q['difficulty'],
-                'type': q['type'],
-                'is_fallback': reset_question_bank,
-                'was_substituted': any(
-                    (q['difficulty'] in substitutions['difficulty'].get('Medium', []) and requested_diffs.get('Medium', 0) > 0) or
-                    (q['difficulty'] in substitutions['difficulty'].get('Hard', []) and requested_diffs.get('Hard', 0) > 0)
-                    for q in selected
-                )
-            } for q in selected],
-            'messages': messages,
-            'adjustments': adjustments,
-            'reset_question_bank': reset_question_bank,
-            'reset_message': reset_message if reset_question_bank else None,
-            'partial_batch': serve_partial_batch,
-            'substitutions': substitutions
+            except Exception:
+                metrics.ERRORS.inc()
+                app.logger.exception("Error generating test for student %s", student_id)
+                yield responses.dumps({'student_id': student_id, 'error': "Internal server error"}) + b'\n'
+                continue
+            response = finish_test(store, spec, result, key, clock)
+            previous_ids = {q.id for q in result.selected}
+            line = responses.dumps(dict(response, student_id=student_id)) + b'\n'
+            clock.lap('serialization')
+            yield line
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+@app.route('/api/adaptive/next', methods=['POST'])
+def adaptive_next():
+    """Serve the next question of an adaptive test.
+
+    Start a test with total_questions, category_counts and type_counts
+    (difficulty follows the student's ability), then send
+    {"answer": {"question_id": 12, "correct": true}} for every question
+    served. An optional "bank" selects the question bank. The response
+    holds the next question, or "done": true, and the ability estimate.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise GenerationError("Request body must be a JSON object")
+        bank = data.get('bank', DEFAULT_BANK)
+        store = bank_store(bank)
+        user_key = bank_user_key(bank, get_session_id())
+        if 'total_questions' in data:
+            adaptive_session = adaptive_engine.start(user_key, store, data)
+        else:
+            adaptive_session = adaptive_engine.session(user_key, store)
+        answer = data.get('answer')
+        if answer is not None:
+            if (not isinstance(answer, dict) or 'question_id' not in answer or
+                    not isinstance(answer.get('correct'), bool)):
+                raise GenerationError("answer needs question_id and a boolean correct")
+            adaptive_engine.answer(adaptive_session, store, answer['question_id'], answer['correct'])
+            attempt_log.submit([Attempt(user_key, answer['question_id'], answer['correct'])])
+        q = adaptive_engine.next_question(adaptive_session, store)
+    except GenerationError as e:
+        return jsonify({"error": e.message}), e.status
+    ability, standard_error = adaptive_session.ability()
+    body = {
+        'done': q is None,
+        'answered': adaptive_session.answered,
+        'ability': round(ability, 3),
+        'standard_error': round(standard_error, 3)
+    }
+    if q is not None:
+        body['question'] = {
+            'id': q.id,
+            'question': q.question,
+            'category': q.category,
+            'difficulty': q.difficulty,
+            'type': q.type
         }
+    return responses.json_response(body)
 
-        return jsonify(response)
+def parse_timestamp(value):
+    """Finite seconds since the epoch from a number or numeric string, None otherwise"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
 
-    except Exception as e:
-        print(f"Error generating test: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
+def resolve_question(store, qid):
+    """Question of the bank with id qid, also given as a numeric string, None otherwise"""
+    if isinstance(qid, bool) or not isinstance(qid, (int, str)):
+        return None
+    q = store.get(qid)
+    if q is None and isinstance(qid, str) and qid.strip().lstrip('-').isdigit():
+        q = store.get(int(qid))
+    return q
+
+@app.route('/api/submit-answers', methods=['POST'])
+def submit_answers():
+    """Accept a batch of graded answers for the server-side attempt log.
+
+    Body: {"attempts": [{"question_id": 12, "correct": false}, ...]}, an
+    optional "student_id" (defaults to this browser's session) and an
+    optional "bank" the questions came from. Wrong answers are retested by
+    the next generated test from that bank.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('attempts'), list):
+        return jsonify({"error": "attempts must be a list"}), 400
+    if len(data['attempts']) > MAX_ATTEMPTS_PER_SUBMIT:
+        return jsonify({"error": f"At most {MAX_ATTEMPTS_PER_SUBMIT} attempts per request"}), 413
+
+    bank = data.get('bank', DEFAULT_BANK)
+    try:
+        store = bank_store(bank)
+    except GenerationError as e:
+        return jsonify({"error": e.message}), e.status
+    student_id = data.get('student_id')
+    user_key = f"student:{student_id}" if student_id is not None else get_session_id()
+    user_key = bank_user_key(bank, user_key)
+    attempts = []
+    for item in data['attempts']:
+        if not isinstance(item, dict) or 'question_id' not in item or not isinstance(item.get('correct'), bool):
+            return jsonify({"error": "Each attempt needs question_id and a boolean correct"}), 400
+        answered_at = item.get('answered_at')
+        if answered_at is not None:
+            answered_at = parse_timestamp(answered_at)
+            if answered_at is None:
+                return jsonify({"error": "answered_at must be a Unix timestamp in seconds"}), 400
+        q = resolve_question(store, item['question_id'])
+        if q is None:
+            return jsonify({"error": f"Unknown question_id {item['question_id']!r}"}), 400
+        attempts.append(Attempt(user_key, q.id, item['correct'], answered_at))
+    # Nothing is recorded until every attempt of the batch checked out
+    attempt_log.submit(attempts)
+    return jsonify({"accepted": len(attempts)}), 202
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
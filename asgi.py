@@ -0,0 +1,332 @@
+"""ASGI entry point for high-concurrency exam starts.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Test generation is served natively: the event loop only parses requests,
+while selection runs in a bounded thread pool over the same question
+store, progress store and caches as the Flask app. Identical in-flight
+requests from the same session share one generation, and once
+ASGI_MAX_PENDING generations are queued or running, new ones get a 429
+with Retry-After instead of piling up. Sessions are read from Flask's
+signed session cookie, so progress and retests are keyed the same way
+as on the routes passed to the Flask app. Those routes run on the default
+executor and their bodies are sent chunk by chunk, so the NDJSON batch
+endpoint streams here too.
+"""
+import asyncio
+import io
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from itsdangerous import BadSignature
+from werkzeug.http import dump_cookie, parse_cookie
+
+import app1
+import metrics
+import responses
+from generation import GenerationError, TestSpec
+
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', min(32, (os.cpu_count() or 1) * 2)))  # Selection threads
+ASGI_MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', 256))  # Queued plus running generations
+ASGI_RETRY_AFTER = int(os.environ.get('ASGI_RETRY_AFTER', 1))  # Seconds, sent with 429
+MAX_BODY_BYTES = 1024 * 1024
+
+GENERATE_PATH = re.compile(r'^/api/(?:([^/]+)/)?generate-test$')
+
+
+class Overloaded(Exception):
+    """The generation queue is full"""
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class GenerationPool:
+    """Bounded worker pool that coalesces identical in-flight jobs"""
+
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='generate')
+        self.max_pending = max_pending
+        self.pending = 0
+        self._inflight = {}  # key -> asyncio.Future, only touched from the event loop
+
+    def run(self, key, job):
+        """Future for job's result, shared with an identical job already in flight"""
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.COALESCED_REQUESTS.inc()
+            return future
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, job)
+        self._inflight[key] = future
+
+        def done(_):
+            self.pending -= 1
+            self._inflight.pop(key, None)
+
+        future.add_done_callback(done)
+        return future
+
+
+pool = GenerationPool(ASGI_WORKERS, ASGI_MAX_PENDING)
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def _session_id(scope):
+    """Returns (session id, Set-Cookie header value or None).
+
+    The id is app1.get_session_id()'s session['sid'], read from the same
+    signed cookie, and a new one is stored in it the same way.
+    """
+    flask_app = app1.app
+    interface = flask_app.session_interface
+    serializer = interface.get_signing_serializer(flask_app)
+    name = interface.get_cookie_name(flask_app)
+    data = {}
+    value = parse_cookie(_header(scope, b'cookie')).get(name)
+    if value:
+        try:
+            data = serializer.loads(value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            data = {}
+    if isinstance(data.get('sid'), str):
+        return data['sid'], None
+    data = dict(data, sid=secrets.token_hex(16))
+    cookie = dump_cookie(
+        name, serializer.dumps(data),
+        domain=interface.get_cookie_domain(flask_app),
+        path=interface.get_cookie_path(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        samesite=interface.get_cookie_samesite(flask_app)
+    )
+    return data['sid'], cookie
+
+
+async def _read_body(receive, limit=MAX_BODY_BYTES):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _send(send, status, body, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-length', str(len(body)).encode())] + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, status, obj, headers=()):
+    await _send(send, status, responses.dumps(obj), [(b'content-type', b'application/json')] + list(headers))
+
+
+async def generate_test(scope, receive, send, bank):
+    """POST /api/generate-test and /api/<bank>/generate-test"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        if scope['method'] != 'POST':
+            status = 405
+            return await _send_json(send, status, {"error": "Method not allowed"}, [(b'allow', b'POST')])
+        try:
+            raw = await _read_body(receive)
+        except BodyTooLarge:
+            status = 413
+            return await _send_json(send, status, {"error": "Request body too large"})
+        session_id, set_cookie = _session_id(scope)
+        cookie = [(b'set-cookie', set_cookie.encode('latin-1'))] if set_cookie else []
+
+        try:
+            loop = asyncio.get_running_loop()
+            # First use of a bank reads it from disk, keep that off the event loop
+            store = await loop.run_in_executor(None, app1.bank_store, bank)
+            try:
+                data = json.loads(raw) if raw else None
+            except ValueError:
+                raise GenerationError("Request body must be JSON")
+            spec = TestSpec.from_json(data)
+            app1.check_paraphrase_style(spec)
+            user_key = app1.bank_user_key(bank, session_id)
+
+            def job():
+                clock = metrics.StageClock()
+                result = app1.generate_for_user(store, bank, spec, user_key,
+                                                app1.used_question_ids(store, user_key), clock)
+                body = responses.dumps(app1.finish_test(store, spec, result, user_key, clock))
+                clock.lap('serialization')
+                return body
+
+            # Retries and double submits of one session wait for the same test
+            body = await pool.run((bank, store.version, user_key, raw), job)
+        except GenerationError as e:
+            status = e.status
+            return await _send_json(send, status, {"error": e.message}, cookie)
+        except Overloaded:
+            status = 429
+            return await _send_json(send, status, {"error": "Too many requests, retry shortly"},
+                                    cookie + [(b'retry-after', str(ASGI_RETRY_AFTER).encode())])
+
+        headers = [(b'content-type', b'application/json'), (b'vary', b'Accept-Encoding')] + cookie
+        encoding = responses.encoding_for(_header(scope, b'accept-encoding'))
+        if encoding and len(body) >= responses.MIN_COMPRESS_BYTES:
+            body = responses.compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode()))
+        status = 200
+        await _send(send, status, body, headers)
+    except Exception:
+        metrics.ERRORS.inc()
+        app1.app.logger.exception("Error generating test")
+        await _send_json(send, 500, {"error": "Internal server error"})
+    finally:
+        metrics.REQUEST_SECONDS.labels(status).observe(time.perf_counter() - started)
+
+
+def _wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class _Disconnected(Exception):
+    pass
+
+
+def _run_wsgi(environ, loop, queue, stop):
+    """Run the Flask app in this thread, passing its start and every body chunk to queue.
+
+    The response iterator stays on one thread from the first chunk to
+    close(), which stream_with_context's request context needs. Puts wait
+    for room in queue, so a slow client holds the generator back instead
+    of the response piling up in memory.
+    """
+    def put(item):
+        if stop.is_set():
+            raise _Disconnected()
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def start_response(status, headers, exc_info=None):
+        put((int(status.split(' ', 1)[0]), headers))
+
+    try:
+        chunks = app1.app(environ, start_response)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    put(chunk)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+    except _Disconnected:
+        pass
+    finally:
+        if not stop.is_set():
+            put(None)
+
+
+async def wsgi_fallback(scope, receive, send):
+    """Serve any other route with the Flask app on the default executor, streaming its body"""
+    try:
+        body = await _read_body(receive, limit=16 * MAX_BODY_BYTES)
+    except BodyTooLarge:
+        return await _send_json(send, 413, {"error": "Request body too large"})
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=8)
+    stop = threading.Event()
+    worker = loop.run_in_executor(None, _run_wsgi, _wsgi_environ(scope, body), loop, queue, stop)
+    try:
+        start = await queue.get()
+        if start is None:
+            return await _send_json(send, 500, {"error": "Internal server error"})
+        status, headers = start
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        })
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # On a failed send the worker stops at its next chunk, free the put it may wait on
+        stop.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await worker
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            pool.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    match = GENERATE_PATH.match(scope['path'])
+    if match:
+        return await generate_test(scope, receive, send, match.group(1) or app1.DEFAULT_BANK)
+    return await wsgi_fallback(scope, receive, send)
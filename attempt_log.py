@@ -0,0 +1,158 @@
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+
+
+class Attempt:
+    """One graded answer"""
+    __slots__ = ('user_id', 'question_id', 'correct', 'answered_at')
+
+    def __init__(self, user_id, question_id, correct, answered_at=None):
+        self.user_id = user_id
+        self.question_id = question_id
+        self.correct = bool(correct)
+        self.answered_at = answered_at if answered_at is not None else time.time()
+
+
+class AttemptLog:
+    """Append-only attempt log with write-behind persistence.
+
+    submit() passes attempts to on_attempt (e.g. the retest scheduler)
+    right away and queues the rows; a background thread appends them to
+    SQLite (WAL mode) in batches. On startup every logged attempt is
+    replayed through on_attempt. Workers sharing the log file also replay
+    each other's rows: between batches the writer reads rows other
+    processes appended, at most sync_interval seconds after they were
+    written. Pass path=None to keep attempts in memory only.
+    """
+
+    def __init__(self, path=None, batch_size=500, flush_interval=0.5, max_queue=100000,
+                 on_attempt=None, sync_interval=1.0):
+        self.path = path
+        self.on_attempt = on_attempt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.writer_id = secrets.token_hex(8)  # Tags this process's rows, so syncing skips them
+        self._last_row = 0  # Highest row id replayed
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = None
+        if path:
+            self._init_db()
+            self._writer = threading.Thread(target=self._write_loop, name='attempt-writer', daemon=True)
+            self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS attempts ('
+                'id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, question_id TEXT NOT NULL, '
+                'correct INTEGER NOT NULL, answered_at REAL NOT NULL, writer TEXT)'
+            )
+            conn.commit()
+            self._replay(conn, 'SELECT id, user_id, question_id, correct, answered_at FROM attempts '
+                               'ORDER BY id', ())
+        finally:
+            conn.close()
+
+    def _replay(self, conn, query, params):
+        rows = conn.execute(query, params)
+        with self._lock:
+            for row_id, user_id, question_id, correct, answered_at in rows:
+                self._apply(Attempt(user_id, _decode_id(question_id), correct, answered_at))
+                self._last_row = row_id
+
+    def _sync(self, conn):
+        """Replay rows other processes appended since the last sync"""
+        try:
+            conn.execute('BEGIN')  # One snapshot, so _last_row can't skip a row committed meanwhile
+            last = conn.execute('SELECT MAX(id) FROM attempts').fetchone()[0] or 0
+            self._replay(conn, 'SELECT id, user_id, question_id, correct, answered_at FROM attempts '
+                               'WHERE id > ? AND writer IS NOT ? ORDER BY id', (self._last_row, self.writer_id))
+            self._last_row = max(self._last_row, last)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error reading attempts of other workers: {str(e)}")
+
+    def _apply(self, attempt):
+        if self.on_attempt is not None:
+            self.on_attempt(attempt)
+
+    def submit(self, attempts):
+        """Record attempts, they are visible immediately and persisted in the background"""
+        with self._lock:
+            for attempt in attempts:
+                self._apply(attempt)
+        if self._writer is not None:
+            for attempt in attempts:
+                self._queue.put(attempt)
+
+    def _write_loop(self):
+        conn = self._connect()
+        next_sync = time.monotonic() + self.sync_interval
+        while True:
+            if time.monotonic() >= next_sync:
+                self._sync(conn)
+                next_sync = time.monotonic() + self.sync_interval
+            try:
+                batch = [self._queue.get(timeout=max(0, next_sync - time.monotonic()))]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            stop = None in batch
+            rows = [
+                (a.user_id, str(a.question_id), int(a.correct), a.answered_at, self.writer_id)
+                for a in batch if a is not None
+            ]
+            try:
+                if rows:
+                    conn.executemany(
+                        'INSERT INTO attempts (user_id, question_id, correct, answered_at, writer) '
+                        'VALUES (?, ?, ?, ?, ?)', rows)
+                    conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing {len(rows)} attempts: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def flush(self):
+        """Block until every queued attempt has been written"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+
+def _decode_id(value):
+    # Question ids are stored as text, integer ids come back as integers
+    try:
+        return int(value)
+    except ValueError:
+        return value
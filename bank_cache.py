@@ -0,0 +1,364 @@
+"""Compiled, memory-mapped cache of a parsed question bank.
+
+The cache sits next to the CSV (questions.csv -> questions.csv.qbank) and is
+keyed by the CSV's mtime, size and SHA-256. Columns are stored as flat
+arrays, along with the store positions sorted by id and grouped by bucket.
+A mapped store builds Question records on access and looks ids up by
+binary search, so workers share the pages of the whole bank rather than
+each holding its own records, id dict and buckets.
+
+The file is a mapped_file with sections for the int64 ids, the uint16
+category/difficulty/type codes, the uint64 text offsets, the UTF-8 text
+blob, the uint32 positions in id order and the uint32 positions grouped by
+bucket. Banks with text ids store them as uint64 offsets and a UTF-8 blob
+in place of the int64 ids, have no id order and get a plain id dict.
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+
+import mapped_file
+from question_store import Question, QuestionStore, parse_question_id
+
+CACHE_SUFFIX = '.qbank'
+MAGIC = b'QBANK\x00\x01\n'
+FORMAT_VERSION = 2
+
+
+class TextColumn:
+    """Sequence view decoding question text straight out of the mapped blob"""
+    __slots__ = ('_offsets', '_blob')
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+
+class CodedColumn:
+    """Sequence view mapping small integer codes back to their strings"""
+    __slots__ = ('_codes', '_values')
+
+    def __init__(self, codes, values):
+        self._codes = codes
+        self._values = values
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        return self._values[self._codes[index]]
+
+    def __iter__(self):
+        values = self._values
+        return (values[code] for code in self._codes)
+
+
+class MappedQuestions:
+    """Sequence of Question records built on access from the mapped columns"""
+    __slots__ = ('_ids', '_texts', '_categories', '_difficulties', '_types')
+
+    def __init__(self, ids, texts, categories, difficulties, types):
+        self._ids = ids
+        self._texts = texts
+        self._categories = categories
+        self._difficulties = difficulties
+        self._types = types
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self._ids)
+        if not 0 <= index < len(self._ids):
+            raise IndexError('question position out of range')
+        return Question(index, self._ids[index], self._texts, self._categories[index],
+                        self._difficulties[index], self._types[index])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self._ids)))
+
+
+class BucketView:
+    """Sequence of the questions at one bucket's mapped store positions"""
+    __slots__ = ('_questions', '_positions')
+
+    def __init__(self, questions, positions):
+        self._questions = questions
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._questions[p] for p in self._positions[index])
+        return self._questions[self._positions[index]]
+
+    def __iter__(self):
+        questions = self._questions
+        return (questions[p] for p in self._positions)
+
+
+class IdIndex:
+    """by_id of a mapped store, a binary search over the positions in id order"""
+    __slots__ = ('_questions', '_ids', '_order')
+
+    def __init__(self, questions, ids, order):
+        self._questions = questions
+        self._ids = ids
+        self._order = order
+
+    def _position(self, qid):
+        if not isinstance(qid, (int, float)):
+            return None
+        i = bisect_left(self._order, qid, key=self._ids.__getitem__)
+        if i < len(self._order) and self._ids[self._order[i]] == qid:
+            return self._order[i]
+        return None
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, qid):
+        return self._position(qid) is not None
+
+    def __getitem__(self, qid):
+        position = self._position(qid)
+        if position is None:
+            raise KeyError(qid)
+        return self._questions[position]
+
+    def get(self, qid, default=None):
+        position = self._position(qid)
+        return default if position is None else self._questions[position]
+
+
+def cache_path_for(csv_path):
+    return csv_path + CACHE_SUFFIX
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_key(csv_path):
+    stat = os.stat(csv_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CacheWriter:
+    """Compiles a cache file from chunks of normalised rows in bounded memory.
+
+    Each column is spilled to its own temporary file as chunks arrive and
+    the cache is assembled from them by finish(), so only the current chunk
+    and the attribute vocabularies are held in memory. finish() reads the
+    ids and codes back to sort and group the positions, which takes a few
+    dozen bytes per row for that step only.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.count = 0
+        self._vocabularies = ({}, {}, {})  # category, difficulty, type -> code
+        self._text_end = 0
+        self._spills = [tempfile.TemporaryFile() for _ in range(6)]  # ids, 3 code columns, offsets, texts
+        mapped_file.write_column(self._spills[4], array('Q', [0]))
+        self._id_blob = None  # Spill of the id text once a non-integer id shows up
+        self._id_end = 0
+
+    def _add_text_ids(self, ids):
+        offsets = array('Q')
+        for qid in ids:
+            encoded = str(qid).encode('utf-8')
+            self._id_blob.write(encoded)
+            self._id_end += len(encoded)
+            offsets.append(self._id_end)
+        mapped_file.write_column(self._spills[0], offsets)
+
+    def _switch_to_text_ids(self):
+        """Rewrite the integer ids spilled so far as text"""
+        int_ids = self._spills[0]
+        int_ids.seek(0)
+        self._spills[0] = tempfile.TemporaryFile()
+        self._id_blob = tempfile.TemporaryFile()
+        mapped_file.write_column(self._spills[0], array('Q', [0]))
+        for chunk in iter(lambda: int_ids.read(1 << 20), b''):
+            ids = array('q')
+            ids.frombytes(chunk)
+            if sys.byteorder != 'little':
+                ids.byteswap()
+            self._add_text_ids(ids)
+        int_ids.close()
+
+    def add(self, ids, texts, categories, difficulties, types):
+        """Append one chunk of normalised rows"""
+        if self._id_blob is None and not all(type(qid) is int for qid in ids):
+            self._switch_to_text_ids()
+        if self._id_blob is None:
+            mapped_file.write_column(self._spills[0], array('q', ids))
+        else:
+            self._add_text_ids(ids)
+        _, cat_file, diff_file, type_file, offsets_file, texts_file = self._spills
+        for f, values, vocabulary in zip((cat_file, diff_file, type_file), (categories, difficulties, types),
+                                         self._vocabularies):
+            codes = array('H')
+            for value in values:
+                code = vocabulary.setdefault(value, len(vocabulary))
+                if code > 0xFFFF:
+                    raise ValueError("Too many distinct attribute values for the question cache")
+                codes.append(code)
+            mapped_file.write_column(f, codes)
+        offsets = array('Q')
+        for text in texts:
+            encoded = text.encode('utf-8')
+            texts_file.write(encoded)
+            self._text_end += len(encoded)
+            offsets.append(self._text_end)
+        mapped_file.write_column(offsets_file, offsets)
+        self.count += len(ids)
+
+    def finish(self, sha256=None, rejected=0):
+        """Write the cache file next to the CSV, replacing any older one.
+
+        rejected is the number of CSV rows left out, a non-zero count marks
+        the cache incomplete.
+        """
+        mtime_ns, size = _source_key(self.csv_path)
+        header = {
+            'version': FORMAT_VERSION,
+            'source_mtime_ns': mtime_ns,
+            'source_size': size,
+            'source_sha256': sha256 or file_sha256(self.csv_path),
+            'count': self.count,
+            'text_ids': self._id_blob is not None,
+            'rejected': rejected,
+            'categories': list(self._vocabularies[0]),
+            'difficulties': list(self._vocabularies[1]),
+            'types': list(self._vocabularies[2])
+        }
+        grouped = {}  # (category, difficulty, type) codes -> positions, in order of first appearance
+        codes = [mapped_file.read_column(spill, 'H') for spill in self._spills[1:4]]
+        for position, key in enumerate(zip(*codes)):
+            grouped.setdefault(key, array('I')).append(position)
+        del codes
+        header['buckets'] = [[*key, len(positions)] for key, positions in grouped.items()]
+        id_order = None
+        if self._id_blob is None:
+            ids = mapped_file.read_column(self._spills[0], 'q')
+            id_order = array('I', sorted(range(len(ids)), key=ids.__getitem__))
+            del ids
+
+        spills = self._spills[:1] + ([self._id_blob] if self._id_blob is not None else []) + self._spills[1:]
+        cache_path = cache_path_for(self.csv_path)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            mapped_file.write_header(f, MAGIC, header)
+            for spill in spills:
+                mapped_file.pad(f)
+                spill.seek(0)
+                shutil.copyfileobj(spill, f, 1 << 20)
+            if id_order is not None:
+                mapped_file.write_section(f, id_order)
+            mapped_file.pad(f)
+            for positions in grouped.values():
+                mapped_file.write_column(f, positions)
+        os.replace(tmp_path, cache_path)  # Readers never see a half-written cache
+        self.close()
+
+    def close(self):
+        for spill in self._spills:
+            spill.close()
+        if self._id_blob is not None:
+            self._id_blob.close()
+
+
+def write_cache(csv_path, store, sha256=None):
+    """Compile store into the cache file for csv_path, returns False if it can't be cached"""
+    ids = [q.id for q in store.questions]
+    texts = [q.question for q in store.questions]
+    if not all(isinstance(t, str) for t in texts):
+        return False
+
+    writer = CacheWriter(csv_path)
+    try:
+        writer.add(ids, texts, [q.category for q in store.questions],
+                   [q.difficulty for q in store.questions], [q.type for q in store.questions])
+        writer.finish(sha256)
+    except ValueError:
+        writer.close()
+        return False
+    return True
+
+
+def load_cache(csv_path, allow_incomplete=False):
+    """Map the cache for csv_path read-only, returns None if missing or stale.
+
+    A cache missing rejected rows of an import is refused too, unless
+    allow_incomplete is set.
+    """
+    opened = mapped_file.open_sections(cache_path_for(csv_path), MAGIC)
+    if opened is None:
+        return None
+    header, section = opened
+    if header.get('version') != FORMAT_VERSION:
+        return None
+    if header.get('rejected') and not allow_incomplete:
+        return None
+
+    # mtime and size are the cheap check, the hash catches touched but unchanged files
+    mtime_ns, size = _source_key(csv_path)
+    if (mtime_ns, size) != (header['source_mtime_ns'], header['source_size']):
+        if size != header['source_size'] or file_sha256(csv_path) != header['source_sha256']:
+            return None
+
+    count = header['count']
+    if header.get('text_ids'):
+        id_offsets = section('Q', count + 1)
+        id_texts = TextColumn(id_offsets, section('B', id_offsets[count]))
+        ids = [parse_question_id(id_texts[i]) for i in range(count)]
+    else:
+        ids = section('q', count)
+    categories, difficulties, types = header['categories'], header['difficulties'], header['types']
+    category_codes = section('H', count)
+    difficulty_codes = section('H', count)
+    type_codes = section('H', count)
+    offsets = section('Q', count + 1)
+    questions = MappedQuestions(
+        ids,
+        TextColumn(offsets, section('B', offsets[count])),
+        CodedColumn(category_codes, categories),
+        CodedColumn(difficulty_codes, difficulties),
+        CodedColumn(type_codes, types)
+    )
+
+    if header.get('text_ids'):
+        by_id = {}
+        for position, qid in enumerate(ids):
+            if qid not in by_id:
+                by_id[qid] = questions[position]
+    else:
+        by_id = IdIndex(questions, ids, section('I', count))
+    grouped = section('I', count)
+    buckets, offset = {}, 0
+    for category, difficulty, q_type, length in header['buckets']:
+        key = (categories[category], difficulties[difficulty], types[q_type])
+        buckets[key] = BucketView(questions, grouped[offset:offset + length])
+        offset += length
+    return QuestionStore.from_views(questions, by_id, buckets, version=header['source_sha256'][:16])
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+
+# Rough per-question overhead of a loaded store: the Question object, its
+# id, the by_id and bucket entries and the vectorised index arrays
+QUESTION_OVERHEAD_BYTES = 200
+
+
+def parse_bank_sources(spec):
+    """Parse "name=path,name=path" into an ordered {name: path} dict"""
+    sources = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, sep, path = item.partition('=')
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Invalid question bank entry '{item}', expected name=path")
+        sources[name.strip()] = path.strip()
+    return sources
+
+
+def base_footprint(store):
+    """Approximate bytes a loaded store keeps alive without the indexes built on demand"""
+    return sum(len(q.question) for q in store.questions) + QUESTION_OVERHEAD_BYTES * len(store)
+
+
+def store_footprint(store, base=None):
+    """Approximate bytes a loaded store keeps alive, its search index included once built"""
+    index = store.search_index
+    return (base_footprint(store) if base is None else base) + (index.nbytes if index is not None else 0)
+
+
+class BankRegistry:
+    """Named question banks, each loaded on first use.
+
+    Loaded banks are kept in LRU order; once their estimated footprint goes
+    over memory_budget bytes the least recently used banks are dropped and
+    loaded again when next requested. Requests that still hold a dropped
+    store keep using it until they finish. Pinned banks (the hot-reloaded
+    default bank) are served by their getter and never evicted.
+    """
+
+    def __init__(self, load_fn, memory_budget):
+        self.load_fn = load_fn
+        self.memory_budget = memory_budget
+        self._sources = {}
+        self._pinned = {}
+        self._loaded = OrderedDict()  # name -> (store, base footprint), most recently used last
+        self._loading = {}  # name -> lock, so concurrent first requests load a bank once
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        with self._lock:
+            self._sources[name] = path
+
+    def pin(self, name, path, get_store):
+        """Serve name from get_store() instead of the LRU, e.g. a bank that reloads itself"""
+        with self._lock:
+            self._sources[name] = path
+            self._pinned[name] = get_store
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def get(self, name):
+        """Loaded store for bank name, KeyError if no such bank is registered"""
+        if name in self._pinned:
+            return self._pinned[name]()
+        with self._lock:
+            path = self._sources[name]
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry[0]
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            with self._lock:
+                entry = self._loaded.get(name)
+                if entry is not None:
+                    return entry[0]
+            store = self.load_fn(path)
+            footprint = base_footprint(store)
+            with self._lock:
+                self._loaded[name] = (store, footprint)
+                self._evict(keep=name)
+            print(f"Loaded question bank '{name}' with {len(store)} questions")
+            return store
+
+    def path(self, name):
+        return self._sources[name]
+
+    def check_budget(self, name):
+        """Evict other banks if name grew, e.g. once its search index was built"""
+        with self._lock:
+            self._evict(keep=name)
+
+    def _evict(self, keep):
+        footprints = {name: store_footprint(store, base) for name, (store, base) in self._loaded.items()}
+        total = sum(footprints.values())
+        for name in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            del self._loaded[name]
+            total -= footprints[name]
+            print(f"Evicted question bank '{name}' to stay within the memory budget")
+
+    def invalidate(self, name):
+        """Drop a loaded bank so its next use reads the source again"""
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def describe(self):
+        """Name, source and loaded size of every registered bank"""
+        with self._lock:
+            names = list(self._sources)
+            loaded = {name: len(store) for name, (store, _) in self._loaded.items()}
+        banks = []
+        for name in names:
+            if name in self._pinned:
+                loaded[name] = len(self._pinned[name]())
+            banks.append({
+                'name': name,
+                'loaded': name in loaded,
+                'total_questions': loaded.get(name)
+            })
+        return banks
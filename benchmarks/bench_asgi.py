@@ -0,0 +1,170 @@
+"""Compare the ASGI entry point with the Flask server under many concurrent clients.
+
+Both servers load the same synthetic bank in their own process: uvicorn
+running asgi:app and Werkzeug's threaded server running the Flask app.
+An asyncio load generator then keeps --clients connections busy, each
+client sending --requests-per-client generate-test requests as new
+students:
+
+    python benchmarks/bench_asgi.py --bank-size 100000 --clients 1000 --output asgi.json
+
+Needs uvicorn. Clients retry 429 responses after the server's
+Retry-After, so latencies include the backoff and 429s are reported apart
+from errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_generate_test import build_request, git_revision, summarize
+from synthetic import write_synthetic_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLASK_SERVER = """
+import logging, sys
+from werkzeug.serving import make_server
+import app1
+app1.app.logger.disabled = True
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+make_server('127.0.0.1', int(sys.argv[1]), app1.app, threaded=True).serve_forever()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, env):
+    if kind == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--log-level', 'warning', '--no-access-log', '--backlog', '4096']
+    else:
+        command = [sys.executable, '-c', FLASK_SERVER, str(port)]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def post(port, payload, timeout):
+    """One request on a new connection, returns (status, Retry-After seconds or None)"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(
+            b'POST /api/generate-test HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+            b'Content-Type: application/json\r\nConnection: close\r\n'
+            + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        head = response.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+        retry_after = None
+        for line in head[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'retry-after':
+                retry_after = float(value)
+        return int(head[0].split(' ', 2)[1]), retry_after
+    finally:
+        writer.close()
+
+
+async def load(port, payload, clients, requests_per_client, timeout, max_retries):
+    latencies = []
+    rejected = errors = 0
+
+    async def client():
+        nonlocal rejected, errors
+        for _ in range(requests_per_client):
+            t0 = time.perf_counter()
+            for _ in range(max_retries + 1):
+                try:
+                    status, retry_after = await post(port, payload, timeout)
+                except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                    status, retry_after = None, None
+                if status != 429:
+                    break
+                # Back off as the server asks, the latency includes the wait
+                rejected += 1
+                await asyncio.sleep(retry_after or 1)
+            if status == 200:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    stats = summarize(latencies, time.perf_counter() - started, errors)
+    stats['rejected_429'] = rejected
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bank-size', type=int, default=100000)
+    parser.add_argument('--test-size', type=int, default=50)
+    parser.add_argument('--mode', choices=['greedy', 'exact'], default='greedy')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--requests-per-client', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60, help='seconds per request')
+    parser.add_argument('--max-retries', type=int, default=20, help='retries of a request answered 429')
+    parser.add_argument('--servers', default='flask,asgi', help='comma separated: flask, asgi')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    body = json.dumps(build_request(args.test_size, 3, 3, args.mode)).encode()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'bank.csv')
+        write_synthetic_csv(csv_path, args.bank_size)
+        env = dict(os.environ, QUESTIONS_CSV=csv_path, QUESTION_CACHE='0', ATTEMPT_LOG='',
+                   FORM_POOL_DIR=os.path.join(tmp, 'form_pools'))
+        for kind in args.servers.split(','):
+            port = free_port()
+            process = start_server(kind, port, env)
+            try:
+                stats = asyncio.run(load(port, body, args.clients, args.requests_per_client,
+                                         args.timeout, args.max_retries))
+            finally:
+                process.terminate()
+                process.wait()
+            stats.update({'server': kind, 'bank_size': args.bank_size, 'test_size': args.test_size,
+                          'clients': args.clients})
+            results.append(stats)
+            p50 = f"{stats['p50_ms']:.1f}ms" if stats['p50_ms'] is not None else '-'
+            p99 = f"{stats['p99_ms']:.1f}ms" if stats['p99_ms'] is not None else '-'
+            print(f"{kind:<6} clients={args.clients} ok={stats['requests']} p50={p50} p99={p99} "
+                  f"rps={stats['throughput_rps']:.0f} 429={stats['rejected_429']} errors={stats['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'git_revision': git_revision(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'args': vars(args)
+                },
+                'results': results
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Benchmark and load-test /api/generate-test over synthetic question banks.
+
+For every bank size the bank is written to a temporary CSV and loaded into
+the app in a fresh interpreter, so each bank's peak RSS is its own. The
+route is then driven through Flask's test client (in-process latency) and
+through a local threaded WSGI server with concurrent HTTP clients (latency
+and throughput under load):
+
+    python benchmarks/bench_generate_test.py --sizes 1000,100000 --test-sizes 10,200 \\
+        --clients 16 --output results.json
+    python benchmarks/bench_generate_test.py --sizes 1000 --compare results.json
+
+Results are saved as JSON so runs can be compared for regressions.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic import bank_values, write_synthetic_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def split_evenly(total, values):
+    """Spread total over values as evenly as possible"""
+    base, extra = divmod(total, len(values))
+    return {value: base + (1 if i < extra else 0) for i, value in enumerate(values)}
+
+
+def build_request(test_size, categories, types, mode):
+    category_values, difficulty_values, type_values = bank_values(categories, types)
+    return {
+        'total_questions': test_size,
+        'category_counts': split_evenly(test_size, category_values),
+        'difficulty_counts': split_evenly(test_size, difficulty_values),
+        'type_counts': split_evenly(test_size, type_values),
+        'mode': mode
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall_seconds, errors):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'max_ms': latencies[-1] * 1000 if latencies else None,
+        'throughput_rps': len(latencies) / wall_seconds if wall_seconds else None
+    }
+
+
+def peak_rss_mb():
+    """Peak RSS of this process, VmHWM starts fresh at exec unlike ru_maxrss"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_test_client(app, body, requests_count):
+    """Each request uses a fresh client, i.e. a new student session"""
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(requests_count):
+        client = app.test_client()
+        t0 = time.perf_counter()
+        response = client.post('/api/generate-test', json=body)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code != 200:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def run_wsgi_server(app, body, requests_count, clients):
+    """Drive a local threaded WSGI server with concurrent HTTP clients"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    payload = json.dumps(body)
+    headers = {'Content-Type': 'application/json'}
+
+    def one_request(_):
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=60)
+        try:
+            t0 = time.perf_counter()
+            conn.request('POST', '/api/generate-test', payload, headers)
+            response = conn.getresponse()
+            response.read()
+            return time.perf_counter() - t0, response.status
+        finally:
+            conn.close()
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(one_request, range(requests_count)))
+        wall = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        thread.join()
+    return summarize([r[0] for r in results], wall, sum(1 for r in results if r[1] != 200))
+
+
+def run_bank(args):
+    """Benchmark one bank in this process, run once per bank in a fresh interpreter"""
+    os.environ.setdefault('QUESTION_CACHE', '0')
+    os.chdir(REPO_ROOT)
+    import app1
+    app1.app.logger.disabled = True
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # No per-request access log
+
+    results = []
+    app1.CSV_FILE_PATH = args.csv
+    t0 = time.perf_counter()
+    app1.load_questions_from_csv()
+    load_seconds = time.perf_counter() - t0
+
+    for test_size in (int(s) for s in args.test_sizes.split(',')):
+        body = build_request(test_size, args.categories, args.types, args.mode)
+        drivers = [('test_client', lambda: run_test_client(app1.app, body, args.requests))]
+        if not args.no_server:
+            drivers.append(('wsgi_server', lambda: run_wsgi_server(
+                app1.app, body, args.requests, args.clients)))
+        for driver, run in drivers:
+            stats = run()
+            stats.update({
+                'bank_size': args.bank_size,
+                'test_size': test_size,
+                'driver': driver,
+                'clients': args.clients if driver == 'wsgi_server' else 1,
+                'bank_load_seconds': load_seconds,
+                'peak_rss_mb': peak_rss_mb()
+            })
+            results.append(stats)
+            print(f"bank={args.bank_size:<8} test={test_size:<5} {driver:<12} "
+                  f"p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                  f"rps={stats['throughput_rps']:.0f} errors={stats['errors']} "
+                  f"rss={stats['peak_rss_mb']:.0f}MB", flush=True)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous_path, results):
+    with open(previous_path) as f:
+        previous = {
+            (r['bank_size'], r['test_size'], r['driver']): r
+            for r in json.load(f)['results']
+        }
+    print(f"\nComparison with {previous_path} (p50 / p99 ratio, >1 is slower)")
+    for r in results:
+        old = previous.get((r['bank_size'], r['test_size'], r['driver']))
+        if old and old['p50_ms'] and old['p99_ms']:
+            print(f"  bank={r['bank_size']:<8} test={r['test_size']:<5} {r['driver']:<12}"
+                  f" p50 x{r['p50_ms'] / old['p50_ms']:.2f}  p99 x{r['p99_ms'] / old['p99_ms']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma separated bank sizes (up to 1000000)')
+    parser.add_argument('--test-sizes', default='10,50,200', help='comma separated test sizes')
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--types', type=int, default=3)
+    parser.add_argument('--category-skew', type=float, default=0.0)
+    parser.add_argument('--difficulty-skew', type=float, default=0.0)
+    parser.add_argument('--type-skew', type=float, default=0.0)
+    parser.add_argument('--mode', choices=['greedy', 'exact'], default='greedy')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and driver')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients for the WSGI server')
+    parser.add_argument('--no-server', action='store_true', help='only use the Flask test client')
+    parser.add_argument('--output', help='write JSON results here')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    # Set by the parent process for the interpreter benchmarking one bank
+    parser.add_argument('--bank-size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    parser.add_argument('--results', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bank_size is not None:
+        results = run_bank(args)
+        with open(args.results, 'w') as f:
+            json.dump(results, f)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for bank_size in (int(s) for s in args.sizes.split(',')):
+            csv_path = os.path.join(tmp, f"bank_{bank_size}.csv")
+            write_synthetic_csv(csv_path, bank_size, args.categories, args.types,
+                                args.category_skew, args.difficulty_skew, args.type_skew)
+            results_path = os.path.join(tmp, f"results_{bank_size}.json")
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                                    '--bank-size', str(bank_size), '--csv', csv_path, '--results', results_path])
+            if child.returncode != 0:
+                print(f"bank={bank_size:<8} failed with exit code {child.returncode}")
+                continue
+            with open(results_path) as f:
+                results.extend(json.load(f))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args)
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Compare worker cold-start cost of the question loaders.
+
+Each loader runs in a fresh interpreter so import time and peak RSS are
+measured the way a new gunicorn worker would see them:
+
+    python benchmarks/bench_startup.py --rows 100000 --repeat 5
+
+The pandas row needs pandas installed, it is skipped otherwise.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from synthetic import write_synthetic_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_PRELUDE = '''
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+'''
+
+CHILD_EPILOGUE = '''
+elapsed = time.perf_counter() - start
+try:
+    # VmHWM starts fresh at exec, ru_maxrss can carry over the parent's peak
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "rss_kb": rss_kb, "rows": rows}}))
+'''
+
+LOADERS = {
+    'pandas': '''
+import pandas as pd
+df = pd.read_csv({csv!r})
+df['category'] = df['category'].astype(str).str.upper().str.strip()
+df['difficulty'] = df['difficulty'].astype(str).str.capitalize().str.strip()
+df['type'] = df['type'].astype(str).str.strip()
+records = df.to_dict('records')
+rows = len(records)
+''',
+    'csv': '''
+from question_loader import parse_questions_csv
+rows = len(parse_questions_csv({csv!r}))
+''',
+    'cache': '''
+import bank_cache
+rows = len(bank_cache.load_cache({csv!r}))
+''',
+    'baseline': '''
+rows = 0
+'''
+}
+
+
+def run_loader(name, csv_path):
+    code = (CHILD_PRELUDE.format(root=REPO_ROOT) + LOADERS[name].format(csv=csv_path)
+            + CHILD_EPILOGUE.format())
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', help='existing questions CSV (default: synthetic bank)')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the synthetic bank')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = args.csv or os.path.join(tmp, 'questions.csv')
+        if not args.csv:
+            write_synthetic_csv(csv_path, args.rows)
+
+        sys.path.insert(0, REPO_ROOT)
+        import bank_cache
+        from question_loader import parse_questions_csv
+        bank_cache.write_cache(csv_path, parse_questions_csv(csv_path))
+
+        results = {}
+        print(f"{'loader':<10}{'rows':>10}{'median s':>12}{'peak RSS MB':>14}")
+        for name in LOADERS:
+            runs = [run_loader(name, csv_path) for _ in range(args.repeat)]
+            if None in runs:
+                print(f"{name:<10}{'skipped (loader failed, is it installed?)':>36}")
+                continue
+            results[name] = {
+                'rows': runs[0]['rows'],
+                'median_seconds': statistics.median(r['seconds'] for r in runs),
+                'peak_rss_mb': max(r['rss_kb'] for r in runs) / 1024
+            }
+            r = results[name]
+            print(f"{name:<10}{r['rows']:>10}{r['median_seconds']:>12.3f}{r['peak_rss_mb']:>14.1f}")
+
+        if not args.csv:
+            os.remove(bank_cache.cache_path_for(csv_path))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Synthetic question banks for the benchmarks."""
+import csv
+import random
+
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+SYLLABLES = ['ka', 'lo', 'mi', 'ter', 'van', 'su', 'rop', 'el', 'din', 'qua', 'zor', 'pe', 'tis', 'mun', 'ba', 'cor']
+
+
+def skewed_weights(n, skew):
+    """Zipf-like weights, skew 0 is uniform and larger values favour the first values"""
+    return [1 / (rank + 1) ** skew for rank in range(n)]
+
+
+def bank_values(categories=3, types=3):
+    category_values = [chr(ord('A') + i) if i < 26 else f"CAT{i}" for i in range(categories)]
+    type_values = ['True/False', 'Fill in the Blanks', 'Question Answer'][:types]
+    type_values += [f"Type {i}" for i in range(len(type_values), types)]
+    return category_values, DIFFICULTIES, type_values
+
+
+def random_words(rng, count):
+    return ' '.join(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(count))
+
+
+def write_synthetic_csv(path, rows, categories=3, types=3, category_skew=0.0,
+                        difficulty_skew=0.0, type_skew=0.0, seed=0):
+    """Write a questions CSV with the given size and attribute skew"""
+    rng = random.Random(seed)
+    category_values, difficulty_values, type_values = bank_values(categories, types)
+    columns = [
+        (category_values, skewed_weights(len(category_values), category_skew)),
+        (difficulty_values, skewed_weights(len(difficulty_values), difficulty_skew)),
+        (type_values, skewed_weights(len(type_values), type_skew))
+    ]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'question', 'category', 'difficulty', 'type'])
+        chunk = 10000
+        for start in range(1, rows + 1, chunk):
+            count = min(chunk, rows + 1 - start)
+            attrs = [rng.choices(values, weights, k=count) for values, weights in columns]
+            for offset in range(count):
+                qid = start + offset
+                writer.writerow([
+                    # Random words keep texts apart for near-duplicate detection
+                    qid, f"Synthetic question {qid}: {random_words(rng, 8)}?",
+                    attrs[0][offset], attrs[1][offset], attrs[2][offset]
+                ])
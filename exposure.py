@@ -0,0 +1,148 @@
+"""Item exposure control with counters shared by every worker process.
+
+Each bank version gets a POSIX shared memory segment named after it,
+holding the number of tests served and one counter per store position.
+Workers that load the same bank attach to the same segment, so exposure
+is tracked across gunicorn workers without a lock or a round trip.
+Increments are plain stores, a rare lost update under contention only
+makes the caps slightly more lenient.
+
+Selection follows Sympson-Hetter: a candidate about to be taken is
+administered with probability K = min(1, max_rate / exposure rate), and
+one that loses the draw is skipped for the rest of that test. The
+check reads two counters, O(1) per candidate. Segments outlive the
+processes; a reload that swaps in a new bank version removes the old
+version's segment. Inspect or clear them with:
+
+    python exposure.py questions.csv --top 20
+    python exposure.py questions.csv --unlink
+"""
+import argparse
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+DEFAULT_MIN_TESTS = 20  # Rates are noise until this many tests were served
+_HEADER = 8  # uint64 tests served, followed by one uint64 per question
+
+
+def segment_name(store):
+    return f"qexp_{store.version}"
+
+
+class _Segment(SharedMemory):
+    def __del__(self):
+        # The garbage collector may finalize a dropped store's segment before
+        # the counter views on it, close() would fail; the mapping goes with them
+        pass
+
+
+def _open_segment(name, size):
+    try:
+        shm = _Segment(name, create=True, size=size)
+    except FileExistsError:
+        shm = _Segment(name)
+    # Workers come and go, the segment must not be unlinked when one of them exits
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class ExposureCounters:
+    """Tests served and per-question exposure counts of one bank version"""
+
+    def __init__(self, shm, size, max_rate, min_tests=DEFAULT_MIN_TESTS):
+        self.shm = shm
+        self.max_rate = max_rate
+        self.min_tests = min_tests
+        self._tests = shm.buf[:_HEADER].cast('Q')
+        self._counts = shm.buf[_HEADER:_HEADER + 8 * size].cast('Q')
+
+    def __del__(self):
+        self._release()
+
+    @classmethod
+    def attach(cls, store, max_rate, min_tests=DEFAULT_MIN_TESTS):
+        """Counters for store, created zeroed by the first process to ask"""
+        size = len(store)
+        shm = _open_segment(segment_name(store), _HEADER + 8 * max(size, 1))
+        if shm.size < _HEADER + 8 * size:
+            raise ValueError(f"Exposure segment {shm.name} is too small for {size} questions")
+        return cls(shm, size, max_rate, min_tests)
+
+    @property
+    def tests(self):
+        return self._tests[0]
+
+    def rate(self, position):
+        tests = self._tests[0]
+        return self._counts[position] / tests if tests else 0.0
+
+    def admit(self, position, rng):
+        """Sympson-Hetter draw for the question at position"""
+        tests = self._tests[0]
+        if tests < self.min_tests:
+            return True
+        rate = self._counts[position] / tests
+        return rate <= self.max_rate or rng.random() * rate < self.max_rate
+
+    def record(self, positions):
+        """Count one served test and each of its questions"""
+        counts = self._counts
+        for position in positions:
+            counts[position] += 1
+        self._tests[0] += 1
+
+    def reset(self):
+        self.shm.buf[:_HEADER + self._counts.nbytes] = bytes(_HEADER + self._counts.nbytes)
+
+    def _release(self):
+        # The views must go before the segment can be closed
+        self._tests.release()
+        self._counts.release()
+
+    def close(self):
+        self._release()
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.unlink_segment()
+
+    def unlink_segment(self):
+        """Remove the segment's name, processes already attached keep their counters"""
+        # unlink() unregisters the segment, so it has to be registered again first
+        resource_tracker.register(self.shm._name, 'shared_memory')
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')  # Another worker removed it
+
+
+def main(argv=None):
+    from question_loader import parse_questions_csv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv')
+    parser.add_argument('--top', type=int, default=10, help='show the most exposed questions')
+    parser.add_argument('--reset', action='store_true', help='zero the counters')
+    parser.add_argument('--unlink', action='store_true', help='remove the shared memory segment')
+    args = parser.parse_args(argv)
+
+    store = parse_questions_csv(args.csv)
+    counters = ExposureCounters.attach(store, max_rate=1.0)
+    print(f"{segment_name(store)}: {counters.tests} tests served")
+    ranked = sorted(range(len(store)), key=counters.rate, reverse=True)[:args.top]
+    for position in ranked:
+        q = store.questions[position]
+        print(f"  {counters.rate(position):6.1%}  {q.id}: {q.question}")
+    if args.reset:
+        counters.reset()
+        print("Counters reset")
+    if args.unlink:
+        counters.unlink()
+        print("Segment removed")
+    else:
+        counters.close()
+
+
+if __name__ == '__main__':
+    main()
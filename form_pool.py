@@ -0,0 +1,405 @@
+"""Pools of test forms generated ahead of time for one exam configuration.
+
+A form is a quota-satisfying test built from an unused bank. Forms are
+generated in parallel across worker processes and stored as one compact
+file per configuration:
+
+    python form_pool.py --spec exam.json --forms 500 --workers 8
+
+exam.json holds the generate-test quota fields (total_questions,
+category_counts, difficulty_counts, type_counts and optionally mode). The
+file is a mapped_file with the forms as one section of uint32 store
+positions. Forms belong to one bank
+version and are ignored once the bank changes.
+
+The app loads the pools at startup and hands a form to a matching
+request in O(1). Workers sharing a pool directory claim forms in an
+append-only <pool>.claims file, under an flock, so a form goes to one
+student whichever worker serves them. A low pool is refilled in the
+background by one worker, in spawned processes, and the others pick up
+the rewritten file on their next take.
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import struct
+import sys
+import threading
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import bank_cache
+import mapped_file
+import metrics
+import vector_select
+from generation import TestSpec, generate
+from near_duplicates import DEFAULT_THRESHOLD, clusters_path_for, load_clusters, update_clusters
+from question_loader import parse_questions_csv
+
+MAGIC = b'QFORMS\x00\x02'
+POOL_SUFFIX = '.qforms'
+CLAIMS_SUFFIX = '.claims'  # Form numbers handed out, after the pool's 16-byte generation
+REFILL_LOCK_SUFFIX = '.refill'
+FORMS_PER_TASK = 50
+
+
+def config_key(spec):
+    """The quota fields a form satisfies, the response format doesn't matter"""
+    return (
+        spec.total_questions,
+        tuple(sorted((k, v) for k, v in spec.category_counts.items() if v)),
+        tuple(sorted((k, v) for k, v in spec.difficulty_counts.items() if v)),
+        tuple(sorted((k, v) for k, v in spec.type_counts.items() if v)),
+        spec.mode
+    )
+
+
+def spec_fields(spec):
+    return {
+        'total_questions': spec.total_questions,
+        'category_counts': spec.category_counts,
+        'difficulty_counts': spec.difficulty_counts,
+        'type_counts': spec.type_counts,
+        'mode': spec.mode
+    }
+
+
+def pool_path(directory, spec):
+    digest = hashlib.sha256(json.dumps(config_key(spec)).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directory, digest + POOL_SUFFIX)
+
+
+def meets_quotas(selected, spec):
+    """True when selected has exactly the requested counts of every attribute"""
+    if len(selected) != spec.total_questions:
+        return False
+    for attr, quotas in (('category', spec.category_counts), ('difficulty', spec.difficulty_counts),
+                         ('type', spec.type_counts)):
+        if Counter(q[attr] for q in selected) != Counter({k: v for k, v in quotas.items() if v}):
+            return False
+    return True
+
+
+def load_store(csv_path, threshold=DEFAULT_THRESHOLD):
+    """Load a bank the way the app does: the compiled cache first, then the CSV"""
+    store = None
+    try:
+        # An incomplete cache is what the app serves for a bank with rejected rows
+        store = bank_cache.load_cache(csv_path, allow_incomplete=True)
+    except Exception as e:
+        print(f"Ignoring unreadable question cache: {str(e)}")
+    if store is None:
+        store = parse_questions_csv(csv_path)
+    store.vector_index = vector_select.build_index(store)
+    # Forms follow the clusters the app maps, none when they weren't saved for this version
+    if threshold > 0:
+        store.duplicates = load_clusters(clusters_path_for(csv_path), store, threshold)
+    return store
+
+
+_worker_store = None
+
+
+def _init_worker(csv_path, threshold):
+    global _worker_store
+    _worker_store = load_store(csv_path, threshold)
+
+
+def _build_forms(fields, seeds):
+    """Worker task: one candidate form per seed, keeping those that meet every quota"""
+    spec = TestSpec.from_json(fields)
+    forms = []
+    for seed in seeds:
+        result = generate(_worker_store, spec, (), metrics.StageClock(), rng=random.Random(seed))
+        if meets_quotas(result.selected, spec):
+            forms.append(tuple(q.index for q in result.selected))
+    return _worker_store.version, forms
+
+
+def build_forms(csv_path, spec, count, workers=None, seed=None, threshold=DEFAULT_THRESHOLD,
+                build_duplicates=False):
+    """Generate up to count distinct forms across a process pool, returns (bank_version, forms)
+
+    Forms avoid near-duplicates when clusters at threshold were saved for
+    the bank. build_duplicates clusters the bank here first when they
+    weren't, once rather than in every worker.
+    """
+    if threshold > 0 and build_duplicates:
+        store = load_store(csv_path, threshold)
+        if store.duplicates is None:
+            update_clusters(csv_path, store, threshold)
+        del store
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(count)]
+    tasks = [seeds[i:i + FORMS_PER_TASK] for i in range(0, len(seeds), FORMS_PER_TASK)]
+    version, forms, seen = None, [], set()
+    # Spawned, not forked: refills run from a thread of a multithreaded web worker
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(csv_path, threshold)) as executor:
+        fields = spec_fields(spec)
+        for task_version, task_forms in executor.map(_build_forms, [fields] * len(tasks), tasks):
+            version = task_version
+            for form in task_forms:
+                if frozenset(form) not in seen:
+                    seen.add(frozenset(form))
+                    forms.append(form)
+    return version, forms
+
+
+def write_pool(path, bank_version, spec, forms):
+    header = {
+        'bank_version': bank_version,
+        'generation': secrets.token_hex(8),  # Tells the claims of this file from an earlier one's
+        'spec': spec_fields(spec),
+        'form_size': spec.total_questions,
+        'count': len(forms)
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        mapped_file.write_header(f, MAGIC, header)
+        mapped_file.write_section(f, array('I', (i for form in forms for i in form)))
+    os.replace(tmp_path, path)
+
+
+def read_pool(path):
+    """Returns (header, forms), forms as tuples of store positions"""
+    opened = mapped_file.open_sections(path, MAGIC)
+    if opened is None:
+        raise ValueError(f"{path} is not a form pool")
+    header, section = opened
+    size = header['form_size']
+    positions = section('I', header['count'] * size)
+    forms = [tuple(positions[i:i + size]) for i in range(0, len(positions), size)]
+    return header, forms
+
+
+class FormPool:
+    """Forms of one pool file, handed out first in first out"""
+
+    def __init__(self, path, spec, target):
+        self.path = path
+        self.claims_path = path + CLAIMS_SUFFIX
+        self.spec = spec
+        self.target = target  # Size a refill brings the pool back to
+        self.refilling = False
+        self.lock = threading.Lock()  # Guards the state below, taken before the claims flock
+        self.file_id = None  # (inode, mtime) of the pool file the forms were read from
+        self.generation = None
+        self.bank_version = None
+        self.forms = []
+        self.order = deque()  # Form numbers in hand-out order, may hold claimed ones
+        self.claimed = set()
+        self.claims_read = 0  # Bytes of the claims file applied to claimed
+
+    def read(self):
+        """(Re)read the pool file when another process rewrote it"""
+        stat = os.stat(self.path)
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self.file_id:
+            return
+        header, forms = read_pool(self.path)
+        self.file_id = file_id
+        self.generation = header['generation'].encode('ascii')
+        self.bank_version = header['bank_version']
+        self.forms = forms
+        self.order = deque(range(len(forms)))
+        self.claimed = set()
+        self.claims_read = 0
+
+    @property
+    def available(self):
+        return len(self.forms) - len(self.claimed)
+
+
+class _Claims:
+    """The claims file of a pool, locked against the other workers while open"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __enter__(self):
+        self.file = open(self.pool.claims_path, 'a+b')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()  # Releases the lock
+
+    def sync(self):
+        """Pick up a rewritten pool file and the forms other workers claimed"""
+        pool = self.pool
+        pool.read()
+        f = self.file
+        f.seek(0)
+        if f.read(len(pool.generation)) != pool.generation:
+            # Claims of an earlier pool file, none of this one's forms are taken yet
+            self.reset()
+            return
+        f.seek(max(pool.claims_read, len(pool.generation)))
+        data = f.read()
+        data = data[:len(data) - len(data) % 4]
+        numbers = array('I')
+        numbers.frombytes(data)
+        if sys.byteorder != 'little':
+            numbers.byteswap()
+        pool.claimed.update(numbers)
+        pool.claims_read = max(pool.claims_read, len(pool.generation)) + len(data)
+
+    def reset(self):
+        self.file.truncate(0)
+        self.file.write(self.pool.generation)
+        self.file.flush()
+        self.pool.claims_read = len(self.pool.generation)
+
+    def claim(self, number):
+        self.file.write(struct.pack('<I', number))
+        self.file.flush()
+        self.pool.claimed.add(number)
+        self.pool.claims_read += 4
+
+
+class FormPools:
+    """Pregenerated forms per exam configuration for one bank.
+
+    take() pops a form in O(1) and records the claim in the pool's claims
+    file, so concurrent workers never hand out the same form. When a pool
+    drops below low_water of its target, or the bank version changed, a
+    background thread of one worker regenerates forms and rewrites the pool
+    file.
+    """
+
+    def __init__(self, directory, csv_path, workers=None, low_water=0.25, threshold=DEFAULT_THRESHOLD):
+        self.directory = directory
+        self.csv_path = csv_path
+        self.workers = workers
+        self.low_water = low_water
+        self.threshold = threshold  # Near-duplicate threshold of the clusters refills follow
+        self._pools = {}  # config key -> FormPool
+        self._lock = threading.Lock()  # Guards _pools, each pool has its own lock
+
+    def load(self):
+        """Read every pool file in the directory, returns the number of unclaimed forms"""
+        if not os.path.isdir(self.directory):
+            return 0
+        loaded = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(POOL_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                header, forms = read_pool(path)
+                pool = FormPool(path, TestSpec.from_json(header['spec']), max(len(forms), 1))
+                with pool.lock, _Claims(pool) as claims:
+                    claims.sync()
+            except Exception as e:
+                print(f"Ignoring unreadable form pool {path}: {str(e)}")
+                continue
+            with self._lock:
+                self._pools[config_key(pool.spec)] = pool
+            loaded += pool.available
+        return loaded
+
+    def take(self, store, spec, blocked_ids, attempts=3):
+        """Questions of a pooled form avoiding blocked_ids, None when no form fits"""
+        with self._lock:
+            pool = self._pools.get(config_key(spec))
+        if pool is None:
+            return None
+        # Only this pool's requests wait on its claims file
+        with pool.lock:
+            try:
+                with _Claims(pool) as claims:
+                    claims.sync()
+                    if pool.bank_version != store.version:
+                        # Forms of an older bank are useless, rebuild them for this one
+                        self._start_refill(pool)
+                        return None
+                    selected = None
+                    rejected = []
+                    while pool.order and len(rejected) < attempts:
+                        number = pool.order.popleft()
+                        if number in pool.claimed:
+                            continue  # Handed out by another worker
+                        form = pool.forms[number]
+                        if all(i < len(store) and store.questions[i].id not in blocked_ids for i in form):
+                            selected = [store.questions[i] for i in form]
+                            claims.claim(number)
+                            break
+                        rejected.append(number)
+                    pool.order.extend(rejected)  # Other students can still use them
+            except OSError as e:
+                print(f"Error taking a form from {pool.path}: {str(e)}")
+                return None
+            if pool.available < pool.target * self.low_water:
+                self._start_refill(pool)
+        return selected
+
+    def _start_refill(self, pool):
+        if pool.refilling:
+            return
+        pool.refilling = True
+        threading.Thread(target=self._refill, args=(pool,), name='form-pool-refill', daemon=True).start()
+
+    def _refill(self, pool):
+        try:
+            with open(pool.path + REFILL_LOCK_SUFFIX, 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # Another worker is refilling, take() picks up its file
+                with pool.lock:
+                    missing = pool.target - pool.available
+                version, forms = build_forms(self.csv_path, pool.spec, max(missing, 1), self.workers,
+                                             threshold=self.threshold)
+                with pool.lock, _Claims(pool) as claims:
+                    claims.sync()
+                    if version == pool.bank_version:
+                        forms = [pool.forms[n] for n in pool.order if n not in pool.claimed] + forms
+                    write_pool(pool.path, version, pool.spec, forms)
+                    pool.read()
+                    claims.reset()
+            print(f"Refilled form pool {os.path.basename(pool.path)} to {len(forms)} forms")
+        except Exception as e:
+            print(f"Error refilling form pool {pool.path}: {str(e)}")
+        finally:
+            pool.refilling = False
+
+    def sizes(self):
+        with self._lock:
+            return {os.path.basename(pool.path): pool.available for pool in self._pools.values()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=os.environ.get('QUESTIONS_CSV', 'questions.csv'))
+    parser.add_argument('--spec', required=True, help='JSON file with the exam quota fields')
+    parser.add_argument('--forms', type=int, default=500, help='Forms to generate')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the CPU count')
+    parser.add_argument('--out', default=os.environ.get('FORM_POOL_DIR', 'form_pools'))
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--threshold', type=float,
+                        default=float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD)),
+                        help='Near-duplicate threshold the app uses, 0 allows near-duplicates')
+    parser.add_argument('--build-duplicates', action='store_true',
+                        default=os.environ.get('NEAR_DUPLICATE_BUILD', '0') != '0',
+                        help='Cluster the bank first when near_duplicates.py --write has not')
+    args = parser.parse_args(argv)
+
+    with open(args.spec, encoding='utf-8') as f:
+        spec = TestSpec.from_json(json.load(f))
+    version, forms = build_forms(args.csv, spec, args.forms, args.workers, args.seed,
+                                 args.threshold, args.build_duplicates)
+    os.makedirs(args.out, exist_ok=True)
+    path = pool_path(args.out, spec)
+    write_pool(path, version, spec, forms)
+    print(f"Wrote {len(forms)} forms for bank {version} to {path}")
+
+
+if __name__ == '__main__':
+    main()
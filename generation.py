@@ -0,0 +1,447 @@
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from itertools import chain
+
+import metrics
+from selector import ShuffledView, select_questions, select_exact
+from vector_select import np, select_vectorized
+
+REQUIRED_FIELDS = ['total_questions', 'category_counts', 'difficulty_counts', 'type_counts']
+MODES = ('greedy', 'exact')
+RESPONSE_FORMATS = ('verbose', 'compact')
+
+
+class GenerationError(Exception):
+    """Invalid test request, carries the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class TestSpec:
+    """Validated quota parameters of one generate-test request"""
+    __slots__ = ('total_questions', 'category_counts', 'difficulty_counts', 'type_counts',
+                 'client_used_ids', 'force_include_ids', 'mode', 'response_format', 'seed', 'paraphrase_style')
+
+    def __init__(self, total_questions, category_counts, difficulty_counts, type_counts,
+                 client_used_ids=(), force_include_ids=(), mode='greedy', response_format='verbose',
+                 seed=None, paraphrase_style=None):
+        self.total_questions = total_questions
+        self.category_counts = category_counts
+        self.difficulty_counts = difficulty_counts
+        self.type_counts = type_counts
+        self.client_used_ids = set(client_used_ids)
+        self.force_include_ids = list(force_include_ids)  # Retests sent by older clients
+        self.mode = mode  # 'exact' solves the quotas before falling back to greedy
+        self.response_format = response_format  # 'compact' sends ids, text comes from the bank endpoint
+        self.seed = seed  # Same seed, bank and used questions give the same test
+        self.paraphrase_style = paraphrase_style  # Serve paraphrased variants of this style, or 'any'
+
+    def rng(self):
+        """Random generator for this request, never the shared module state"""
+        return random.Random(self.seed)
+
+    def quota_key(self):
+        return (
+            self.total_questions,
+            tuple(sorted(self.category_counts.items())),
+            tuple(sorted(self.difficulty_counts.items())),
+            tuple(sorted(self.type_counts.items())),
+            self.mode,
+            self.response_format
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        # Validate input
+        if not isinstance(data, dict) or not all(field in data for field in REQUIRED_FIELDS):
+            raise GenerationError("Missing required parameters")
+        mode = data.get('mode', 'greedy')
+        if mode not in MODES:
+            raise GenerationError("mode must be 'greedy' or 'exact'")
+        response_format = data.get('response_format', 'verbose')
+        if response_format not in RESPONSE_FORMATS:
+            raise GenerationError("response_format must be 'verbose' or 'compact'")
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+            raise GenerationError("seed must be an integer")
+        paraphrase_style = data.get('paraphrase_style')
+        if paraphrase_style is not None and not isinstance(paraphrase_style, str):
+            raise GenerationError("paraphrase_style must be a string")
+        return cls(
+            int(data['total_questions']),
+            data['category_counts'],
+            data['difficulty_counts'],
+            data['type_counts'],
+            data.get('used_question_ids', []),
+            data.get('force_include_ids', []),
+            mode,
+            response_format,
+            seed,
+            paraphrase_style.lower() if paraphrase_style else None
+        )
+
+
+class GeneratedTest:
+    """Result of one generation: the JSON response plus what the caller must record"""
+    __slots__ = ('response', 'selected', 'reset')
+
+    def __init__(self, response, selected, reset):
+        self.response = response
+        self.selected = selected
+        self.reset = reset
+
+
+def _ids_digest(ids):
+    digest = hashlib.blake2b(digest_size=16)
+    for qid in sorted(map(str, ids)):
+        digest.update(qid.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """LRU memo of seeded tests, keyed on everything the selection depends on.
+
+    A seeded request is deterministic given the bank version, the quotas,
+    the questions already used and the due retests, so repeated requests
+    (students retaking a published form) skip selection entirely.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(store, spec, used_ids, retest_ids):
+        return (store.version, spec.quota_key(), _ids_digest(used_ids),
+                _ids_digest(chain(retest_ids, spec.force_include_ids)), spec.seed)
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _requested_values(spec):
+    return (
+        {c for c, n in spec.category_counts.items() if n > 0},
+        {d for d, n in spec.difficulty_counts.items() if n > 0},
+        {t for t, n in spec.type_counts.items() if n > 0}
+    )
+
+
+def candidate_pool(store, spec):
+    """Questions that can ever be picked for spec's quotas, without filtering used ones.
+
+    Only buckets sharing a requested attribute qualify. The pool depends
+    only on the quotas, so a batch of students with the same quotas can
+    share it.
+    """
+    return list(chain.from_iterable(store.matching_buckets(*_requested_values(spec))))
+
+
+def generate(store, spec, server_used_ids, clock, pool=None, avoid_ids=(), retest_ids=(),
+             rng=None, cache=None, forms=None):
+    """Generate one test with partial fulfillment and proper reset logic.
+
+    server_used_ids are the ids this student already saw. retest_ids are
+    questions due for review, earliest first; they are served ahead of new
+    questions where they fit the quotas, followed by any force_include_ids
+    sent by older clients. avoid_ids are kept out of the test as long as
+    enough other questions remain (used for "no two adjacent students
+    share a question"). rng defaults to a generator seeded from spec.seed.
+    Seeded tests are memoised in cache when one is given. forms, a
+    form_pool.FormPools, serves plain requests a pregenerated form when
+    one avoids every used question. With exposure counters on the store,
+    unseeded selections skip over-exposed questions Sympson-Hetter style;
+    seeded tests stay reproducible and pooled forms are served as built.
+    """
+    if (forms is not None and spec.seed is None and not retest_ids and
+            not spec.force_include_ids and not avoid_ids):
+        selected = forms.take(store, spec, set(server_used_ids).union(spec.client_used_ids))
+        clock.lap('form_pool')
+        if selected is not None:
+            metrics.FORM_POOL_HITS.inc()
+            substitutions = {'category': {}, 'difficulty': {}, 'type': {}}
+            return GeneratedTest(build_response(store, spec, selected, substitutions), selected, False)
+    cache_key = None
+    if cache is not None and spec.seed is not None and not avoid_ids:
+        cache_key = cache.key(store, spec, set(server_used_ids).union(spec.client_used_ids), retest_ids)
+        cached = cache.get(cache_key)
+        clock.lap('cache_lookup')
+        if cached is not None:
+            metrics.GENERATION_CACHE_HITS.inc()
+            return cached
+    result = _generate(store, spec, server_used_ids, clock, pool, avoid_ids, retest_ids,
+                       rng if rng is not None else spec.rng())
+    if cache_key is not None:
+        cache.put(cache_key, result)
+    return result
+
+
+def _generate(store, spec, server_used_ids, clock, pool, avoid_ids, retest_ids, rng):
+    total_requested = spec.total_questions
+    requested_cats = spec.category_counts
+    requested_diffs = spec.difficulty_counts
+    requested_types = spec.type_counts
+    retest_questions = []
+    retest_question_ids = set()
+    for qid in chain(retest_ids, spec.force_include_ids):
+        q = store.get(qid)
+        if q is not None and q.id not in retest_question_ids:
+            retest_questions.append(q)
+            retest_question_ids.add(q.id)
+
+    # Combine client and server used IDs
+    all_used_ids = set(server_used_ids).union(spec.client_used_ids)
+
+    # Calculate remaining questions, the bank size follows the loaded snapshot
+    remaining_questions = len(store) - len(all_used_ids)
+
+    # Check if we need to serve partial batch
+    serve_partial_batch = False
+    if 0 < remaining_questions < total_requested:
+        serve_partial_batch = True
+        total_requested = remaining_questions
+        print(f"Serving partial batch of {remaining_questions} questions")
+
+    # Verify quota sums match total (only if not serving partial batch)
+    if not serve_partial_batch and (
+        sum(requested_cats.values()) != total_requested or
+        sum(requested_diffs.values()) != total_requested or
+        sum(requested_types.values()) != total_requested
+    ):
+        raise GenerationError("Quota sums must match total questions")
+    clock.lap('validation')
+
+    # Used questions are skipped unless they are due for a retest
+    blocked_ids = all_used_ids - retest_question_ids
+    available_count = len(store) - sum(1 for qid in blocked_ids if qid in store)
+
+    # Check if we need to reset due to exhaustion
+    reset_question_bank = False
+    reset_message = ""
+    if available_count < total_requested:
+        reset_question_bank = True
+        reset_message = "Question bank exhausted. All questions have been reset."
+        blocked_ids = set()  # Use all questions
+        available_count = len(store)
+        metrics.RESETS.inc()
+    if serve_partial_batch:
+        metrics.PARTIAL_BATCHES.inc()
+
+    # Optional exclusions only apply while they leave enough questions
+    avoided = {qid for qid in avoid_ids if qid in store and qid not in blocked_ids} - retest_question_ids
+    if avoided and available_count - len(avoided) >= total_requested:
+        blocked_ids = blocked_ids | avoided
+
+    admit = None
+    if store.exposure is not None and spec.seed is None:
+        exposure = store.exposure
+
+        def admit(q):
+            return exposure.admit(q.index, rng)
+
+    selection = None
+    if spec.mode == 'exact':
+        # Solve the quotas over bucket counts, greedy below is the fallback
+        selection = select_exact(
+            store, blocked_ids, total_requested, requested_cats,
+            requested_diffs, requested_types, retest_questions, rng=rng,
+            clusters=store.duplicates, admit=admit
+        )
+        if selection is None:
+            metrics.EXACT_FALLBACKS.inc()
+            print("No exact quota assignment found, falling back to greedy selection")
+        clock.lap('exact_solve' if selection else 'exact_attempt')
+
+    if selection is None and store.vector_index is not None:
+        # Same greedy passes over per-bucket counts, seeded from rng so it stays reproducible
+        selection = select_vectorized(
+            store.vector_index, total_requested, requested_cats, requested_diffs,
+            requested_types, retest_questions, blocked_ids,
+            rng=np.random.default_rng(rng.getrandbits(64)), clusters=store.duplicates, admit=admit
+        )
+        metrics.observe_stages(selection.timings)
+        clock.lap('selection')
+
+    if selection is None:
+        if pool is None:
+            pool = candidate_pool(store, spec)
+        # Shuffled lazily, used questions are skipped by the selector
+        available_questions = ShuffledView(pool, rng)
+        clock.lap('candidate_filtering')
+        selection = select_questions(
+            available_questions, total_requested, requested_cats,
+            requested_diffs, requested_types, retest_questions, blocked_ids,
+            clusters=store.duplicates, admit=admit
+        )
+        metrics.observe_stages(selection.timings)
+        clock.lap('selection')
+    selected = selection.selected
+    actual_counts = selection.actual_counts
+    substitutions = selection.substitutions
+    for requested_diff, provided in substitutions['difficulty'].items():
+        for provided_diff in provided:
+            metrics.SUBSTITUTIONS.labels(requested_diff, provided_diff).inc()
+
+    # Generate deviation messages
+    messages = []
+    adjustments = []
+
+    if serve_partial_batch:
+        msg = f"Only {remaining_questions} questions available in this batch."
+        messages.append(msg)
+        adjustments.append(msg)
+
+    if reset_question_bank:
+        messages.append(reset_message)
+        adjustments.append(reset_message)
+
+    # Category deviations
+    for cat, req_count in requested_cats.items():
+        act_count = actual_counts['category'].get(cat, 0)
+        if act_count != req_count:
+            if act_count < req_count:
+                provided_instead = None
+                for c, cnt in actual_counts['category'].items():
+                    if cnt > 0 and c != cat:
+                        provided_instead = c
+                        break
+
+                if provided_instead:
+                    msg = (f"Could only provide {act_count} out of {req_count} "
+                          f"{cat} category questions (provided {provided_instead} instead)")
+                else:
+                    msg = (f"Could only provide {act_count} out of {req_count} "
+                          f"{cat} category questions")
+                messages.append(msg)
+                adjustments.append(msg)
+
+    # Difficulty deviations - with accurate substitution reporting
+    for diff, req_count in requested_diffs.items():
+        act_count = actual_counts['difficulty'].get(diff, 0)
+        if act_count != req_count:
+            if act_count < req_count:
+                # Check if we have substitution records
+                if diff in substitutions['difficulty']:
+                    # Get the most common substitution
+                    if substitutions['difficulty'][diff]:
+                        sub_counts = {}
+                        for sub in substitutions['difficulty'][diff]:
+                            sub_counts[sub] = sub_counts.get(sub, 0) + 1
+                        most_common_sub = max(sub_counts.items(), key=lambda x: x[1])[0]
+                        msg = (f"Could only provide {act_count} out of {req_count} "
+                              f"{diff} difficulty questions (provided {most_common_sub} instead)")
+                    else:
+                        msg = (f"Could only provide {act_count} out of {req_count} "
+                              f"{diff} difficulty questions")
+                else:
+                    # Fallback to checking actual counts
+                    provided_instead = None
+                    if diff == 'Medium':
+                        if actual_counts['difficulty'].get('Hard', 0) > 0:
+                            provided_instead = 'Hard'
+                        elif actual_counts['difficulty'].get('Easy', 0) > 0:
+                            provided_instead = 'Easy'
+                    else:
+                        for d, cnt in actual_counts['difficulty'].items():
+                            if cnt > 0 and d != diff:
+                                provided_instead = d
+                                break
+
+                    if provided_instead:
+                        msg = (f"Could only provide {act_count} out of {req_count} "
+                              f"{diff} difficulty questions (provided {provided_instead} instead)")
+                    else:
+                        msg = (f"Could only provide {act_count} out of {req_count} "
+                              f"{diff} difficulty questions")
+                messages.append(msg)
+                adjustments.append(msg)
+
+    # Type deviations
+    for q_type, req_count in requested_types.items():
+        act_count = actual_counts['type'].get(q_type, 0)
+        if act_count != req_count:
+            if act_count < req_count:
+                provided_instead = None
+                for t, cnt in actual_counts['type'].items():
+                    if cnt > 0 and t != q_type:
+                        provided_instead = t
+                        break
+
+                if provided_instead:
+                    msg = (f"Could only provide {act_count} out of {req_count} "
+                          f"{q_type} type questions (provided {provided_instead} instead)")
+                else:
+                    msg = (f"Could only provide {act_count} out of {req_count} "
+                          f"{q_type} type questions")
+                messages.append(msg)
+                adjustments.append(msg)
+
+    # Same flag for every item, so compute it once instead of per question
+    substituted_for_medium = set(substitutions['difficulty'].get('Medium', []))
+    substituted_for_hard = set(substitutions['difficulty'].get('Hard', []))
+    was_substituted = any(
+        (q['difficulty'] in substituted_for_medium and requested_diffs.get('Medium', 0) > 0) or
+        (q['difficulty'] in substituted_for_hard and requested_diffs.get('Hard', 0) > 0)
+        for q in selected
+    )
+
+    clock.lap('deviation_messages')
+
+    response = build_response(store, spec, selected, substitutions, messages, adjustments,
+                              reset_question_bank, reset_message, serve_partial_batch, was_substituted)
+    return GeneratedTest(response, selected, reset_question_bank)
+
+
+def build_response(store, spec, selected, substitutions, messages=(), adjustments=(),
+                   reset_question_bank=False, reset_message="", partial_batch=False,
+                   was_substituted=False):
+    """The generate-test JSON body in the format spec asks for"""
+    if spec.response_format == 'compact':
+        # Per-question flags are identical, so they are sent once
+        return {
+            'bank_version': store.version,
+            'bank_size': len(store),
+            'test': [q.id for q in selected],
+            'is_fallback': reset_question_bank,
+            'was_substituted': was_substituted,
+            'messages': list(messages),
+            'reset_question_bank': reset_question_bank,
+            'reset_message': reset_message if reset_question_bank else None,
+            'partial_batch': partial_batch,
+            'substitutions': substitutions
+        }
+    return {
+        'test': [{
+            'id': q['id'],
+            'question': q['question'],
+            'category': q['category'],
+            'difficulty': q['difficulty'],
+            'type': q['type'],
+            'is_fallback': reset_question_bank,
+            'was_substituted': was_substituted
+        } for q in selected],
+        'bank_size': len(store),
+        'messages': list(messages),
+        'adjustments': list(adjustments),
+        'reset_question_bank': reset_question_bank,
+        'reset_message': reset_message if reset_question_bank else None,
+        'partial_batch': partial_batch,
+        'substitutions': substitutions
+    }
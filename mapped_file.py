@@ -0,0 +1,78 @@
+"""Section files shared by the bank cache, the near-duplicate clusters and the form pools.
+
+Layout: 8-byte magic, little-endian uint32 header length, JSON header, then
+column sections, each starting at an 8-byte boundary. Columns are stored
+little-endian and mapped as they are, so files are only read back on
+little-endian hosts.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+
+def write_header(f, magic, header):
+    """Start a file with magic and the JSON encoded header dict"""
+    encoded = json.dumps(header).encode('utf-8')
+    f.write(magic)
+    f.write(struct.pack('<I', len(encoded)))
+    f.write(encoded)
+
+
+def pad(f):
+    """Align the next section to 8 bytes"""
+    f.write(bytes(-f.tell() % 8))
+
+
+def write_column(f, column):
+    """Append an array in little-endian order"""
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    column.tofile(f)
+
+
+def read_column(f, typecode):
+    """Whole file f as an array written by write_column"""
+    f.seek(0)
+    column = array(typecode)
+    column.frombytes(f.read())
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+
+def write_section(f, column):
+    pad(f)
+    write_column(f, column)
+
+
+def open_sections(path, magic):
+    """(header, section reader) of a mapped file, None when it is missing or not a magic file.
+
+    section(fmt, length) returns the next section as a read-only memoryview
+    of length items of the struct format fmt.
+    """
+    if sys.byteorder != 'little' or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(magic)] != magic:
+        return None
+    (header_len,) = struct.unpack_from('<I', mm, len(magic))
+    position = len(magic) + 4
+    header = json.loads(mm[position:position + header_len])
+    position += header_len
+    view = memoryview(mm)
+
+    def section(fmt, length):
+        nonlocal position
+        position += -position % 8
+        size = length * struct.calcsize(fmt)
+        column = view[position:position + size].cast(fmt)
+        position += size
+        return column
+
+    return header, section
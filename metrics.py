@@ -0,0 +1,229 @@
+"""Prometheus counters and histograms for test generation, served at /metrics.
+
+Values live in the memory of the process that observed them: under
+gunicorn every worker exports only its own requests and a scrape reaches
+whichever worker accepts it. Scrape each worker separately (e.g. one
+port per worker) or run a single worker when the totals matter.
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Stages are mostly sub-millisecond, so start the buckets at 100us
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self.labels()  # Export 0 before the first increment
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'generate_test_stage_seconds',
+    'Time spent in each stage of test generation', ['stage'])
+REQUEST_SECONDS = registry.histogram(
+    'generate_test_request_seconds',
+    'Total time to handle a test generation request', ['status'])
+RESETS = registry.counter(
+    'generate_test_resets_total',
+    'Requests that reset an exhausted question bank')
+PARTIAL_BATCHES = registry.counter(
+    'generate_test_partial_batches_total',
+    'Requests served with fewer questions than asked for')
+SUBSTITUTIONS = registry.counter(
+    'generate_test_substitutions_total',
+    'Questions served in place of a requested difficulty', ['requested', 'provided'])
+EXACT_FALLBACKS = registry.counter(
+    'generate_test_exact_fallbacks_total',
+    'Exact-mode requests that fell back to greedy selection')
+GENERATION_CACHE_HITS = registry.counter(
+    'generate_test_cache_hits_total',
+    'Seeded requests answered from the memoised test cache')
+FORM_POOL_HITS = registry.counter(
+    'generate_test_form_pool_hits_total',
+    'Requests served a pregenerated form')
+COALESCED_REQUESTS = registry.counter(
+    'generate_test_coalesced_total',
+    'Requests that shared an identical in-flight generation')
+ERRORS = registry.counter(
+    'generate_test_errors_total',
+    'Test generation requests that failed with an internal error')
+
+
+class StageClock:
+    """Times consecutive stages of one request, one perf_counter call per stage"""
+    __slots__ = ('last',)
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        STAGE_SECONDS.labels(stage).observe(now - self.last)
+        self.last = now
+
+
+def observe_stages(timings):
+    """Record stage timings measured elsewhere, e.g. by the selector"""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def timed_request(histogram):
+    """Decorate a Flask view so its duration is observed labelled by status code"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = 500
+            try:
+                result = view(*args, **kwargs)
+                if isinstance(result, tuple):
+                    status = result[1]
+                else:
+                    status = getattr(result, 'status_code', 200)
+                return result
+            finally:
+                histogram.labels(status).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
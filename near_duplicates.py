@@ -0,0 +1,249 @@
+"""Near-duplicate clusters of question texts, via MinHash and LSH.
+
+Each question text is reduced to character 5-gram shingles and a MinHash
+signature of SIGNATURE_SIZE 32-bit values. Signatures are split into
+bands, questions sharing a band are candidates, and candidates whose
+estimated Jaccard similarity reaches the threshold are merged into one
+cluster. The selector looks clusters up by store position in O(1).
+
+Clustering is done offline and saved next to the CSV (questions.csv ->
+questions.csv.dups) for one bank version and threshold. The app maps the
+clusters at load, so workers neither hash the bank nor hold signatures:
+
+    python near_duplicates.py questions.csv --threshold 0.8 --write
+
+The file also keeps every text's signature under a 64-bit digest of the
+text, so rewriting it after an edit only hashes new or edited questions.
+It is a mapped_file with uint32 sections (cluster of every position,
+positions of multi-question clusters grouped by cluster, group lengths),
+the uint64 text digests and their signatures.
+"""
+import argparse
+import os
+import random
+import zlib
+from array import array
+
+import mapped_file
+from question_text import normalize_text, text_key
+
+try:
+    import numpy as np
+except ImportError:  # Optional, signatures are computed in pure Python without it
+    np = None
+
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 32
+BANDS = 8  # 8 bands of 4 rows, pairs above ~0.6 similarity are likely candidates
+ROWS_PER_BAND = SIGNATURE_SIZE // BANDS
+DEFAULT_THRESHOLD = 0.8
+MAX_BUCKET_COMPARISONS = 8
+DUPLICATES_SUFFIX = '.dups'
+MAGIC = b'QDUPS\x00\x01\n'
+_PRIME = 4294967311  # Smallest prime above 2**32
+
+_rng = random.Random(0x5EED)  # Fixed, signatures must be comparable across runs
+_A = [_rng.randrange(1, 1 << 31) for _ in range(SIGNATURE_SIZE)]
+_B = [_rng.randrange(0, 1 << 31) for _ in range(SIGNATURE_SIZE)]
+if np is not None:
+    _A_NP = np.array(_A, dtype=np.uint64)[:, None]
+    _B_NP = np.array(_B, dtype=np.uint64)[:, None]
+
+
+def shingles(text):
+    """32-bit hashes of the character shingles of an already normalized text"""
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode('utf-8'))}
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode('utf-8'))
+            for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """MinHash signature of a normalized text as SIGNATURE_SIZE uint32 values"""
+    hashes = shingles(text)
+    if np is not None:
+        x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+        return array('I', ((_A_NP * x + _B_NP) % _PRIME).min(axis=1).astype(np.uint32).tobytes())
+    return array('I', (min((a * x + b) % _PRIME for x in hashes) & 0xFFFFFFFF
+                       for a, b in zip(_A, _B)))
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / SIGNATURE_SIZE
+
+
+class DuplicateClusters:
+    """Cluster of every store position, clusters of one question are the position itself"""
+    __slots__ = ('cluster_of', 'members')
+
+    def __init__(self, cluster_of, members):
+        self.cluster_of = cluster_of  # array of cluster ids indexed by store position
+        self.members = members  # cluster id -> positions, only clusters with several questions
+
+    def __len__(self):
+        return len(self.members)
+
+    def mates(self, position):
+        """Other positions in the same cluster"""
+        cluster = self.cluster_of[position]
+        return [p for p in self.members.get(cluster, ()) if p != position]
+
+
+class NearDuplicateIndex:
+    """Builds DuplicateClusters for stores, reusing signatures of unchanged texts"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, signatures=None):
+        self.threshold = threshold
+        self.signatures = signatures or {}  # text_key -> signature, from the latest build
+
+    def build(self, store):
+        signatures = {}
+        previous = self.signatures
+        texts = []  # text_key of every position
+        for q in store.questions:
+            text = normalize_text(q.question)
+            key = text_key(text)
+            if key not in signatures:
+                signatures[key] = previous.get(key) or signature(text)
+            texts.append(key)
+        self.signatures = signatures  # Drop signatures of removed questions
+
+        parent = list(range(len(texts)))
+
+        def find(p):
+            while parent[p] != p:
+                parent[p] = parent[parent[p]]
+                p = parent[p]
+            return p
+
+        def union(a, b):
+            a, b = find(a), find(b)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        # Identical texts first, then LSH candidates checked against the threshold
+        first_with_text = {}
+        for position, text in enumerate(texts):
+            first = first_with_text.setdefault(text, position)
+            if first != position:
+                union(first, position)
+        for band in range(BANDS):
+            start = band * ROWS_PER_BAND
+            buckets = {}
+            for text, position in first_with_text.items():
+                key = tuple(signatures[text][start:start + ROWS_PER_BAND])
+                buckets.setdefault(key, []).append((position, signatures[text]))
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                for position, sig in bucket[1:]:
+                    for other, other_sig in bucket[:MAX_BUCKET_COMPARISONS]:
+                        if other == position:
+                            break
+                        if find(other) != find(position) and similarity(sig, other_sig) >= self.threshold:
+                            union(other, position)
+                            break
+
+        cluster_of = array('I', (find(p) for p in range(len(texts))))
+        members = {}
+        for position, cluster in enumerate(cluster_of):
+            members.setdefault(cluster, []).append(position)
+        members = {cluster: tuple(positions) for cluster, positions in members.items()
+                   if len(positions) > 1}
+        return DuplicateClusters(cluster_of, members)
+
+
+def clusters_path_for(csv_path):
+    return csv_path + DUPLICATES_SUFFIX
+
+
+def write_clusters(path, store, clusters, threshold, signatures):
+    """Save clusters of store and the signatures they came from, replacing path atomically"""
+    grouped, lengths = array('I'), array('I')
+    for positions in clusters.members.values():
+        grouped.extend(positions)
+        lengths.append(len(positions))
+    keys = array('Q', signatures)
+    header = {
+        'bank_version': store.version,
+        'threshold': threshold,
+        'count': len(store),
+        'grouped': len(grouped),
+        'clusters': len(lengths),
+        'signatures': len(keys)
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        mapped_file.write_header(f, MAGIC, header)
+        mapped_file.write_section(f, array('I', clusters.cluster_of))
+        mapped_file.write_section(f, grouped)
+        mapped_file.write_section(f, lengths)
+        mapped_file.write_section(f, keys)
+        mapped_file.write_section(f, array('I', (value for key in keys for value in signatures[key])))
+    os.replace(tmp_path, path)
+
+
+def load_clusters(path, store, threshold):
+    """Map the clusters saved for store, None when missing or built for another version or threshold"""
+    opened = mapped_file.open_sections(path, MAGIC)
+    if opened is None:
+        return None
+    header, section = opened
+    if (header['bank_version'], header['threshold'], header['count']) != (store.version, threshold, len(store)):
+        return None
+    cluster_of = section('I', header['count'])  # Shared pages, like the bank cache
+    grouped = section('I', header['grouped'])
+    members, offset = {}, 0
+    for length in section('I', header['clusters']):
+        positions = tuple(grouped[offset:offset + length])
+        members[cluster_of[positions[0]]] = positions
+        offset += length
+    return DuplicateClusters(cluster_of, members)
+
+
+def load_signatures(path):
+    """Signatures saved in a clusters file by text_key, empty when there is none"""
+    opened = mapped_file.open_sections(path, MAGIC)
+    if opened is None:
+        return {}
+    header, section = opened
+    for name in ('count', 'grouped', 'clusters'):
+        section('I', header[name])
+    keys = section('Q', header['signatures'])
+    values = section('I', header['signatures'] * SIGNATURE_SIZE)
+    return {key: array('I', values[i * SIGNATURE_SIZE:(i + 1) * SIGNATURE_SIZE])
+            for i, key in enumerate(keys)}
+
+
+def update_clusters(csv_path, store, threshold=DEFAULT_THRESHOLD):
+    """Cluster store and save the result next to csv_path, hashing only texts the saved file lacks"""
+    path = clusters_path_for(csv_path)
+    index = NearDuplicateIndex(threshold, load_signatures(path))
+    clusters = index.build(store)
+    write_clusters(path, store, clusters, threshold, index.signatures)
+    return clusters
+
+
+def main(argv=None):
+    from question_loader import parse_questions_csv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--write', action='store_true', help=f"save the clusters to <csv>{DUPLICATES_SUFFIX} for the app")
+    args = parser.parse_args(argv)
+
+    store = parse_questions_csv(args.csv)
+    if args.write:
+        clusters = update_clusters(args.csv, store, args.threshold)
+        print(f"Wrote {clusters_path_for(args.csv)}")
+    else:
+        clusters = NearDuplicateIndex(args.threshold).build(store)
+    for positions in clusters.members.values():
+        print(' | '.join(f"{store.questions[p].id}: {store.questions[p].question}" for p in positions))
+    print(f"{len(clusters)} near-duplicate clusters in {len(store)} questions")
+
+
+if __name__ == '__main__':
+    main()
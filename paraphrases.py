@@ -0,0 +1,164 @@
+"""Paraphrased variants of question texts.
+
+The corpus is a CSV of (original, paraphrase, style) rows, fields with
+commas must be quoted and malformed rows are skipped. At load time
+every original's variants are laid out contiguously, and for each bank a
+table maps store positions straight to their slice of variants, so a
+generated test looks up variants by position without touching the text.
+"""
+import csv
+import hashlib
+import os
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+
+from question_text import normalize_text
+
+REQUIRED_COLUMNS = ['original', 'paraphrase', 'style']
+ANY_STYLE = 'any'
+
+
+def _parse_rows(reader, rejected):
+    """(original, paraphrase, style) rows, line numbers of malformed ones go to rejected"""
+    for fields in reader:
+        # A field with an unquoted comma splits into more than three, and
+        # nothing tells which of them it belonged to
+        if len(fields) == 3:
+            original, paraphrase, style = fields[0].strip(), fields[1].strip(), fields[2].strip().lower()
+            if original and paraphrase and style and style != ANY_STYLE:
+                yield original, paraphrase, style
+                continue
+        if any(field.strip() for field in fields):
+            rejected.append(reader.line_num)
+
+
+class ParaphraseIndex:
+    """Every original's variants in flat parallel arrays, grouped per original"""
+
+    def __init__(self, rows=()):
+        grouped = defaultdict(list)
+        for original, paraphrase, style in rows:
+            grouped[normalize_text(original)].append((paraphrase, style))
+        self.texts = []
+        self.styles = []
+        self.rejected = []  # CSV line numbers of skipped rows
+        self.ranges = {}  # normalized original -> (start, end) into texts and styles
+        for key, variants in grouped.items():
+            start = len(self.texts)
+            for paraphrase, style in variants:
+                self.texts.append(paraphrase)
+                self.styles.append(style)
+            self.ranges[key] = (start, len(self.texts))
+
+    @classmethod
+    def from_csv(cls, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Paraphrase CSV not found at {path}")
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = [col.strip() for col in next(reader, [])]
+            if header != REQUIRED_COLUMNS:
+                raise ValueError(f"Expected columns {REQUIRED_COLUMNS}, got {header}")
+            rejected = []
+            index = cls(_parse_rows(reader, rejected))
+        index.rejected = rejected
+        if rejected:
+            lines = ', '.join(map(str, rejected[:10])) + (', ...' if len(rejected) > 10 else '')
+            print(f"Skipped {len(rejected)} malformed rows of {path} (lines {lines}), "
+                  f"quote fields that contain commas and use a style other than '{ANY_STYLE}'")
+        return index
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def style_names(self):
+        return sorted(set(self.styles))
+
+    def matches(self, store):
+        """Number of store questions that have variants"""
+        return sum(1 for q in store.questions if normalize_text(q.question) in self.ranges)
+
+    def table_for(self, store):
+        """Variant slice per store position: variants of position p are texts[starts[p]:ends[p]]"""
+        starts = array('I', bytes(4 * len(store)))
+        ends = array('I', bytes(4 * len(store)))
+        for q in store.questions:
+            span = self.ranges.get(normalize_text(q.question))
+            if span is not None:
+                starts[q.index], ends[q.index] = span
+        return starts, ends
+
+
+class VariantChooser:
+    """Picks the variant each student sees, consistently across retakes.
+
+    The choice is a hash of (student, question, style), so it survives
+    restarts, and recent choices are memoised in a bounded LRU so repeated
+    tests skip the hashing and style filtering.
+    """
+
+    def __init__(self, index, max_entries=100000):
+        self.index = index
+        self.max_entries = max_entries
+        self._tables = OrderedDict()  # bank version -> (starts, ends), a few banks at most
+        self._chosen = OrderedDict()  # (user_key, question_id, style) -> variant position or -1
+        self._lock = threading.Lock()
+
+    def _table(self, store):
+        with self._lock:
+            table = self._tables.get(store.version)
+            if table is not None:
+                self._tables.move_to_end(store.version)
+                return table
+        table = self.index.table_for(store)
+        with self._lock:
+            self._tables[store.version] = table
+            while len(self._tables) > 8:
+                self._tables.popitem(last=False)
+        return table
+
+    def choose(self, store, user_key, q, style):
+        """Position of q's variant for this student in the index, -1 to keep the original"""
+        key = (user_key, q.id, style)
+        with self._lock:
+            position = self._chosen.get(key)
+            if position is not None:
+                self._chosen.move_to_end(key)
+        if position is None:
+            starts, ends = self._table(store)
+            candidates = [
+                i for i in range(starts[q.index], ends[q.index])
+                if style == ANY_STYLE or self.index.styles[i] == style
+            ]
+            position = -1
+            if candidates:
+                digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=8).digest()
+                position = candidates[int.from_bytes(digest, 'little') % len(candidates)]
+            with self._lock:
+                self._chosen[key] = position
+                while len(self._chosen) > self.max_entries:
+                    self._chosen.popitem(last=False)
+        return position
+
+    def apply(self, store, response, selected, user_key, style):
+        """Copy of a generate-test response with variant texts swapped in"""
+        variants = {}
+        for q in selected:
+            position = self.choose(store, user_key, q, style)
+            if position >= 0:
+                variants[q.id] = position
+        texts, styles = self.index.texts, self.index.styles
+        response = dict(response)
+        if response['test'] and isinstance(response['test'][0], dict):
+            response['test'] = [
+                dict(item, question=texts[variants[item['id']]],
+                     paraphrase_style=styles[variants[item['id']]])
+                if item['id'] in variants else item
+                for item in response['test']
+            ]
+        else:
+            # Compact responses only carry ids, send the swapped texts alongside
+            response['variants'] = {str(qid): texts[position] for qid, position in variants.items()}
+        return response
@@ -0,0 +1,214 @@
+"""Server-side record of the questions each session was already served.
+
+Used questions are a bitmap over store positions, stamped with the bank
+version it was recorded against. Positions move when the bank is edited,
+so each store also keeps the question ids of every version its bitmaps
+refer to, and a bitmap of an older version is mapped onto the current
+store through those ids the next time it is read.
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+MAX_MEMORY_VERSIONS = 8  # Id snapshots kept by the in-process store, older progress starts over
+
+
+class QuestionBitmap:
+    """Set of used question indices packed one bit per question"""
+    __slots__ = ('bits',)
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data)
+
+    def add(self, index):
+        byte = index >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (index & 7)
+
+    def update(self, indices):
+        for index in indices:
+            self.add(index)
+
+    def __contains__(self, index):
+        byte = index >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (index & 7)))
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def __iter__(self):
+        for byte_index, byte in enumerate(self.bits):
+            while byte:
+                low = byte & -byte
+                yield (byte_index << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def compress(self):
+        return zlib.compress(bytes(self.bits))
+
+    @classmethod
+    def decompress(cls, blob):
+        return cls(zlib.decompress(blob) if blob else b'')
+
+
+class Progress:
+    """Used questions, the bank version they refer to and the exhaustion flag of one session"""
+    __slots__ = ('used', 'exhausted', 'version')
+
+    def __init__(self, used=None, exhausted=False, version=None):
+        self.used = used if used is not None else QuestionBitmap()
+        self.exhausted = exhausted
+        self.version = version
+
+
+def question_ids(store):
+    return [q.id for q in store.questions]
+
+
+def translate(progress, store, old_ids):
+    """progress mapped onto store's positions through the ids of the version it was recorded against.
+
+    old_ids is None when that version is unknown, the history is dropped then.
+    """
+    if progress.version == store.version:
+        return progress
+    used = QuestionBitmap()
+    if old_ids is None:
+        print(f"No question ids for bank version {progress.version}, progress starts over")
+    else:
+        for position in progress.used:
+            q = store.get(old_ids[position]) if position < len(old_ids) else None
+            if q is not None:
+                used.add(q.index)
+    return Progress(used, progress.exhausted, store.version)
+
+
+class MemoryProgressStore:
+    """In-process progress store, lost on restart"""
+
+    def __init__(self):
+        self._progress = {}
+        self._versions = OrderedDict()  # bank version -> question ids by position
+        self._lock = threading.Lock()
+
+    def _current(self, session_id, store):
+        progress = self._progress.get(session_id)
+        if progress is None:
+            return None
+        return translate(progress, store, self._versions.get(progress.version))
+
+    def load(self, session_id, store):
+        """Progress of session_id in terms of store's positions"""
+        with self._lock:
+            progress = self._current(session_id, store)
+            if progress is None:
+                return Progress(version=store.version)
+            return Progress(QuestionBitmap(progress.used.bits), progress.exhausted, progress.version)
+
+    def record(self, session_id, store, indices, reset=False):
+        """Mark store positions as used, clearing earlier progress first when reset"""
+        with self._lock:
+            if store.version not in self._versions:
+                self._versions[store.version] = tuple(question_ids(store))
+                while len(self._versions) > MAX_MEMORY_VERSIONS:
+                    self._versions.popitem(last=False)
+            progress = self._current(session_id, store)
+            if progress is None or reset:
+                progress = Progress(exhausted=reset or (progress is not None and progress.exhausted))
+            progress.version = store.version
+            progress.used.update(indices)
+            self._progress[session_id] = progress
+
+    def close(self):
+        pass
+
+
+class SQLiteProgressStore:
+    """Progress store persisted in SQLite so it survives restarts"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS progress ('
+                'session_id TEXT PRIMARY KEY, used BLOB NOT NULL, '
+                'exhausted INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, version TEXT NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS bank_versions (version TEXT PRIMARY KEY, ids BLOB NOT NULL)'
+            )
+        self._saved_versions = set()
+        self._ids = OrderedDict()  # A couple of decoded id snapshots, for the sessions of the previous version
+
+    def _version_ids(self, version):
+        ids = self._ids.get(version)
+        if ids is None:
+            row = self._conn.execute('SELECT ids FROM bank_versions WHERE version = ?', (version,)).fetchone()
+            if row is None:
+                return None
+            ids = json.loads(zlib.decompress(row[0]))
+            self._ids[version] = ids
+            while len(self._ids) > 2:
+                self._ids.popitem(last=False)
+        return ids
+
+    def _fetch(self, session_id, store):
+        row = self._conn.execute(
+            'SELECT used, exhausted, version FROM progress WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        progress = Progress(QuestionBitmap.decompress(row[0]), bool(row[1]), row[2])
+        if progress.version == store.version:
+            return progress
+        return translate(progress, store, self._version_ids(progress.version))
+
+    def load(self, session_id, store):
+        """Progress of session_id in terms of store's positions"""
+        with self._lock:
+            return self._fetch(session_id, store) or Progress(version=store.version)
+
+    def record(self, session_id, store, indices, reset=False):
+        """Mark store positions as used, clearing earlier progress first when reset"""
+        with self._lock:
+            if store.version not in self._saved_versions:
+                # Once per version, so bitmaps recorded now can be translated after the next edit
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO bank_versions (version, ids) VALUES (?, ?)',
+                    (store.version, zlib.compress(json.dumps(question_ids(store)).encode('utf-8')))
+                )
+                self._saved_versions.add(store.version)
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                progress = self._fetch(session_id, store)
+                if progress is None or reset:
+                    progress = Progress(exhausted=reset or (progress is not None and progress.exhausted))
+                progress.used.update(indices)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO progress (session_id, used, exhausted, updated_at, version) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (session_id, progress.used.compress(), int(progress.exhausted), time.time(), store.version)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_progress_store(spec):
+    """Build a progress store from 'memory' or 'sqlite:<path>'"""
+    if not spec or spec == 'memory':
+        return MemoryProgressStore()
+    if spec.startswith('sqlite:'):
+        return SQLiteProgressStore(spec[len('sqlite:'):])
+    raise ValueError(f"Unknown progress store: {spec}")
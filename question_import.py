@@ -0,0 +1,133 @@
+"""Streaming import of large question CSVs into the compiled question cache.
+
+Rows are read and validated in chunks of bounded size with the loader's
+own row rules. Valid rows go straight into the cache file next to
+the CSV, and each rejected row is written to an error report instead of
+failing the whole bank:
+
+    python question_import.py questions.csv --chunk-rows 50000
+
+The report is a CSV of (line, id, error), questions.csv.errors.csv by
+default. A cache built with rejected rows is marked incomplete: the app
+serves it right after the import, but later startups refuse it and import
+again, so a broken bank keeps reporting its errors.
+"""
+import argparse
+import csv
+import os
+import time
+
+import bank_cache
+from question_loader import check_columns, validate_row
+
+DEFAULT_CHUNK_ROWS = 20000
+ERROR_REPORT_SUFFIX = '.errors.csv'
+MAX_LISTED_ERRORS = 20  # Kept on the report object, the file has them all
+
+
+class ImportReport:
+    """Outcome of one import: row counts, a sample of errors and the throughput"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []  # First MAX_LISTED_ERRORS (line, id, error)
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add_error(self, line, qid, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_LISTED_ERRORS:
+            self.errors.append((line, qid, error))
+
+    def summary(self):
+        return (f"Imported {self.imported} of {self.rows} rows, rejected {self.rejected}, "
+                f"in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s)")
+
+
+def import_questions(csv_path, chunk_rows=DEFAULT_CHUNK_ROWS, error_report=None, progress=None):
+    """Stream csv_path into its compiled cache, returns an ImportReport.
+
+    error_report is a path for the per-row error CSV, None skips it.
+    progress(report) is called after every chunk. Raises ValueError when
+    required columns are missing, nothing is written then.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV file not found at {csv_path}")
+    report = ImportReport()
+    started = time.perf_counter()
+    seen_ids = set()
+    writer = None
+    errors_file = None
+    try:
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            check_columns(reader.fieldnames)
+            writer = bank_cache.CacheWriter(csv_path)
+            if error_report:
+                errors_file = open(error_report, 'w', newline='', encoding='utf-8')
+                errors_csv = csv.writer(errors_file)
+                errors_csv.writerow(['line', 'id', 'error'])
+            columns = ([], [], [], [], [])
+
+            def flush():
+                if columns[0]:
+                    writer.add(*columns)
+                    report.imported += len(columns[0])
+                    for column in columns:
+                        column.clear()
+                report.seconds = time.perf_counter() - started
+                if progress is not None:
+                    progress(report)
+
+            for row in reader:
+                report.rows += 1
+                result = validate_row(row, seen_ids)
+                if isinstance(result, str):
+                    report.add_error(reader.line_num, row.get('id'), result)
+                    if errors_file is not None:
+                        errors_csv.writerow([reader.line_num, row.get('id'), result])
+                else:
+                    seen_ids.add(result[0])
+                    for column, value in zip(columns, result):
+                        column.append(value)
+                if report.rows % chunk_rows == 0:
+                    flush()
+            if report.rows % chunk_rows:
+                flush()
+        writer.finish(rejected=report.rejected)
+        writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+        if errors_file is not None:
+            errors_file.close()
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--errors', help=f"error report path, defaults to <csv>{ERROR_REPORT_SUFFIX}")
+    args = parser.parse_args(argv)
+
+    def progress(report):
+        print(f"  {report.rows} rows, {report.rejected} rejected, {report.rows_per_second:,.0f} rows/s")
+
+    error_report = args.errors or args.csv + ERROR_REPORT_SUFFIX
+    report = import_questions(args.csv, args.chunk_rows, error_report, progress)
+    print(report.summary())
+    for line, qid, error in report.errors:
+        print(f"  line {line} (id {qid}): {error}")
+    if report.rejected:
+        print(f"All rejected rows are listed in {error_report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import csv
+import os
+
+from bank_cache import file_sha256
+from question_store import (QuestionStore, REQUIRED_COLUMNS, VALID_DIFFICULTIES, MIN_INT_ID, MAX_INT_ID,
+                            parse_question_id)
+
+MAX_LISTED_ROW_ERRORS = 5  # Shown in the ValueError of a bank with bad rows
+
+
+def normalize_question_row(row):
+    """Clean and standardize one CSV row, returns (id, question, category, difficulty, type)"""
+    return (
+        parse_question_id(row['id']),
+        row['question'],
+        str(row['category']).upper().strip(),
+        str(row['difficulty']).capitalize().strip(),
+        str(row['type']).strip()
+    )
+
+
+def check_columns(fieldnames):
+    """Raise ValueError unless every required column is present"""
+    fieldnames = fieldnames or []
+    if not all(col in fieldnames for col in REQUIRED_COLUMNS):
+        missing = [col for col in REQUIRED_COLUMNS if col not in fieldnames]
+        raise ValueError(f"Missing required columns: {missing}")
+
+
+def validate_row(row, seen_ids):
+    """Normalised (id, question, category, difficulty, type) of a raw row, or an error message.
+
+    Both the loader and question_import use this, so a row is accepted or
+    rejected the same way whichever path reads the bank.
+    """
+    if None in row:
+        return "more fields than columns"
+    missing = [col for col in REQUIRED_COLUMNS if row.get(col) is None or not str(row[col]).strip()]
+    if missing:
+        return f"missing values for {missing}"
+    qid, question, category, difficulty, q_type = normalize_question_row(row)
+    if isinstance(qid, int) and not MIN_INT_ID <= qid <= MAX_INT_ID:
+        return f"id {qid} is outside the 64-bit integer range"
+    if qid in seen_ids:
+        return f"duplicate id {qid!r}"
+    if difficulty not in VALID_DIFFICULTIES:
+        return f"invalid difficulty {difficulty!r}, expected one of {VALID_DIFFICULTIES}"
+    return qid, question, category, difficulty, q_type
+
+
+def parse_questions_csv(path):
+    """Parse and validate a questions CSV into a new read-only question store"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"CSV file not found at {path}")
+
+    ids, questions, categories, difficulties, types = [], [], [], [], []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        check_columns(reader.fieldnames)
+        # Attribute values repeat a lot, so share one string object per value
+        interned = {}
+        seen_ids = set()
+        errors = []
+        for row in reader:
+            result = validate_row(row, seen_ids)
+            if isinstance(result, str):
+                errors.append(f"line {reader.line_num}: {result}")
+                continue
+            qid, question, category, difficulty, q_type = result
+            seen_ids.add(qid)
+            ids.append(qid)
+            questions.append(question)
+            categories.append(interned.setdefault(category, category))
+            difficulties.append(interned.setdefault(difficulty, difficulty))
+            types.append(interned.setdefault(q_type, q_type))
+
+    if errors:
+        listed = '; '.join(errors[:MAX_LISTED_ROW_ERRORS])
+        more = f" and {len(errors) - MAX_LISTED_ROW_ERRORS} more" if len(errors) > MAX_LISTED_ROW_ERRORS else ''
+        raise ValueError(f"Invalid rows: {listed}{more}")
+
+    # Build the store once so requests never copy the bank
+    return QuestionStore.from_columns(ids, questions, categories, difficulties, types,
+                                      version=file_sha256(path)[:16])
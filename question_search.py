@@ -0,0 +1,263 @@
+"""Text search and attribute filters over a question bank.
+
+Question texts are split into lowercase word tokens. Every token has a
+posting list of the store positions containing it, in position order, and
+the sorted vocabulary answers prefix terms with a bisect. Every store
+position also carries the id of its (category, difficulty, type) bucket,
+so filters and facet counts work on per-bucket counts rather than on
+the questions themselves.
+
+Query syntax: words must all match, word* matches any word starting with
+word, and "quoted words" must appear next to each other in that order:
+
+    python question_search.py questions.csv 'golf swing*' --category Rules
+
+The index is built on a bank's first search. Tokens are memoised by a
+digest of the text for as long as the previous version's index is alive,
+so rebuilding it after a reload only tokenizes new or edited questions.
+"""
+import argparse
+import base64
+import heapq
+import re
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import islice
+
+from generation import GenerationError
+from question_text import text_key
+
+FACETS = ('category', 'difficulty', 'type')  # Bucket key order in QuestionStore
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_QUERY_TERMS = 16
+
+_WORD = re.compile(r'\w+')
+_QUERY_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+class SearchIndex:
+    """Token and bucket postings of one store"""
+
+    def __init__(self, store, tokens_of, tokens_by_key):
+        self.store = store
+        self.tokens_of = tokens_of  # Store position -> token tuple
+        self.tokens_by_key = tokens_by_key  # text_key -> token tuple, reused by the next version's build
+        postings = {}
+        for position, tokens in enumerate(tokens_of):
+            for token in set(tokens):
+                postings.setdefault(token, array('I')).append(position)
+        self.postings = postings  # token -> positions in ascending order
+        self.vocabulary = sorted(postings)
+        self.bucket_keys = list(store.buckets)  # bucket id -> (category, difficulty, type)
+        bucket_ids = {key: i for i, key in enumerate(self.bucket_keys)}
+        self.bucket_of = array('I', (bucket_ids[(q.category, q.difficulty, q.type)] for q in store.questions))
+        self.bucket_positions = [array('I', (q.index for q in store.buckets[key])) for key in self.bucket_keys]
+        self.nbytes = self._estimate_nbytes()
+
+    def _estimate_nbytes(self):
+        """Rough bytes kept alive, for the bank registry's memory budget"""
+        tuples = {id(tokens): len(tokens) for tokens in self.tokens_by_key.values()}
+        return (
+            sum(80 + 4 * len(positions) for positions in self.postings.values())
+            + sum(50 + len(token) for token in self.vocabulary) + 16 * len(self.vocabulary)
+            + sum(48 + 8 * size for size in tuples.values()) + 105 * len(self.tokens_by_key)
+            + 12 * len(self.tokens_of)  # tokens_of and bucket_of
+            + 4 * len(self.tokens_of)
+        )
+
+    def _prefix_positions(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        end = bisect_left(self.vocabulary, prefix + '\U0010ffff')
+        matches = [self.postings[token] for token in self.vocabulary[start:end]]
+        if len(matches) == 1:
+            return matches[0]
+        return array('I', sorted(set().union(*matches)))
+
+    def _has_phrase(self, position, phrase):
+        tokens = self.tokens_of[position]
+        size = len(phrase)
+        return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1)
+                   if tokens[i] == phrase[0])
+
+    def match(self, query):
+        """Sorted positions matching every term of query, None for an empty query"""
+        terms = parse_query(query)
+        if not terms:
+            return None
+        lists, phrases = [], []
+        for kind, value in terms:
+            if kind == 'prefix':
+                lists.append(self._prefix_positions(value))
+            else:
+                lists.extend(self.postings.get(token, ()) for token in value)
+                if kind == 'phrase' and len(value) > 1:
+                    phrases.append(value)
+        # Walk the shortest list and bisect into the others
+        lists.sort(key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if not result:
+                break
+            result = [p for p in result if _contains(other, p)]
+        for phrase in phrases:
+            result = [p for p in result if self._has_phrase(p, phrase)]
+        return result
+
+    def search(self, query='', filters=None, limit=DEFAULT_LIMIT, after=-1):
+        """One page of matches past position after, the total and the facet counts.
+
+        filters maps facet names to accepted values, values of one facet are
+        alternatives. Each facet counts the matches of the query and the
+        other facets' filters, so a client can show what changing it gives.
+        """
+        filters = filters or {}
+        accepted = [set(filters.get(name) or ()) for name in FACETS]
+        matched = self.match(query)
+        if matched is None:
+            per_bucket = {b: len(positions) for b, positions in enumerate(self.bucket_positions)}
+        else:
+            per_bucket = Counter(map(self.bucket_of.__getitem__, matched))
+
+        total = 0
+        allowed = set()
+        facets = {name: {} for name in FACETS}
+        for b, count in per_bucket.items():
+            key = self.bucket_keys[b]
+            passes = [not values or value in values for value, values in zip(key, accepted)]
+            if all(passes):
+                total += count
+                allowed.add(b)
+            for i, name in enumerate(FACETS):
+                if all(passes[:i]) and all(passes[i + 1:]):
+                    facets[name][key[i]] = facets[name].get(key[i], 0) + count
+
+        if matched is None:
+            tails = [positions[bisect_right(positions, after):]
+                     for b, positions in enumerate(self.bucket_positions) if b in allowed]
+            candidates = heapq.merge(*tails)
+        else:
+            bucket_of = self.bucket_of
+            candidates = (p for p in islice(matched, bisect_right(matched, after), None)
+                          if bucket_of[p] in allowed)
+        page = list(islice(candidates, limit + 1))
+        has_more = len(page) > limit
+        page = page[:limit]
+        return {
+            'total': total,
+            'questions': [self.store.questions[p] for p in page],
+            'facets': {name: dict(sorted(counts.items())) for name, counts in facets.items()},
+            'next_after': page[-1] if has_more else None
+        }
+
+
+class SearchIndexBuilder:
+    """Builds SearchIndex for the versions of one bank, reusing the tokens of unchanged texts.
+
+    The memo is the latest index's, held weakly, so it goes away with the
+    store it was built for instead of outliving an evicted bank.
+    """
+
+    def __init__(self):
+        self._latest = None  # weakref to the latest SearchIndex
+
+    @property
+    def warm(self):
+        """True while the index of an earlier version is alive to reuse"""
+        return self._latest is not None and self._latest() is not None
+
+    def build(self, store):
+        latest = self._latest() if self._latest is not None else None
+        previous = latest.tokens_by_key if latest is not None else {}
+        del latest
+        tokens_by_key = {}
+        vocabulary = {}  # One string object per distinct token
+        tokens_of = []
+        for q in store.questions:
+            key = text_key(q.question)
+            found = tokens_by_key.get(key)
+            if found is None:
+                found = previous.get(key)
+                if found is None:
+                    found = tuple(vocabulary.setdefault(token, token) for token in tokenize(q.question))
+                tokens_by_key[key] = found
+            tokens_of.append(found)
+        index = SearchIndex(store, tokens_of, tokens_by_key)
+        self._latest = weakref.ref(index)
+        return index
+
+
+def _contains(positions, position):
+    i = bisect_left(positions, position)
+    return i < len(positions) and positions[i] == position
+
+
+def parse_query(query):
+    """('word', tokens), ('prefix', token) and ('phrase', tokens) terms of a query string"""
+    terms = []
+    for quoted, word in _QUERY_TERM.findall(query):
+        if quoted:
+            tokens = tuple(tokenize(quoted))
+            if tokens:
+                terms.append(('phrase', tokens))
+            continue
+        tokens = tuple(tokenize(word))
+        if word.endswith('*') and tokens:
+            if tokens[:-1]:
+                terms.append(('word', tokens[:-1]))
+            terms.append(('prefix', tokens[-1]))
+        elif tokens:
+            terms.append(('word', tokens))
+    if len(terms) > MAX_QUERY_TERMS:
+        raise GenerationError(f"At most {MAX_QUERY_TERMS} search terms")
+    if query.strip() and not terms:
+        raise GenerationError("Query has no searchable words")
+    return terms
+
+
+def encode_cursor(version, position):
+    return base64.urlsafe_b64encode(f"{version}:{position}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, version):
+    """Position a cursor continues after, raises GenerationError for foreign or stale cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        cursor_version, position = raw.rsplit(':', 1)
+        position = int(position)
+    except ValueError:
+        raise GenerationError("Invalid cursor")
+    if cursor_version != str(version):
+        raise GenerationError("The question bank changed, repeat the search without a cursor", 409)
+    return position
+
+
+def main(argv=None):
+    from question_loader import parse_questions_csv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv')
+    parser.add_argument('query', nargs='?', default='')
+    for name in FACETS:
+        parser.add_argument(f'--{name}', action='append', default=[])
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args(argv)
+
+    store = parse_questions_csv(args.csv)
+    index = SearchIndexBuilder().build(store)
+    result = index.search(args.query, {name: getattr(args, name) for name in FACETS}, args.limit)
+    print(f"{result['total']} matches")
+    for q in result['questions']:
+        print(f"  {q.id}: {q.question}")
+    for name, counts in result['facets'].items():
+        print(f"{name}: " + ', '.join(f"{value} ({count})" for value, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
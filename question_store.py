@@ -0,0 +1,114 @@
+from collections import defaultdict
+
+# Columns every question bank must provide
+REQUIRED_COLUMNS = ['id', 'question', 'category', 'difficulty', 'type']
+VALID_DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+MIN_INT_ID, MAX_INT_ID = -2 ** 63, 2 ** 63 - 1  # Integer ids must fit the cache's int64 column
+
+
+def parse_question_id(value):
+    """Integer ids stay integers like the old pandas loader, anything else is kept as text"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class Question:
+    """Single read-only question record.
+
+    The text stays in the shared question column (a list, or a memory-mapped
+    column from the bank cache) and is only looked up when needed.
+    """
+    __slots__ = ('index', 'id', '_texts', 'category', 'difficulty', 'type')
+
+    def __init__(self, index, qid, texts, category, difficulty, q_type):
+        self.index = index
+        self.id = qid
+        self._texts = texts
+        self.category = category
+        self.difficulty = difficulty
+        self.type = q_type
+
+    @property
+    def question(self):
+        return self._texts[self.index]
+
+    def __getitem__(self, key):
+        # Allow q['category'] style access like the old record dicts
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"Question(id={self.id!r}, {self.category}/{self.difficulty}/{self.type})"
+
+
+class QuestionStore:
+    """Immutable question bank indexed by id and by (category, difficulty, type) bucket.
+
+    Built once per load so request handlers can select from buckets
+    without copying the bank. version identifies the bank content (a hash
+    of the source file) for caches and clients.
+    """
+    __slots__ = ('questions', 'by_id', 'buckets', 'version', 'vector_index', 'duplicates', 'exposure',
+                 'search_index')
+
+    def __init__(self, questions=(), version=None):
+        questions = tuple(questions)
+        by_id = {}
+        buckets = defaultdict(list)
+        for q in questions:
+            by_id.setdefault(q.id, q)
+            buckets[(q.category, q.difficulty, q.type)].append(q)
+        self._init(questions, by_id, {key: tuple(items) for key, items in buckets.items()}, version)
+
+    def _init(self, questions, by_id, buckets, version):
+        self.questions = questions
+        self.by_id = by_id
+        self.buckets = buckets
+        self.version = version
+        self.vector_index = None  # Encoded arrays for vectorised selection, set by the loader
+        self.duplicates = None  # Near-duplicate clusters, set by the loader
+        self.exposure = None  # Shared exposure counters, set by the loader
+        self.search_index = None  # Inverted index for question search, built on the first search
+
+    @classmethod
+    def from_views(cls, questions, by_id, buckets, version=None):
+        """Build a store over ready-made sequences and lookups, like the lazy views of the bank cache.
+
+        questions is a sequence of Question, by_id anything with get,
+        __contains__ and __getitem__ by id, and buckets a dict of
+        (category, difficulty, type) -> sequence of Question.
+        """
+        store = cls.__new__(cls)
+        store._init(questions, by_id, buckets, version)
+        return store
+
+    @classmethod
+    def from_columns(cls, ids, questions, categories, difficulties, types, version=None):
+        """Build a store from already normalised column sequences"""
+        return cls((
+            Question(i, qid, questions, cat, diff, q_type)
+            for i, (qid, cat, diff, q_type) in enumerate(
+                zip(ids, categories, difficulties, types))
+        ), version)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __bool__(self):
+        return bool(self.questions)
+
+    def __contains__(self, qid):
+        return qid in self.by_id
+
+    def get(self, qid, default=None):
+        return self.by_id.get(qid, default)
+
+    def bucket(self, category, difficulty, q_type):
+        return self.buckets.get((category, difficulty, q_type), ())
+
+    def matching_buckets(self, categories=(), difficulties=(), types=()):
+        """Yield buckets sharing at least one attribute with the given values"""
+        for (cat, diff, q_type), items in self.buckets.items():
+            if cat in categories or diff in difficulties or q_type in types:
+                yield items
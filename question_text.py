@@ -0,0 +1,12 @@
+"""Keys for matching and memoising question texts across banks and versions."""
+import hashlib
+
+
+def normalize_text(text):
+    """Key for matching question texts: case and whitespace insensitive"""
+    return ' '.join(str(text).split()).casefold()
+
+
+def text_key(text):
+    """64-bit digest of a text, so memoised results don't keep the texts alive"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
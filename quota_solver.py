@@ -0,0 +1,176 @@
+import random
+import sys
+import time
+from collections import deque
+from itertools import combinations
+
+# Give up (and let the caller fall back to greedy) after this many seconds of search
+DEFAULT_TIME_BUDGET = 0.005
+_CLOCK_EVERY = 16  # Search nodes between clock reads
+
+
+class SearchLimitReached(Exception):
+    pass
+
+
+def _max_flow(sources, sinks, edges):
+    """Max flow from sources (node -> capacity) over edges ((u, v) -> capacity) into sinks"""
+    residual = {}
+    for (u, v), cap in edges.items():
+        residual.setdefault(u, {})[v] = cap
+        residual.setdefault(v, {}).setdefault(u, 0)
+    supply, demand = dict(sources), dict(sinks)
+    flow = 0
+    # Greedy start, so only the leftovers need augmenting paths
+    for (u, v), cap in edges.items():
+        amount = min(supply.get(u, 0), demand.get(v, 0), cap)
+        if amount > 0:
+            residual[u][v] -= amount
+            residual[v][u] += amount
+            supply[u] -= amount
+            demand[v] -= amount
+            flow += amount
+    while True:
+        # Breadth-first augmenting path from any source with supply left to any sink with demand left
+        parent = {u: None for u, left in supply.items() if left > 0}
+        queue = deque(parent)
+        end = None
+        while queue and end is None:
+            u = queue.popleft()
+            for v, cap in residual.get(u, {}).items():
+                if cap > 0 and v not in parent:
+                    parent[v] = u
+                    if demand.get(v, 0) > 0:
+                        end = v
+                        break
+                    queue.append(v)
+        if end is None:
+            return flow
+        path = [end]
+        while parent[path[-1]] is not None:
+            path.append(parent[path[-1]])
+        amount = min(supply[path[-1]], demand[end],
+                     min(residual[u][v] for v, u in zip(path, path[1:])))
+        for v, u in zip(path, path[1:]):
+            residual[u][v] -= amount
+            residual[v][u] += amount
+        supply[path[-1]] -= amount
+        demand[end] -= amount
+        flow += amount
+
+
+def pairwise_feasible(capacity, quotas, deadline=None):
+    """Necessary condition: every pair of attributes alone can be met.
+
+    For attributes a and b, the quotas of a must flow to the quotas of b
+    through the capacity summed over the third attribute. This rules out
+    most infeasible requests in microseconds, the search handles the rest.
+    """
+    total = sum(quotas[0].values())
+    for a, b in combinations(range(3), 2):
+        if deadline is not None and time.perf_counter() > deadline:
+            return True  # Undecided, the search gives up on the same deadline
+        edges = {}
+        for key, cap in capacity.items():
+            pair = ((a, key[a]), (b, key[b]))
+            edges[pair] = edges.get(pair, 0) + cap
+        sources = {(a, value): need for value, need in quotas[a].items()}
+        sinks = {(b, value): need for value, need in quotas[b].items()}
+        if _max_flow(sources, sinks, edges) < total:
+            return False
+    return True
+
+
+def solve_quotas(capacity, category_quota, difficulty_quota, type_quota,
+                 time_budget=DEFAULT_TIME_BUDGET, rng=random):
+    """Find how many questions to take from each (category, difficulty, type) bucket.
+
+    capacity maps bucket keys to the number of questions still available in
+    them. The three quota dicts must be met exactly. This is a small integer
+    program over bucket counts, solved by depth-first branch and bound, so the
+    cost depends on the number of buckets rather than on the bank size.
+    Exact three-way quotas are NP-hard in general, so the search stops after
+    time_budget seconds; pairwise max-flow checks reject most infeasible
+    requests before it starts.
+
+    Returns {bucket_key: count} or None when no exact assignment exists or the
+    time budget ran out.
+    """
+    deadline = time.perf_counter() + time_budget
+    quotas = (
+        {k: v for k, v in category_quota.items() if v},
+        {k: v for k, v in difficulty_quota.items() if v},
+        {k: v for k, v in type_quota.items() if v}
+    )
+    if any(v < 0 for quota in quotas for v in quota.values()):
+        return None
+    totals = {sum(quota.values()) for quota in quotas}
+    if len(totals) != 1:
+        return None
+    if totals == {0}:
+        return {}
+
+    keys = [
+        key for key, cap in capacity.items()
+        if cap > 0 and all(key[a] in quotas[a] for a in range(3))
+    ]
+    if len(keys) > sys.getrecursionlimit() - 100:
+        return None
+    # Shuffle so equally good solutions are spread across buckets,
+    # then visit scarce values first to prune early
+    rng.shuffle(keys)
+    keys.sort(key=lambda key: min(quotas[a][key[a]] for a in range(3)))
+
+    # Capacity still reachable for each value from buckets not yet decided
+    supply = ({}, {}, {})
+    for key in keys:
+        for a in range(3):
+            supply[a][key[a]] = supply[a].get(key[a], 0) + capacity[key]
+    for a in range(3):
+        if any(supply[a].get(value, 0) < need for value, need in quotas[a].items()):
+            return None
+    if not pairwise_feasible({key: capacity[key] for key in keys}, quotas, deadline):
+        return None
+
+    need = tuple(dict(quota) for quota in quotas)
+    counts = {}
+    nodes = [0]
+
+    def search(i):
+        nodes[0] += 1
+        if nodes[0] % _CLOCK_EVERY == 0 and time.perf_counter() > deadline:
+            raise SearchLimitReached()
+        if not any(need[0].values()):
+            return True
+        if i == len(keys):
+            return False
+
+        key = keys[i]
+        cap = capacity[key]
+        for a in range(3):
+            supply[a][key[a]] -= cap
+        high = min(cap, need[0][key[0]], need[1][key[1]], need[2][key[2]])
+        # Whatever later buckets can't cover must come from this one
+        low = max(0, max(need[a][key[a]] - supply[a][key[a]] for a in range(3)))
+
+        found = False
+        for take in range(high, low - 1, -1):
+            for a in range(3):
+                need[a][key[a]] -= take
+            if search(i + 1):
+                if take:
+                    counts[key] = take
+                found = True
+            for a in range(3):
+                need[a][key[a]] += take
+            if found:
+                break
+
+        for a in range(3):
+            supply[a][key[a]] += cap
+        return found
+
+    try:
+        return counts if search(0) else None
+    except SearchLimitReached:
+        return None
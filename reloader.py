@@ -0,0 +1,53 @@
+import os
+import threading
+
+
+class QuestionReloader:
+    """Runs a bank reload in the background, at most one at a time.
+
+    trigger() starts a reload on demand, watch() polls the CSV mtime and
+    reloads when the file changes.
+    """
+
+    def __init__(self, path, reload_fn):
+        self.path = path
+        self.reload_fn = reload_fn
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_mtime = self._mtime()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        try:
+            self._last_mtime = self._mtime()
+            self.reload_fn()
+        finally:
+            with self._lock:
+                self._running = False
+
+    def trigger(self):
+        """Start a background reload, returns False if one is already running"""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(target=self._run, name='question-reload', daemon=True).start()
+        return True
+
+    def watch(self, interval):
+        """Poll the CSV every interval seconds and reload when it changes"""
+        stop = threading.Event()
+
+        def poll():
+            while not stop.wait(interval):
+                mtime = self._mtime()
+                if mtime is not None and mtime != self._last_mtime:
+                    self.trigger()
+
+        threading.Thread(target=poll, name='question-watch', daemon=True).start()
+        return stop
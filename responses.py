@@ -0,0 +1,123 @@
+import gzip
+import json
+import threading
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib encoder is the fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is always available
+    brotli = None
+
+# Small bodies aren't worth the compression overhead
+MIN_COMPRESS_BYTES = 1024
+
+
+def dumps(obj):
+    """Encode obj as compact UTF-8 JSON, with orjson when it's installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def accepted_encoding():
+    """Best compression the client accepts: 'br', 'gzip' or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def encoding_for(accept_encoding):
+    """Same choice as accepted_encoding() from a raw Accept-Encoding header, outside Flask"""
+    accepted = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
+
+
+def json_response(obj, status=200, headers=None):
+    """JSON response encoded with the fast encoder and compressed when worthwhile"""
+    body = dumps(obj)
+    response = Response(body, status=status, mimetype='application/json', headers=headers)
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding() if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class BankPayload:
+    """Whole question bank as one versioned JSON document, encoded once per bank version.
+
+    Columns are sent separately and attributes dictionary-encoded, so the
+    payload is a fraction of the per-item test format. Compressed variants
+    are built on first request and kept with the encoded body.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._variants = {}
+
+    @staticmethod
+    def build(store):
+        columns = {'category': {}, 'difficulty': {}, 'type': {}}
+        codes = {attr: [] for attr in columns}
+        for q in store.questions:
+            for attr, values in columns.items():
+                codes[attr].append(values.setdefault(q[attr], len(values)))
+        return {
+            'version': store.version,
+            'count': len(store),
+            'ids': [q.id for q in store.questions],
+            'questions': [q.question for q in store.questions],
+            'categories': list(columns['category']),
+            'difficulties': list(columns['difficulty']),
+            'types': list(columns['type']),
+            'category_codes': codes['category'],
+            'difficulty_codes': codes['difficulty'],
+            'type_codes': codes['type']
+        }
+
+    def body(self, store, encoding):
+        with self._lock:
+            if self._version != store.version or not self._variants:
+                self._version = store.version
+                self._variants = {None: dumps(self.build(store))}
+            if encoding not in self._variants:
+                self._variants[encoding] = compress(self._variants[None], encoding)
+            return self._variants[encoding]
+
+    def response(self, store):
+        """Serve the bank with an ETag so clients only download a new version"""
+        etag = f'"{store.version}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(store.version):
+            return Response(status=304, headers=headers)
+        encoding = accepted_encoding()
+        response = Response(self.body(store, encoding), mimetype='application/json', headers=headers)
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
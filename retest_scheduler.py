@@ -0,0 +1,82 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Review delay in seconds per box: a wrong answer goes back to box 0 (due
+# right away), each correct retest moves it one box up, past the last box
+# the question is no longer retested.
+DEFAULT_INTERVALS = (0, 3600, 86400, 3 * 86400, 7 * 86400)
+
+
+class _UserQueue:
+    __slots__ = ('heap', 'entries')
+
+    def __init__(self):
+        self.heap = []  # (due_at, seq, question_id), may hold stale entries
+        self.entries = {}  # question_id -> (due_at, box), the live schedule
+
+
+class RetestScheduler:
+    """Per-user priority queues of questions to retest, ordered by next review time.
+
+    Each answer is an O(log n) heap push. Rescheduled or graduated questions
+    leave stale heap entries behind that are skipped when read and dropped
+    when the heap grows to twice the live schedule.
+    """
+
+    def __init__(self, intervals=DEFAULT_INTERVALS):
+        self.intervals = tuple(intervals)
+        self._users = {}
+        self._seq = itertools.count()  # Tie-breaker so ids are never compared
+        self._lock = threading.Lock()
+
+    def record(self, attempt):
+        """Reschedule attempt.question_id for attempt.user_id after a graded answer"""
+        with self._lock:
+            queue = self._users.get(attempt.user_id)
+            current = queue.entries.get(attempt.question_id) if queue else None
+            if attempt.correct:
+                if current is None:
+                    return  # Never got it wrong, nothing to review
+                box = current[1] + 1
+                if box >= len(self.intervals):
+                    del queue.entries[attempt.question_id]
+                    return
+            else:
+                box = 0
+                if queue is None:
+                    queue = self._users[attempt.user_id] = _UserQueue()
+            due_at = attempt.answered_at + self.intervals[box]
+            queue.entries[attempt.question_id] = (due_at, box)
+            heapq.heappush(queue.heap, (due_at, next(self._seq), attempt.question_id))
+            if len(queue.heap) > 2 * len(queue.entries) + 16:
+                queue.heap = [(due, next(self._seq), qid) for qid, (due, _) in queue.entries.items()]
+                heapq.heapify(queue.heap)
+
+    def due(self, user_id, now=None, limit=None):
+        """Question ids due for review, earliest first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            queue = self._users.get(user_id)
+            if queue is None:
+                return []
+            heap, entries = queue.heap, queue.entries
+            popped, due_ids, seen = [], [], set()
+            while heap and heap[0][0] <= now and (limit is None or len(due_ids) < limit):
+                item = heapq.heappop(heap)
+                due_at, _, qid = item
+                live = entries.get(qid)
+                if live is None or live[0] != due_at or qid in seen:
+                    continue  # Stale entry
+                popped.append(item)
+                due_ids.append(qid)
+                seen.add(qid)
+            for item in popped:
+                heapq.heappush(heap, item)
+            return due_ids
+
+    def scheduled_count(self, user_id):
+        with self._lock:
+            queue = self._users.get(user_id)
+            return len(queue.entries) if queue else 0
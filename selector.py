@@ -0,0 +1,269 @@
+import random
+import time
+from collections import defaultdict
+
+from quota_solver import solve_quotas
+
+ATTRIBUTES = ('category', 'difficulty', 'type')
+
+
+class Selection:
+    """Running state of one test selection.
+
+    Selected ids live in a set so every membership check is O(1) and the
+    whole selection stays linear in the number of candidates. With
+    near-duplicate clusters, at most one question per cluster is taken.
+    """
+    __slots__ = ('total', 'selected', 'selected_ids', 'remaining_quotas',
+                 'actual_counts', 'substitutions', 'timings', 'cluster_of', 'selected_clusters')
+
+    def __init__(self, total, requested_cats, requested_diffs, requested_types, clusters=None):
+        self.total = total
+        self.selected = []
+        self.selected_ids = set()
+        self.cluster_of = clusters.cluster_of if clusters is not None else None
+        self.selected_clusters = set()
+        self.remaining_quotas = {
+            'category': dict(requested_cats),
+            'difficulty': dict(requested_diffs),
+            'type': dict(requested_types)
+        }
+        self.actual_counts = {attr: defaultdict(int) for attr in ATTRIBUTES}
+        self.substitutions = {attr: defaultdict(list) for attr in ATTRIBUTES}
+        self.timings = {}  # Seconds spent per selection pass
+
+    @property
+    def full(self):
+        return len(self.selected) >= self.total
+
+    def has_quota(self, attr, value):
+        return self.remaining_quotas[attr].get(value, 0) > 0
+
+    def take(self, q):
+        self.selected.append(q)
+        self.selected_ids.add(q['id'])
+        if self.cluster_of is not None:
+            self.selected_clusters.add(self.cluster_of[q.index])
+
+    def is_duplicate(self, q):
+        """True when a question of q's near-duplicate cluster was already taken"""
+        return self.cluster_of is not None and self.cluster_of[q.index] in self.selected_clusters
+
+    def matches_all(self, q):
+        return (self.has_quota('category', q['category']) and
+                self.has_quota('difficulty', q['difficulty']) and
+                self.has_quota('type', q['type']))
+
+    def matches_any(self, q):
+        return (self.has_quota('category', q['category']) or
+                self.has_quota('difficulty', q['difficulty']) or
+                self.has_quota('type', q['type']))
+
+    def take_exact(self, q):
+        self.take(q)
+        for attr in ATTRIBUTES:
+            self.remaining_quotas[attr][q[attr]] -= 1
+            self.actual_counts[attr][q[attr]] += 1
+
+    def take_hard_for_medium(self, q):
+        self.take(q)
+        remaining = self.remaining_quotas
+        remaining['difficulty']['Medium'] -= 1
+        self.actual_counts['difficulty']['Hard'] += 1
+        self.substitutions['difficulty']['Medium'].append('Hard')
+        for attr in ('category', 'type'):
+            remaining[attr][q[attr]] -= 1
+            self.actual_counts[attr][q[attr]] += 1
+
+    def take_closest(self, q):
+        self.take(q)
+        remaining = self.remaining_quotas
+        difficulty = q['difficulty']
+        # Track what we're substituting
+        if difficulty != 'Medium' and self.has_quota('difficulty', 'Medium'):
+            remaining['difficulty']['Medium'] -= 1
+            self.substitutions['difficulty']['Medium'].append(difficulty)
+        elif self.has_quota('difficulty', difficulty):
+            remaining['difficulty'][difficulty] -= 1
+        self.actual_counts['difficulty'][difficulty] += 1
+        for attr in ('category', 'type'):
+            if self.has_quota(attr, q[attr]):
+                remaining[attr][q[attr]] -= 1
+                self.actual_counts[attr][q[attr]] += 1
+
+
+class ShuffledView:
+    """Candidates shuffled lazily, one Fisher-Yates step per item actually visited.
+
+    Iterating it yields a uniformly random order like random.shuffle, but a
+    selection that fills up early never pays for shuffling the whole pool.
+    Later iterations replay the same order and extend it as needed.
+    """
+    __slots__ = ('_items', '_shuffled', '_rng')
+
+    def __init__(self, items, rng=random):
+        self._items = list(items)
+        self._shuffled = 0
+        self._rng = rng
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        items = self._items
+        size = len(items)
+        rand = self._rng.random
+        i = 0
+        while i < size:
+            if i == self._shuffled:
+                j = i + int(rand() * (size - i))
+                items[i], items[j] = items[j], items[i]
+                self._shuffled += 1
+            yield items[i]
+            i += 1
+
+
+def random_order(items, rng=random, probes=0):
+    """Items of a sequence in uniformly random order, without copying it up front.
+
+    The first items come from up to probes random draws, repeats skipped.
+    The rest follow in shuffled order, and the list of positions that
+    needs is only built when the caller iterates that far.
+    """
+    size = len(items)
+    drawn = set()
+    for _ in range(probes):
+        if len(drawn) == size:
+            return
+        i = int(rng.random() * size)
+        if i not in drawn:
+            drawn.add(i)
+            yield items[i]
+    rest = [i for i in range(size) if i not in drawn]
+    rng.shuffle(rest)
+    for i in rest:
+        yield items[i]
+
+
+def take_retests(selection, retest_questions):
+    """Take due retest questions in order, but only where they fit every quota"""
+    for q in retest_questions:
+        if selection.full:
+            break
+        if (q['id'] not in selection.selected_ids and not selection.is_duplicate(q) and
+                selection.matches_all(q)):
+            selection.take_exact(q)
+
+
+def select_questions(available_questions, total_requested, requested_cats,
+                     requested_diffs, requested_types, retest_questions=(),
+                     excluded_ids=(), clusters=None, admit=None):
+    """Pick up to total_requested questions honouring the requested quotas.
+
+    available_questions should already be shuffled (a list or ShuffledView),
+    questions in excluded_ids are skipped, and so are near-duplicates of
+    taken questions when clusters is given. admit(q), when given, is asked
+    before a question is taken and a refused question is skipped for the
+    rest of the selection. retest_questions (earliest due first) are taken
+    before anything else as long as they fit the quotas.
+    Then three passes run: exact matches, Hard questions standing in for
+    missing Medium ones, then anything that still matches one quota.
+    Returns the Selection holding selected questions, actual_counts,
+    substitutions and per-pass timings.
+    """
+    selection = Selection(total_requested, requested_cats, requested_diffs, requested_types, clusters)
+    selected_ids = selection.selected_ids
+    refused = set()
+    started = time.perf_counter()
+
+    def is_open(q):
+        qid = q['id']
+        if qid in selected_ids or qid in excluded_ids or qid in refused or selection.is_duplicate(q):
+            return False
+        if admit is not None and not admit(q):
+            refused.add(qid)
+            return False
+        return True
+
+    take_retests(selection, retest_questions)
+    retests_done = time.perf_counter()
+    selection.timings['retest_pass'] = retests_done - started
+
+    # First pass: select questions that match all criteria
+    for q in available_questions:
+        if selection.full:
+            break
+        if selection.matches_all(q) and is_open(q):
+            selection.take_exact(q)
+    first_pass_done = time.perf_counter()
+    selection.timings['first_pass'] = first_pass_done - retests_done
+
+    # Special handling for Medium difficulty substitutions
+    if selection.has_quota('difficulty', 'Medium'):
+        # Try to fulfill Medium requests with Hard questions first
+        for q in available_questions:
+            if selection.full or not selection.has_quota('difficulty', 'Medium'):
+                break
+            if (q['difficulty'] == 'Hard' and
+                    selection.has_quota('category', q['category']) and
+                    selection.has_quota('type', q['type']) and is_open(q)):
+                selection.take_hard_for_medium(q)
+    medium_pass_done = time.perf_counter()
+    selection.timings['medium_substitution_pass'] = medium_pass_done - first_pass_done
+
+    # Second pass: fill remaining with questions that match any criteria
+    for q in available_questions:
+        if selection.full:
+            break
+        if selection.matches_any(q) and is_open(q):
+            selection.take_closest(q)
+    selection.timings['fill_pass'] = time.perf_counter() - medium_pass_done
+
+    return selection
+
+
+def select_exact(store, blocked_ids, total_requested, requested_cats,
+                 requested_diffs, requested_types, retest_questions=(), rng=random,
+                 clusters=None, admit=None):
+    """Meet every quota exactly by solving over bucket counts.
+
+    Due retest questions that fit the quotas are taken first, admit works
+    as in select_questions. Returns a
+    Selection, or None when no exact assignment exists so the caller can
+    fall back to select_questions.
+    """
+    selection = Selection(total_requested, requested_cats, requested_diffs, requested_types, clusters)
+    take_retests(selection, retest_questions)
+
+    # Count what each bucket can still offer after used and retest questions
+    excluded = set(blocked_ids) | selection.selected_ids
+    excluded_per_bucket = defaultdict(int)
+    for qid in excluded:
+        q = store.get(qid)
+        if q is not None:
+            excluded_per_bucket[(q.category, q.difficulty, q.type)] += 1
+    capacity = {
+        key: len(bucket) - excluded_per_bucket.get(key, 0)
+        for key, bucket in store.buckets.items()
+    }
+
+    remaining = selection.remaining_quotas
+    counts = solve_quotas(capacity, remaining['category'], remaining['difficulty'],
+                          remaining['type'], rng=rng)
+    if counts is None or sum(counts.values()) != total_requested - len(selection.selected):
+        return None
+
+    for key, count in counts.items():
+        # Random draws from the bucket, only scanning it once most of it is excluded
+        for q in random_order(store.bucket(*key), rng, probes=4 * count + 16):
+            if count == 0:
+                break
+            if (q.id not in excluded and not selection.is_duplicate(q) and
+                    (admit is None or admit(q))):
+                selection.take_exact(q)
+                count -= 1
+        # Bucket counts ignore clusters and exposure, give up if too few are left
+        if count:
+            return None
+    rng.shuffle(selection.selected)
+    return selection
@@ -0,0 +1,313 @@
+"""Fingerprinted, precompressed static assets and cached shell pages.
+
+The build step moves inline <style> and <script> blocks out of the
+templates into static/css and static/js, then copies every file under
+static/ into the asset directory under a content-hashed name, with gzip
+and, when brotli is installed, br variants of compressible files:
+
+    python static_assets.py build
+
+Templates keep using url_for('static', filename=...). While a manifest is
+present those URLs point at /assets/<hashed name>, served with immutable
+caching, and files without a hashed copy fall back to /static.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+
+from flask import Response, render_template, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip variants are always built
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+COMPRESSIBLE = {'.css', '.js', '.svg', '.html', '.json', '.txt', '.map', '.ttf', '.eot'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+INLINE_STYLE = re.compile(r'([ \t]*)<style>(.*?)</style>', re.S)
+INLINE_SCRIPT = re.compile(r'([ \t]*)<script>(.*?)</script>', re.S)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+HASHED_NAME = re.compile(r'^(.+)\.([0-9a-f]{%d})(\.[^.]+)?$' % HASH_LENGTH)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(path, digest):
+    stem, ext = posixpath.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+def _dedent(block):
+    lines = block.strip('\n').splitlines()
+    indent = min((len(line) - len(line.lstrip()) for line in lines if line.strip()), default=0)
+    return '\n'.join(line[indent:] for line in lines) + '\n'
+
+
+def extract_inline(template_path, static_dir):
+    """Move a template's inline CSS and JS into static files, returns the files written.
+
+    Blocks containing Jinja syntax stay inline, they depend on the render.
+    Each block becomes its own file so the order of scripts is kept.
+    """
+    with open(template_path, encoding='utf-8') as f:
+        html = f.read()
+    stem = os.path.splitext(os.path.basename(template_path))[0]
+    written = []
+
+    def replacer(ext, tag):
+        count = 0
+
+        def replace(match):
+            nonlocal count
+            indent, body = match.groups()
+            if '{{' in body or '{%' in body or not body.strip():
+                return match.group(0)
+            count += 1
+            name = f"{ext}/{stem}{'' if count == 1 else f'-{count}'}.{ext}"
+            path = os.path.join(static_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as out:
+                out.write(_dedent(body))
+            written.append(path)
+            return indent + tag.format(url="{{ url_for('static', filename='" + name + "') }}")
+        return replace
+
+    html = INLINE_STYLE.sub(replacer('css', '<link href="{url}" rel="stylesheet">'), html)
+    html = INLINE_SCRIPT.sub(replacer('js', '<script src="{url}"></script>'), html)
+    if written:
+        with open(template_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+    return written
+
+
+def _split_suffix(target):
+    """('font.woff', '?', 'v=1') for 'font.woff?v=1'"""
+    for i, ch in enumerate(target):
+        if ch in '?#':
+            return target[:i], ch, target[i + 1:]
+    return target, '', ''
+
+
+def _rewrite_css(css, name, hashed):
+    """Point relative url() references of a stylesheet at the hashed files"""
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, target = match.groups()
+        if re.match(r'^(?:[a-z]+:|/|#)', target, re.I):
+            return match.group(0)  # data:, absolute and fragment URLs stay as they are
+        path, sep, suffix = _split_suffix(target)
+        resolved = posixpath.normpath(posixpath.join(directory, path))
+        if resolved not in hashed:
+            return match.group(0)
+        relative = posixpath.relpath(hashed[resolved], directory or '.')
+        return f"url({quote}{relative}{sep}{suffix}{quote})"
+
+    return CSS_URL.sub(replace, css)
+
+
+def _write_variants(path, data, encodings):
+    with open(path, 'wb') as f:
+        f.write(data)
+    variants = []
+    candidates = [('gzip', '.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        candidates.insert(0, ('br', '.br', lambda d: brotli.compress(d, quality=11)))
+    if encodings:
+        for encoding, suffix, compress in candidates:
+            compressed = compress(data)
+            if len(compressed) < len(data) * 0.9:  # Not worth a variant otherwise
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                variants.append(encoding)
+    return variants
+
+
+def build(static_dir, out_dir):
+    """Write hashed and compressed copies of static_dir to out_dir, returns the manifest.
+
+    Files of earlier builds are left in place, so pages rendered before the
+    new manifest lands still load their assets.
+    """
+    names = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs
+                         if os.path.abspath(os.path.join(root, d)) != os.path.abspath(out_dir))
+        for filename in sorted(files):
+            names.append(os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/'))
+
+    files, hashed = {}, {}
+    # Stylesheets last, their url() references need the other files' hashed names
+    for name in sorted(names, key=lambda n: (n.endswith('.css'), n)):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = _rewrite_css(data.decode('utf-8'), name, hashed).encode('utf-8')
+        digest = content_hash(data)
+        hashed[name] = hashed_name(name, digest)
+        path = os.path.join(out_dir, hashed[name])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ext = posixpath.splitext(name)[1].lower()
+        files[name] = {
+            'path': hashed[name],
+            'hash': digest,
+            'size': len(data),
+            'encodings': _write_variants(path, data, ext in COMPRESSIBLE)
+        }
+    manifest = {'version': content_hash(json.dumps(files, sort_keys=True).encode('utf-8')), 'files': files}
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(f"{path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    return manifest
+
+
+class StaticAssets:
+    """Manifest of the built assets, reloaded when a new build replaces it"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.version = None
+        self.files = {}  # logical name -> manifest entry
+        self.by_path = {}  # hashed name -> (logical name, manifest entry)
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Load the manifest if it changed on disk, cheap enough to call per page"""
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            manifest = {'version': None, 'files': {}}
+            if mtime is not None:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        manifest = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring unreadable asset manifest: {str(e)}")
+            self.files = manifest['files']
+            self.by_path = {entry['path']: (name, entry) for name, entry in self.files.items()}
+            self.version = manifest['version']
+            self._mtime = mtime
+
+    def url_for(self, endpoint, **values):
+        """url_for for templates, static files resolve to their hashed copy when built"""
+        if endpoint == 'static':
+            entry = self.files.get(values.get('filename'))
+            if entry is not None:
+                values['filename'] = entry['path']
+                endpoint = 'asset'
+        return url_for(endpoint, **values)
+
+    def _earlier_build(self, path):
+        """(name, entry) of a hashed file a previous build left, pages rendered before this one link it"""
+        match = HASHED_NAME.match(posixpath.basename(path))
+        full = safe_join(self.directory, path)
+        if match is None or full is None or not os.path.isfile(full):
+            return None
+        stem, digest, ext = match.groups()
+        encodings = [e for e, suffix in (('br', '.br'), ('gzip', '.gz')) if os.path.isfile(full + suffix)]
+        return posixpath.join(posixpath.dirname(path), stem + (ext or '')), {
+            'path': path, 'hash': digest, 'encodings': encodings}
+
+    def response(self, path):
+        """Serve a hashed file, precompressed when the client accepts it"""
+        found = self.by_path.get(path) or self._earlier_build(path)
+        if found is None:
+            return None
+        name, entry = found
+        accepted = request.accept_encodings
+        encoding = next((e for e in entry['encodings'] if accepted[e]), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        etag = entry['hash'] + (f"-{encoding}" if encoding else '')
+        headers = {'Cache-Control': IMMUTABLE, 'ETag': f'"{etag}"'}
+        if entry['encodings']:
+            headers['Vary'] = 'Accept-Encoding'
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response = send_file(os.path.join(self.directory, path + suffix), mimetype=mimetype,
+                             conditional=False, etag=False, max_age=None)
+        response.headers.update(headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class PageCache:
+    """Rendered shell pages with compressed variants, rebuilt when the template or assets change"""
+
+    def __init__(self, assets, template_folder):
+        self.assets = assets
+        self.template_folder = template_folder
+        self._pages = {}  # template name -> (key, etag, {encoding: body})
+        self._lock = threading.Lock()
+
+    def response(self, template):
+        self.assets.refresh()
+        key = (os.stat(os.path.join(self.template_folder, template)).st_mtime_ns, self.assets.version)
+        cached = self._pages.get(template)
+        if cached is None or cached[0] != key:
+            body = render_template(template).encode('utf-8')
+            variants = {None: body, 'gzip': gzip.compress(body, compresslevel=9)}
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=11)
+            cached = (key, content_hash(body), variants)
+            with self._lock:
+                self._pages[template] = cached
+        _, etag, variants = cached
+        accepted = request.accept_encodings
+        encoding = next((e for e in ('br', 'gzip') if e in variants and accepted[e]), None)
+        tag = etag + (f"-{encoding}" if encoding else '')
+        # Revalidated on every visit, so a new build's asset URLs show up at once
+        headers = {'ETag': f'"{tag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if request.if_none_match.contains(tag):
+            return Response(status=304, headers=headers)
+        response = Response(variants[encoding], mimetype='text/html', headers=headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--static', default='static')
+    parser.add_argument('--templates', default='templates')
+    parser.add_argument('--out', default=os.environ.get('ASSET_DIR', 'static_build'))
+    parser.add_argument('--no-extract', action='store_true', help='leave inline CSS and JS in the templates')
+    args = parser.parse_args(argv)
+
+    if not args.no_extract:
+        for filename in sorted(os.listdir(args.templates)):
+            if filename.endswith('.html'):
+                for path in extract_inline(os.path.join(args.templates, filename), args.static):
+                    print(f"Extracted {path} from {filename}")
+    manifest = build(args.static, args.out)
+    files = manifest['files'].values()
+    print(f"Built {len(files)} assets ({sum(f['size'] for f in files)} bytes) into {args.out}, "
+          f"version {manifest['version']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import csv
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# app1 loads its bank and opens its logs at import, so point it at scratch files first
+_SCRATCH = tempfile.mkdtemp(prefix='test_generator_')
+BANK_CSV = os.path.join(_SCRATCH, 'questions.csv')
+shutil.copy(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'questions.csv'), BANK_CSV)
+os.environ.update({
+    'QUESTIONS_CSV': BANK_CSV,
+    'QUESTION_CACHE': '0',
+    'ATTEMPT_LOG': '',
+    'FORM_POOL_DIR': os.path.join(_SCRATCH, 'form_pools'),
+    'PARAPHRASE_CSV': '',
+    'ASSET_DIR': os.path.join(_SCRATCH, 'static_build'),
+})
+
+
+def write_bank(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'question', 'category', 'difficulty', 'type'])
+        writer.writerows(rows)
+
+
+def read_bank(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return list(reader)
+
+
+@pytest.fixture
+def bank_rows():
+    return read_bank(BANK_CSV)
+
+
+@pytest.fixture
+def app_module():
+    """app1 serving a fresh copy of questions.csv, restored after the test"""
+    import app1
+    original = read_bank(BANK_CSV)
+    app1.reload_questions_from_csv()
+    yield app1
+    write_bank(BANK_CSV, original)
+    app1.reload_questions_from_csv()
+
+
+def quota_request(total=5):
+    return {
+        'total_questions': total,
+        'category_counts': {'B': total},
+        'difficulty_counts': {'Easy': total},
+        'type_counts': {'True/False': total}
+    }
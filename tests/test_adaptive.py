@@ -0,0 +1,13 @@
+from conftest import quota_request
+
+
+def test_adaptive_test_continues_in_the_flask_session(app_module):
+    client = app_module.app.test_client()
+    first = client.post('/api/adaptive/next', json=quota_request(3)).get_json()
+    assert first['done'] is False and first['answered'] == 0
+    answer = {'question_id': first['question']['id'], 'correct': True}
+    second = client.post('/api/adaptive/next', json={'answer': answer}).get_json()
+    assert second['answered'] == 1
+    assert second['question']['id'] != first['question']['id']
+    with client.session_transaction() as flask_session:
+        assert 'sid' in flask_session
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from conftest import quota_request
+
+
+def call(asgi, method, path, body=None, cookie=None):
+    """(status, headers dict, body) of one request through the ASGI app"""
+    raw = json.dumps(body).encode() if body is not None else b''
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(raw)).encode())]
+    if cookie:
+        headers.append((b'cookie', cookie.encode()))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': raw, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    assert not sent[-1].get('more_body')
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+
+def session_id(app_module, cookie):
+    interface = app_module.app.session_interface
+    value = cookie.split(';', 1)[0].split('=', 1)[1]
+    return interface.get_signing_serializer(app_module.app).loads(value)['sid']
+
+
+def test_generate_and_submit_share_the_flask_session(app_module):
+    import asgi
+    status, headers, body = call(asgi, 'POST', '/api/generate-test', quota_request())
+    assert status == 200
+    cookie = headers['set-cookie'].split(';', 1)[0]
+    question_id = json.loads(body)['test'][0]['id']
+
+    status, _, _ = call(asgi, 'POST', '/api/submit-answers',
+                        {'attempts': [{'question_id': question_id, 'correct': False}]}, cookie)
+    assert status == 202
+    sid = session_id(app_module, cookie)
+    assert app_module.retest_scheduler.due(sid) == [question_id]
+
+    # The same cookie keeps the session, no new one is issued
+    status, headers, _ = call(asgi, 'POST', '/api/generate-test', quota_request(), cookie)
+    assert status == 200 and 'set-cookie' not in headers
+
+
+def test_generate_reuses_a_session_started_by_flask(app_module):
+    import asgi
+    status, headers, _ = call(asgi, 'GET', '/')
+    cookie = headers['set-cookie'].split(';', 1)[0]
+    status, headers, body = call(asgi, 'POST', '/api/generate-test', quota_request(), cookie)
+    assert status == 200 and 'set-cookie' not in headers
+    served = {q['id'] for q in json.loads(body)['test']}
+    assert app_module.used_question_ids(app_module.question_store, session_id(app_module, cookie)) == served
+
+
+def test_batch_responses_stream_one_chunk_per_student(app_module):
+    import asgi
+
+    raw = json.dumps(dict(quota_request(2), student_ids=['x1', 'x2', 'x3'])).encode()
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/generate-tests', 'query_string': b'',
+             'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(raw)).encode())]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': raw, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    assert sent[0]['status'] == 200
+    chunks = [m['body'] for m in sent[1:] if m['body']]
+    assert len(chunks) == 3 and all(m.get('more_body') for m in sent[1:-1])
+    assert [json.loads(chunk)['student_id'] for chunk in chunks] == ['x1', 'x2', 'x3']
+
+
+def test_client_disconnect_stops_the_stream(app_module):
+    import asgi
+
+    raw = json.dumps(dict(quota_request(1), student_ids=[f's{i}' for i in range(50)])).encode()
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/generate-tests', 'query_string': b'',
+             'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(raw)).encode())]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': raw, 'more_body': False}
+
+    async def send(message):
+        if len(sent) == 2:
+            raise OSError('client went away')
+        sent.append(message)
+
+    try:
+        asyncio.run(asgi.app(scope, receive, send))
+    except OSError:
+        pass
+    assert len(sent) == 2
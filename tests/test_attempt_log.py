@@ -0,0 +1,32 @@
+import time
+
+from attempt_log import Attempt, AttemptLog
+from retest_scheduler import RetestScheduler
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_workers_see_each_others_attempts(tmp_path):
+    path = str(tmp_path / 'attempts.db')
+    first, second = RetestScheduler(), RetestScheduler()
+    log_a = AttemptLog(path, flush_interval=0.01, on_attempt=first.record, sync_interval=0.05)
+    log_b = AttemptLog(path, flush_interval=0.01, on_attempt=second.record, sync_interval=0.05)
+    try:
+        log_a.submit([Attempt('u', 7, False, 100.0)])
+        log_a.flush()
+        wait_for(lambda: second.due('u', now=200) == [7])
+        log_b.submit([Attempt('u', 7, True, 150.0)])
+        log_b.flush()
+        wait_for(lambda: first.scheduled_count('u') == 1 and first.due('u', now=200) == [])
+        # Each worker applied the attempts once, its own ones were not replayed again
+        time.sleep(0.2)
+        assert second.due('u', now=150 + 3600) == [7]
+    finally:
+        log_a.close()
+        log_b.close()
+
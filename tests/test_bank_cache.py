@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import bank_cache
+from conftest import BANK_CSV, quota_request, write_bank
+from question_loader import parse_questions_csv
+
+
+def attributes(store):
+    return [(q.index, q.id, q.question, q.category, q.difficulty, q.type) for q in store.questions]
+
+
+def test_qbank_round_trip(tmp_path):
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, [[i, f"Question {i} — ünïcode, \"quoted\"?", 'ABC'[i % 3], ['Easy', 'Medium', 'Hard'][i % 2],
+                       'True/False' if i % 4 else 'Question Answer'] for i in range(1, 201)])
+    parsed = parse_questions_csv(path)
+    assert bank_cache.write_cache(path, parsed)
+    loaded = bank_cache.load_cache(path)
+    assert loaded is not None
+    assert loaded.version == parsed.version
+    assert attributes(loaded) == attributes(parsed)
+    assert {key: [q.id for q in bucket] for key, bucket in loaded.buckets.items()} == \
+        {key: [q.id for q in bucket] for key, bucket in parsed.buckets.items()}
+    assert loaded.get(17).question == parsed.get(17).question
+
+
+def test_edited_csv_makes_the_cache_stale(tmp_path):
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, [[1, 'One?', 'A', 'Easy', 'True/False']])
+    bank_cache.write_cache(path, parse_questions_csv(path))
+    write_bank(path, [[1, 'One?', 'A', 'Easy', 'True/False'], [2, 'Two?', 'A', 'Easy', 'True/False']])
+    assert bank_cache.load_cache(path) is None
+    # Touched but unchanged files keep their cache
+    bank_cache.write_cache(path, parse_questions_csv(path))
+    os.utime(path, ns=(0, 0))
+    assert len(bank_cache.load_cache(path)) == 2
+
+
+def test_mapped_store_builds_records_on_access(tmp_path):
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, [[qid, f"Question {qid}?", 'AB'[qid % 2], 'Easy', 'True/False'] for qid in (30, 10, 20, 40)])
+    parsed = parse_questions_csv(path)
+    bank_cache.write_cache(path, parsed)
+    loaded = bank_cache.load_cache(path)
+    assert not isinstance(loaded.questions, tuple) and not isinstance(loaded.by_id, dict)
+    assert [loaded.get(qid).index for qid in (10, 20, 30, 40)] == [1, 2, 0, 3]
+    assert 25 not in loaded and loaded.get(25) is None and loaded.get('10') is None
+    with pytest.raises(KeyError):
+        loaded.by_id[25]
+    assert loaded.questions[-1].id == 40 and [q.id for q in loaded.questions[1:3]] == [10, 20]
+    with pytest.raises(IndexError):
+        loaded.questions[4]
+    assert [q.id for q in loaded.bucket('A', 'Easy', 'True/False')] == [30, 10, 20, 40]
+
+
+def test_app_serves_tests_from_the_mapped_store(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'USE_QUESTION_CACHE', True)
+    try:
+        app_module.reload_questions_from_csv()  # Parses and writes the cache
+        app_module.reload_questions_from_csv()  # Maps it
+        assert isinstance(app_module.question_store.by_id, bank_cache.IdIndex)
+        client = app_module.app.test_client()
+        test = client.post('/api/generate-test', json=quota_request(5)).get_json()['test']
+        assert len(test) == 5
+        response = client.post('/api/submit-answers', json={
+            'student_id': 'mapped', 'attempts': [{'question_id': q['id'], 'correct': False} for q in test]})
+        assert response.status_code == 202
+    finally:
+        os.remove(bank_cache.cache_path_for(BANK_CSV))
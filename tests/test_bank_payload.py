@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import write_bank
+
+
+@pytest.fixture
+def golf_bank(app_module, tmp_path):
+    path = str(tmp_path / 'golf.csv')
+    write_bank(path, [[str(i), f'Golf question {i}', 'A', 'Easy', 'True/False'] for i in range(1, 11)])
+    app_module.bank_registry.register('golf', path)
+    yield 'golf'
+    app_module.bank_registry.invalidate('golf')
+
+
+def test_compact_tests_resolve_against_their_own_bank(app_module, golf_bank):
+    client = app_module.app.test_client()
+    request = {'total_questions': 3, 'category_counts': {'A': 3}, 'difficulty_counts': {'Easy': 3},
+               'type_counts': {'True/False': 3}, 'response_format': 'compact'}
+    test = client.post('/api/golf/generate-test', json=request).get_json()
+
+    for url in ('/api/golf/questions/bank', '/api/questions/bank?bank=golf'):
+        response = client.get(url)
+        bank = response.get_json()
+        assert bank['version'] == test['bank_version']
+        assert set(test['test']) <= set(bank['ids'])
+        assert response.headers['ETag'] == f'"{test["bank_version"]}"'
+
+    default = client.get('/api/questions/bank').get_json()
+    assert default['version'] == app_module.question_store.version != test['bank_version']
+    assert client.get('/api/nope/questions/bank').status_code == 404
+
+
+def test_generated_tests_report_the_size_of_their_bank(app_module, golf_bank):
+    client = app_module.app.test_client()
+    request = {'total_questions': 3, 'category_counts': {'A': 3}, 'difficulty_counts': {'Easy': 3},
+               'type_counts': {'True/False': 3}}
+    assert client.post('/api/golf/generate-test', json=request).get_json()['bank_size'] == 10
+    banks = client.get('/api/banks').get_json()
+    default = next(bank for bank in banks['banks'] if bank['name'] == banks['default'])
+    assert default['total_questions'] == len(app_module.question_store)
@@ -0,0 +1,28 @@
+import os
+
+from conftest import BANK_CSV, write_bank
+from exposure import segment_name
+
+
+def segment_exists(store):
+    return os.path.exists(os.path.join('/dev/shm', segment_name(store)))
+
+
+def test_reload_unlinks_the_previous_versions_segment(app_module, bank_rows, monkeypatch):
+    monkeypatch.setattr(app_module, 'EXPOSURE_MAX_RATE', 0.5)
+    app_module.reload_questions_from_csv()
+    old_store = app_module.question_store
+    assert segment_exists(old_store)
+
+    write_bank(BANK_CSV, bank_rows + [['9999', 'A new question?', 'A', 'Easy', 'True/False']])
+    app_module.reload_questions_from_csv()
+    new_store = app_module.question_store
+    try:
+        assert new_store.version != old_store.version
+        assert not segment_exists(old_store)
+        assert segment_exists(new_store)
+        # Requests still holding the old store keep counting
+        old_store.exposure.record([0])
+        assert old_store.exposure.tests == 1
+    finally:
+        new_store.exposure.unlink_segment()
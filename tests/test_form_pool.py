@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from conftest import BANK_CSV, quota_request, write_bank
+from form_pool import FormPools, pool_path, write_pool
+import generation
+from question_loader import parse_questions_csv
+
+
+@pytest.fixture
+def pool_dir(tmp_path):
+    """A pool of single-question forms, one per B/Easy/True-False question"""
+    store = parse_questions_csv(BANK_CSV)
+    spec = generation.TestSpec.from_json(quota_request(1))
+    forms = [(q.index,) for q in store.buckets[('B', 'Easy', 'True/False')]]
+    write_pool(pool_path(str(tmp_path), spec), store.version, spec, forms)
+    return str(tmp_path), store, spec, len(forms)
+
+
+def test_workers_never_hand_out_the_same_form(pool_dir):
+    directory, store, spec, count = pool_dir
+    assert count >= 4
+    workers = [FormPools(directory, BANK_CSV, low_water=0), FormPools(directory, BANK_CSV, low_water=0)]
+    assert [w.load() for w in workers] == [count, count]
+    served = []
+    for i in range(count + 2):
+        selected = workers[i % 2].take(store, spec, set())
+        if selected is not None:
+            served.append(selected[0].id)
+    assert len(served) == count == len(set(served))
+    # A worker starting later sees the claims too
+    late = FormPools(directory, BANK_CSV, low_water=0)
+    assert late.load() == 0
+
+
+def test_rewritten_pool_replaces_the_claims(pool_dir):
+    directory, store, spec, count = pool_dir
+    worker = FormPools(directory, BANK_CSV, low_water=0)
+    worker.load()
+    first = worker.take(store, spec, set())
+    other = FormPools(directory, BANK_CSV, low_water=0)
+    other.load()
+    write_pool(pool_path(directory, spec), store.version, spec, [(first[0].index,)])
+    # The new file's form is unclaimed although the same question went out from the old one
+    assert other.take(store, spec, set()) == first
+    assert worker.take(store, spec, set()) is None
+
+
+def test_one_worker_refills_a_low_pool_for_all(pool_dir):
+    directory, store, spec, count = pool_dir
+    refiller = FormPools(directory, BANK_CSV, workers=1, low_water=1)
+    other = FormPools(directory, BANK_CSV, workers=1, low_water=0)
+    refiller.load()
+    other.load()
+    assert refiller.take(store, spec, set()) is not None
+    pool = next(iter(refiller._pools.values()))
+    deadline = time.monotonic() + 60
+    while pool.refilling or pool.available < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    # The refill kept the unclaimed forms and added new ones, the other worker serves from that file
+    assert other.take(store, spec, set()) is not None
+    other_pool = next(iter(other._pools.values()))
+    assert other_pool.generation == pool.generation
+    assert other_pool.available == count - 1
+
+
+def test_a_slow_claims_file_only_holds_up_its_own_pool(pool_dir, monkeypatch):
+    import threading
+
+    import form_pool
+
+    directory, store, spec, count = pool_dir
+    other_spec = generation.TestSpec.from_json(dict(quota_request(1), category_counts={'A': 1}))
+    forms = [(q.index,) for q in store.buckets[('A', 'Easy', 'True/False')]]
+    write_pool(pool_path(directory, other_spec), store.version, other_spec, forms)
+    worker = FormPools(directory, BANK_CSV, low_water=0)
+    worker.load()
+
+    entered, release = threading.Event(), threading.Event()
+    sync = form_pool._Claims.sync
+
+    def slow_sync(claims):
+        if claims.pool.spec.category_counts == spec.category_counts:
+            entered.set()
+            release.wait(5)
+        return sync(claims)
+
+    monkeypatch.setattr(form_pool._Claims, 'sync', slow_sync)
+    blocked = threading.Thread(target=worker.take, args=(store, spec, set()))
+    blocked.start()
+    try:
+        assert entered.wait(5)
+        assert worker.take(store, other_spec, set()) is not None
+    finally:
+        release.set()
+        blocked.join()
+
+
+def test_workers_use_saved_clusters_at_the_app_threshold(tmp_path, monkeypatch):
+    import form_pool
+    import near_duplicates
+
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, [[i, f"Which club is used for shot {i % 3}?", 'A', 'Easy', 'True/False'] for i in range(1, 10)])
+    built = []
+    monkeypatch.setattr(near_duplicates.NearDuplicateIndex, 'build',
+                        lambda self, store: built.append(store) or None)
+    assert form_pool.load_store(path, 0.8).duplicates is None  # No clusters file, nothing is built
+    assert form_pool.load_store(path, 0).duplicates is None
+    assert not built
+    monkeypatch.undo()
+
+    store = form_pool.load_store(path, 0.8)
+    near_duplicates.update_clusters(path, store, 0.8)
+    assert form_pool.load_store(path, 0.8).duplicates is not None
+    assert form_pool.load_store(path, 0.5).duplicates is None  # Saved for another threshold
+    assert form_pool.load_store(path, 0).duplicates is None
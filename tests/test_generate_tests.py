@@ -0,0 +1,62 @@
+import json
+
+from conftest import quota_request, write_bank
+from paraphrases import ParaphraseIndex, VariantChooser
+
+
+def batch(client, **body):
+    response = client.post('/api/generate-tests', json=dict(quota_request(3), **body))
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_one_line_per_student_with_server_side_progress(app_module):
+    client = app_module.app.test_client()
+    lines = batch(client, student_ids=['s1', 's2'])
+    assert [line['student_id'] for line in lines] == ['s1', 's2']
+    assert all(len(line['test']) == 3 for line in lines)
+    first = {q['id'] for q in lines[0]['test']}
+    again = batch(client, student_ids=['s1'])[0]
+    assert not first & {q['id'] for q in again['test']}
+
+
+def test_no_adjacent_overlap(app_module):
+    client = app_module.app.test_client()
+    lines = batch(client, student_ids=['a1', 'a2', 'a3'], no_adjacent_overlap=True)
+    tests = [{q['id'] for q in line['test']} for line in lines]
+    assert not tests[0] & tests[1] and not tests[1] & tests[2]
+
+
+def test_named_bank(app_module, tmp_path):
+    path = str(tmp_path / 'golf.csv')
+    write_bank(path, [[str(i), f'Golf question {i}', 'B', 'Easy', 'True/False'] for i in range(1001, 1011)])
+    app_module.bank_registry.register('golf', path)
+    try:
+        client = app_module.app.test_client()
+        line = batch(client, student_ids=['g1'], bank='golf')[0]
+        assert {q['id'] for q in line['test']} <= set(range(1001, 1011))
+        assert client.post('/api/generate-tests', json=dict(
+            quota_request(3), student_ids=['g1'], bank='nope')).status_code == 404
+    finally:
+        app_module.bank_registry.invalidate('golf')
+
+
+def test_paraphrase_style_is_applied(app_module, monkeypatch):
+    store = app_module.question_store
+    index = ParaphraseIndex([(q.question, f"{q.question} (casual)", 'casual') for q in store.questions])
+    monkeypatch.setattr(app_module, 'variant_chooser', VariantChooser(index))
+    client = app_module.app.test_client()
+    line = batch(client, student_ids=['p1'], paraphrase_style='casual')[0]
+    assert all(q['question'].endswith('(casual)') for q in line['test'])
+    response = client.post('/api/generate-tests', json=dict(
+        quota_request(3), student_ids=['p1'], paraphrase_style='poetic'))
+    assert response.status_code == 400
+
+
+def test_student_ids_are_validated_and_bounded(app_module):
+    client = app_module.app.test_client()
+    assert client.post('/api/generate-tests', json=quota_request(3)).status_code == 400
+    too_many = [str(i) for i in range(app_module.MAX_STUDENTS_PER_BATCH + 1)]
+    response = client.post('/api/generate-tests', json=dict(quota_request(3), student_ids=too_many))
+    assert response.status_code == 413
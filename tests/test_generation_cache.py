@@ -0,0 +1,52 @@
+import metrics
+from conftest import quota_request
+from generation import GenerationCache, TestSpec as Spec, generate
+from question_store import QuestionStore
+
+
+def make_store(version, size=60):
+    ids = list(range(1, size + 1))
+    return QuestionStore.from_columns(ids, [f"Question {i}?" for i in ids], ['B'] * size, ['Easy'] * size,
+                                      ['True/False'] * size, version)
+
+
+def seeded(seed=42, total=5):
+    return Spec.from_json(dict(quota_request(total), seed=seed))
+
+
+def run(store, spec, cache, used=()):
+    return generate(store, spec, set(used), metrics.StageClock(), cache=cache)
+
+
+def test_same_seed_and_inputs_return_the_cached_test():
+    store, cache = make_store('v1'), GenerationCache(8)
+    first = run(store, seeded(), cache)
+    again = run(store, seeded(), cache)
+    assert again is first
+    # Without the cache the same seed still selects the same questions
+    assert [q.id for q in run(store, seeded(), None).selected] == [q.id for q in first.selected]
+    assert run(store, seeded(seed=7), cache) is not first
+    assert run(store, seeded(), cache, used=[first.selected[0].id]) is not first
+
+
+def test_new_bank_version_misses():
+    cache = GenerationCache(8)
+    first = run(make_store('v1'), seeded(), cache)
+    assert run(make_store('v2'), seeded(), cache) is not first
+    assert len(cache._entries) == 2
+
+
+def test_unseeded_requests_are_not_cached():
+    store, cache = make_store('v1'), GenerationCache(8)
+    run(store, Spec.from_json(quota_request(5)), cache)
+    assert not cache._entries
+
+
+def test_least_recently_used_entries_are_evicted_at_the_bound():
+    store, cache = make_store('v1'), GenerationCache(3)
+    results = {seed: run(store, seeded(seed), cache) for seed in range(3)}
+    assert run(store, seeded(0), cache) is results[0]  # Seed 0 is now the most recent
+    run(store, seeded(3), cache)
+    assert len(cache._entries) == 3
+    assert run(store, seeded(0), cache) is results[0]
+    assert run(store, seeded(1), cache) is not results[1]  # Evicted
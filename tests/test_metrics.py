@@ -0,0 +1,56 @@
+import re
+
+from conftest import quota_request
+from metrics import PROMETHEUS_CONTENT_TYPE, Registry
+
+
+def sample(text, line_start):
+    """Value of the exposition line starting with line_start, 0 when absent"""
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_exposition_format():
+    registry = Registry()
+    counter = registry.counter('jobs_total', 'Jobs done', ['kind'])
+    plain = registry.counter('plain_total', 'Never incremented')
+    histogram = registry.histogram('job_seconds', 'Job time', buckets=(0.1, 1.0))
+    counter.labels('say "hi"\n').inc(2)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    assert plain is not None
+    assert registry.render().splitlines() == [
+        '# HELP jobs_total Jobs done',
+        '# TYPE jobs_total counter',
+        'jobs_total{kind="say \\"hi\\"\\n"} 2',
+        '# HELP plain_total Never incremented',
+        '# TYPE plain_total counter',
+        'plain_total 0',
+        '# HELP job_seconds Job time',
+        '# TYPE job_seconds histogram',
+        'job_seconds_bucket{le="0.1"} 1',
+        'job_seconds_bucket{le="1.0"} 2',
+        'job_seconds_bucket{le="+Inf"} 3',
+        'job_seconds_sum 5.55',
+        'job_seconds_count 3',
+    ]
+
+
+def test_counters_after_a_request(app_module):
+    client = app_module.app.test_client()
+    before = client.get('/metrics')
+    assert before.headers['Content-Type'] == PROMETHEUS_CONTENT_TYPE
+    request_count = 'generate_test_request_seconds_count{status="200"}'
+    selection_count = 'generate_test_stage_seconds_count{stage="selection"}'
+    counts = [sample(before.get_data(as_text=True), name) for name in (request_count, selection_count)]
+
+    assert client.post('/api/generate-test', json=quota_request(3)).status_code == 200
+    assert client.post('/api/generate-test', json={}).status_code == 400
+    after = client.get('/metrics').get_data(as_text=True)
+    assert sample(after, request_count) == counts[0] + 1
+    assert sample(after, selection_count) == counts[1] + 1
+    assert sample(after, 'generate_test_request_seconds_count{status="400"}') >= 1
+    assert re.search(r'^generate_test_errors_total \d+$', after, re.M)
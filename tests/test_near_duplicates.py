@@ -0,0 +1,58 @@
+import near_duplicates
+from conftest import write_bank
+from near_duplicates import NearDuplicateIndex, clusters_path_for, load_clusters, update_clusters
+from question_loader import parse_questions_csv
+
+ROWS = [
+    ['1', 'What is the capital city of France?', 'A', 'Easy', 'True/False'],
+    ['2', 'What is the capital city of France ?', 'A', 'Easy', 'True/False'],
+    ['3', 'Solve 2x + 5 = 15 for x', 'B', 'Hard', 'Question Answer'],
+    ['4', 'Photosynthesis converts sunlight to energy', 'C', 'Medium', 'Fill in the Blanks'],
+    ['5', 'what is the  capital city of france?', 'B', 'Easy', 'True/False'],
+]
+
+
+def test_saved_clusters_match_a_fresh_build(tmp_path):
+    csv_path = str(tmp_path / 'q.csv')
+    write_bank(csv_path, ROWS)
+    store = parse_questions_csv(csv_path)
+    update_clusters(csv_path, store)
+
+    mapped = load_clusters(clusters_path_for(csv_path), store, near_duplicates.DEFAULT_THRESHOLD)
+    built = NearDuplicateIndex().build(store)
+    assert list(mapped.cluster_of) == list(built.cluster_of)
+    assert mapped.members == built.members
+    assert sorted(mapped.mates(0)) == [1, 4]
+    assert mapped.mates(2) == []
+    # Another threshold or bank version needs a new file
+    assert load_clusters(clusters_path_for(csv_path), store, 0.5) is None
+    write_bank(csv_path, ROWS + [['6', 'A new question', 'C', 'Hard', 'True/False']])
+    assert load_clusters(clusters_path_for(csv_path), parse_questions_csv(csv_path),
+                         near_duplicates.DEFAULT_THRESHOLD) is None
+
+
+def test_rewriting_only_hashes_new_texts(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / 'q.csv')
+    write_bank(csv_path, ROWS)
+    update_clusters(csv_path, parse_questions_csv(csv_path))
+
+    hashed = []
+    original = near_duplicates.signature
+    monkeypatch.setattr(near_duplicates, 'signature', lambda text: hashed.append(text) or original(text))
+    write_bank(csv_path, [['0', 'An inserted question', 'C', 'Hard', 'True/False']] + ROWS)
+    store = parse_questions_csv(csv_path)
+    clusters = update_clusters(csv_path, store)
+    assert hashed == ['an inserted question']
+    assert sorted(clusters.mates(1)) == [2, 5]
+
+
+def test_app_maps_saved_clusters_without_building(app_module, tmp_path, monkeypatch):
+    csv_path = str(tmp_path / 'q.csv')
+    write_bank(csv_path, ROWS)
+    monkeypatch.setattr(near_duplicates.NearDuplicateIndex, 'build', None)  # Must not run at load
+    assert app_module.load_question_store(csv_path).duplicates is None
+
+    monkeypatch.undo()
+    update_clusters(csv_path, parse_questions_csv(csv_path), app_module.NEAR_DUPLICATE_THRESHOLD)
+    monkeypatch.setattr(near_duplicates.NearDuplicateIndex, 'build', None)
+    assert len(app_module.load_question_store(csv_path).duplicates) == 1
@@ -0,0 +1,67 @@
+import pytest
+
+from conftest import quota_request
+from paraphrases import ParaphraseIndex, VariantChooser
+
+
+def write_corpus(path, lines):
+    path.write_text('original,paraphrase,style\n' + '\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_malformed_rows_are_reported_not_split(tmp_path):
+    path = write_corpus(tmp_path / 'p.csv', [
+        'What is par?,Define par.,formal',
+        '"Do you take cards, or cash?","Cards, cash?",casual',
+        'Do you take cards, or cash?,Cards or cash?,casual',  # Unquoted comma: 4 fields
+        'What is par?,,formal',
+        'What is par?,Par means?,any',  # Reserved for requests
+    ])
+    index = ParaphraseIndex.from_csv(path)
+    assert sorted(index.texts) == ['Cards, cash?', 'Define par.']
+    assert index.rejected == [4, 5, 6]
+    assert set(index.ranges) == {'what is par?', 'do you take cards, or cash?'}
+
+
+def test_matches_counts_questions_with_variants(app_module, tmp_path):
+    store = app_module.question_store
+    text = store.questions[0].question
+    index = ParaphraseIndex([(f"  {text.upper()} ", 'Reworded', 'formal'), ('Not in the bank', 'x', 'formal')])
+    assert index.matches(store) == 1
+
+
+@pytest.fixture
+def chooser(app_module, monkeypatch):
+    store = app_module.question_store
+    rows = [(q.question, f"{q.question} ({style})", style) for q in store.questions for style in ('formal', 'casual')]
+    chooser = VariantChooser(ParaphraseIndex(rows))
+    monkeypatch.setattr(app_module, 'variant_chooser', chooser)
+    return chooser
+
+
+def test_variants_of_the_requested_style_are_served(app_module, chooser):
+    client = app_module.app.test_client()
+    body = client.post('/api/generate-test', json=dict(quota_request(3), paraphrase_style='casual')).get_json()
+    assert len(body['test']) == 3
+    for item in body['test']:
+        original = app_module.question_store.get(item['id']).question
+        assert item['question'] == f"{original} (casual)"
+        assert item['paraphrase_style'] == 'casual'
+
+
+def test_student_sees_the_same_variant_on_retakes(app_module, chooser):
+    store = app_module.question_store
+    q = store.questions[0]
+    first = chooser.choose(store, 'student:a', q, 'any')
+    assert first >= 0
+    chooser._chosen.clear()
+    assert chooser.choose(store, 'student:a', q, 'any') == first
+
+
+def test_unknown_or_unavailable_style_is_rejected(app_module, chooser, monkeypatch):
+    client = app_module.app.test_client()
+    response = client.post('/api/generate-test', json=dict(quota_request(3), paraphrase_style='poetic'))
+    assert response.status_code == 400
+    monkeypatch.setattr(app_module, 'variant_chooser', None)
+    response = client.post('/api/generate-test', json=dict(quota_request(3), paraphrase_style='casual'))
+    assert response.status_code == 503
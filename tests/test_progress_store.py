@@ -0,0 +1,95 @@
+import pytest
+
+from conftest import BANK_CSV, quota_request, write_bank
+from progress_store import MemoryProgressStore, QuestionBitmap, SQLiteProgressStore
+from question_store import QuestionStore
+
+
+def make_store(ids, version):
+    return QuestionStore.from_columns(ids, [f"Question {qid}" for qid in ids], ['A'] * len(ids),
+                                      ['Easy'] * len(ids), ['True/False'] * len(ids), version)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def progress_store(request, tmp_path):
+    store = MemoryProgressStore() if request.param == 'memory' else SQLiteProgressStore(str(tmp_path / 'p.db'))
+    yield store
+    store.close()
+
+
+def used_ids(progress_store, key, store):
+    return sorted(store.questions[i].id for i in progress_store.load(key, store).used)
+
+
+def test_bitmap_round_trip():
+    bitmap = QuestionBitmap()
+    bitmap.update([0, 7, 8, 1000])
+    restored = QuestionBitmap.decompress(bitmap.compress())
+    assert list(restored) == [0, 7, 8, 1000]
+    assert len(restored) == 4 and 1000 in restored and 999 not in restored
+
+
+def test_record_and_reset(progress_store):
+    store = make_store(list(range(1, 11)), 'v1')
+    progress_store.record('s', store, [0, 2])
+    progress_store.record('s', store, [4])
+    assert used_ids(progress_store, 's', store) == [1, 3, 5]
+    progress_store.record('s', store, [9], reset=True)
+    progress = progress_store.load('s', store)
+    assert list(progress.used) == [9] and progress.exhausted
+
+
+def test_positions_follow_ids_across_versions(progress_store):
+    old = make_store([1, 2, 3, 4, 5], 'v1')
+    progress_store.record('s', old, [1, 3])  # ids 2 and 4
+    # A row inserted at the top and one removed shift every position
+    new = make_store([100, 1, 2, 3, 5], 'v2')
+    assert used_ids(progress_store, 's', new) == [2]
+    progress_store.record('s', new, [0])
+    assert used_ids(progress_store, 's', new) == [2, 100]
+
+
+def test_sqlite_translation_survives_restart(tmp_path):
+    path = str(tmp_path / 'p.db')
+    first = SQLiteProgressStore(path)
+    first.record('s', make_store([1, 2, 3], 'v1'), [0, 2])
+    first.close()
+    second = SQLiteProgressStore(path)
+    assert used_ids(second, 's', make_store([0, 1, 2, 3], 'v2')) == [1, 3]
+    second.close()
+
+
+def test_reload_with_inserted_row_keeps_history(app_module, bank_rows):
+    client = app_module.app.test_client()
+    served = [q['id'] for q in client.post('/api/generate-test', json=quota_request()).get_json()['test']]
+    with client.session_transaction() as session:
+        sid = session['sid']
+
+    write_bank(BANK_CSV, [['999', 'An inserted question?', 'C', 'Hard', 'True/False']] + bank_rows)
+    assert app_module.reload_questions_from_csv()
+
+    store = app_module.question_store
+    assert store.questions[0].id == 999
+    assert app_module.used_question_ids(store, sid) == set(served)
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Admin-Token': ''}, {'X-Admin-Token': 'wrong'}, {'X-Admin-Token': 'sécret'}])
+def test_reload_needs_the_admin_token(app_module, monkeypatch, headers):
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secret')
+    client = app_module.app.test_client()
+    assert client.post('/api/admin/reload-questions', headers=headers).status_code == 403
+
+
+def test_reload_is_forbidden_without_a_configured_token(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', None)
+    client = app_module.app.test_client()
+    assert client.post('/api/admin/reload-questions', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_reload_with_the_admin_token(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secret')
+    triggered = []
+    monkeypatch.setattr(app_module.question_reloader, 'trigger', lambda: triggered.append(True) or True)
+    client = app_module.app.test_client()
+    response = client.post('/api/admin/reload-questions', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 202 and triggered
@@ -0,0 +1,68 @@
+import pytest
+
+import bank_cache
+from conftest import write_bank
+from question_import import import_questions
+from question_loader import parse_questions_csv
+
+BAD_ROWS = [
+    [1, 'One?', 'A', 'Easy', 'True/False'],
+    [1, 'One again?', 'A', 'Easy', 'True/False'],
+    [2, '', 'A', 'Easy', 'True/False'],
+    [3, 'Three?', 'A', 'Trivial', 'True/False'],
+    [2 ** 63, 'Huge?', 'A', 'Easy', 'True/False'],
+    ['q-5', 'Five?', 'B', 'Hard', 'Question Answer'],
+]
+
+
+def attributes(store):
+    return [(q.id, q.question, q.category, q.difficulty, q.type) for q in store.questions]
+
+
+def test_import_rejects_the_rows_the_loader_rejects(tmp_path):
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, BAD_ROWS)
+    with pytest.raises(ValueError) as excinfo:
+        parse_questions_csv(path)
+    report = import_questions(path, error_report=str(tmp_path / 'errors.csv'))
+    assert [line for line, _, _ in report.errors] == [3, 4, 5, 6]
+    for line, _, error in report.errors:
+        assert f"line {line}: {error}" in str(excinfo.value)
+    assert 'outside the 64-bit integer range' in report.errors[3][2]
+    assert report.imported == 2
+    store = bank_cache.load_cache(path, allow_incomplete=True)
+    assert [q.id for q in store.questions] == [1, 'q-5']
+
+
+def test_text_ids_are_imported_like_the_loader_reads_them(tmp_path):
+    path = str(tmp_path / 'bank.csv')
+    # The text id arrives after a chunk of integer ids was already spilled
+    write_bank(path, [[i, f"Question {i}?", 'ABC'[i % 3], 'Easy', 'True/False'] for i in range(1, 6)] +
+               [['x-6', 'Six?', 'A', 'Medium', 'True/False'], [7, 'Seven?', 'B', 'Hard', 'True/False']])
+    report = import_questions(path, chunk_rows=2)
+    assert report.rejected == 0
+    loaded = bank_cache.load_cache(path)
+    assert attributes(loaded) == attributes(parse_questions_csv(path))
+    assert loaded.get('x-6').question == 'Six?'
+    assert loaded.get(7).question == 'Seven?'
+
+
+def test_incomplete_cache_is_not_served_on_later_startups(tmp_path, monkeypatch, capsys):
+    import app1
+    monkeypatch.setattr(app1, 'USE_QUESTION_CACHE', True)
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, BAD_ROWS)
+    assert len(app1.read_question_store(path)) == 2
+    assert bank_cache.load_cache(path) is None
+    capsys.readouterr()
+    assert len(app1.read_question_store(path)) == 2
+    assert 'rejected 4' in capsys.readouterr().out
+
+
+def test_bank_without_valid_rows_fails_to_load(tmp_path, monkeypatch):
+    import app1
+    monkeypatch.setattr(app1, 'USE_QUESTION_CACHE', True)
+    path = str(tmp_path / 'bank.csv')
+    write_bank(path, [[1, 'One?', 'A', 'Trivial', 'True/False']])
+    with pytest.raises(ValueError):
+        app1.read_question_store(path)
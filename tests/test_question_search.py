@@ -0,0 +1,82 @@
+import gc
+
+from bank_registry import BankRegistry, base_footprint
+from conftest import BANK_CSV, write_bank
+from question_loader import parse_questions_csv
+from question_search import SearchIndexBuilder
+
+
+def search_ids(client, **params):
+    body = client.get('/api/questions/search', query_string=params).get_json()
+    return [q['id'] for q in body['questions']], body
+
+
+def test_index_is_built_on_first_search(app_module):
+    app_module.search_index_builders.clear()
+    app_module.reload_questions_from_csv()
+    store = app_module.question_store
+    assert store.search_index is None
+    client = app_module.app.test_client()
+    ids, body = search_ids(client, q='capital', limit=100)
+    assert store.search_index is not None
+    expected = [q.id for q in store.questions if 'capital' in q.question.lower().split()]
+    assert ids == expected and body['total'] == len(expected)
+
+
+def test_prefix_phrase_facets_and_cursor(app_module):
+    client = app_module.app.test_client()
+    store = app_module.question_store
+    ids, _ = search_ids(client, q='"capital of france"')
+    assert ids == [q.id for q in store.questions if 'capital of france' in q.question.lower()]
+
+    ids, body = search_ids(client, q='photo*', difficulty='Hard', limit=1)
+    matches = [q for q in store.questions if any(w.startswith('photo') for w in q.question.lower().split())]
+    assert body['facets']['difficulty'] == {
+        d: sum(q.difficulty == d for q in matches) for d in {q.difficulty for q in matches}}
+    paged = ids
+    while body['next_cursor']:
+        ids, body = search_ids(client, q='photo*', difficulty='Hard', limit=1, cursor=body['next_cursor'])
+        paged += ids
+    assert paged == [q.id for q in matches if q.difficulty == 'Hard']
+
+
+def test_reload_rebuilds_a_searched_index_reusing_tokens(app_module, bank_rows):
+    client = app_module.app.test_client()
+    search_ids(client, q='capital')
+    write_bank(BANK_CSV, [['999', 'Zanzibar trivia question', 'C', 'Hard', 'True/False']] + bank_rows)
+    assert app_module.reload_questions_from_csv()
+    gc.collect()
+    store = app_module.question_store
+    assert store.search_index is not None  # Rebuilt at load since the old one was in use
+    ids, _ = search_ids(client, q='zanzibar')
+    assert ids == [999]
+
+
+def test_builder_memo_does_not_outlive_the_index(tmp_path):
+    csv_path = str(tmp_path / 'q.csv')
+    write_bank(csv_path, [['1', 'What is the capital of France?', 'A', 'Easy', 'True/False']])
+    builder = SearchIndexBuilder()
+    index = builder.build(parse_questions_csv(csv_path))
+    assert builder.warm and all(isinstance(key, int) for key in index.tokens_by_key)
+    del index
+    gc.collect()
+    assert not builder.warm
+
+
+def test_registry_budget_counts_search_indexes(tmp_path):
+    paths = {}
+    for name in ('a', 'b'):
+        paths[name] = str(tmp_path / f'{name}.csv')
+        write_bank(paths[name], [[str(i), f'Question {name} number {i}', 'A', 'Easy', 'True/False']
+                                 for i in range(50)])
+    store_a = parse_questions_csv(paths['a'])
+    budget = 2 * base_footprint(store_a) + 100
+    registry = BankRegistry(parse_questions_csv, budget)
+    for name, path in paths.items():
+        registry.register(name, path)
+    store_a = registry.get('a')
+    store_b = registry.get('b')
+    assert [bank['loaded'] for bank in registry.describe()] == [True, True]
+    store_b.search_index = SearchIndexBuilder().build(store_b)
+    registry.check_budget('b')
+    assert [bank['loaded'] for bank in registry.describe()] == [False, True]
@@ -0,0 +1,73 @@
+import random
+import time
+from collections import Counter
+
+from question_store import QuestionStore
+from quota_solver import solve_quotas
+from selector import random_order, select_exact
+
+
+def marginals(counts):
+    sums = (Counter(), Counter(), Counter())
+    for key, n in counts.items():
+        for a in range(3):
+            sums[a][key[a]] += n
+    return sums
+
+
+def test_feasible_quotas_are_met_within_capacity():
+    capacity = {('A', 'Easy', 'TF'): 2, ('A', 'Hard', 'QA'): 3, ('B', 'Easy', 'QA'): 4, ('B', 'Hard', 'TF'): 1}
+    quotas = ({'A': 3, 'B': 4}, {'Easy': 4, 'Hard': 3}, {'TF': 2, 'QA': 5})  # Met by taking 1, 2, 3, 1
+    counts = solve_quotas(capacity, *quotas, rng=random.Random(0))
+    assert counts is not None
+    assert all(n <= capacity[key] for key, n in counts.items())
+    assert marginals(counts) == tuple(Counter(q) for q in quotas)
+
+
+def test_infeasible_quotas_return_none():
+    # Every value has enough supply on its own, but A only has Easy questions
+    capacity = {('A', 'Easy', 'TF'): 5, ('B', 'Hard', 'TF'): 5, ('B', 'Easy', 'TF'): 5}
+    assert solve_quotas(capacity, {'A': 3}, {'Hard': 3}, {'TF': 3}) is None
+    assert solve_quotas(capacity, {'A': 2}, {'Easy': 3}, {'TF': 2}) is None  # Totals differ
+
+
+def test_search_stops_at_the_time_budget():
+    rng = random.Random(1)
+    cats, diffs, types = [f"C{i}" for i in range(20)], ['Easy', 'Medium', 'Hard'], [f"T{i}" for i in range(10)]
+    for _ in range(20):
+        capacity = {(c, d, t): rng.choice([0, 0, 1, 2]) for c in cats for d in diffs for t in types}
+        started = time.perf_counter()
+        solve_quotas(capacity, {c: 3 for c in cats}, {d: 20 for d in diffs}, {t: 6 for t in types},
+                     time_budget=0.005, rng=rng)
+        assert time.perf_counter() - started < 0.05
+
+
+def test_random_order_is_a_permutation():
+    items = list(range(50))
+    for probes in (0, 5, 500):
+        assert sorted(random_order(items, random.Random(probes), probes)) == items
+
+
+def make_store(rows):
+    return QuestionStore.from_columns([r[0] for r in rows], [f"Q{r[0]}" for r in rows],
+                                      [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows], 'v')
+
+
+def test_select_exact_meets_quotas_and_skips_blocked():
+    rows = [(i, 'A' if i % 2 else 'B', 'Easy' if i % 3 else 'Hard', 'TF' if i % 5 else 'QA') for i in range(300)]
+    store = make_store(rows)
+    # Block most of one bucket so sampling has to fall back to scanning it
+    bucket = store.bucket('A', 'Easy', 'TF')
+    blocked = {q.id for q in bucket[:-3]}
+    selection = select_exact(store, blocked, 6, {'A': 4, 'B': 2}, {'Easy': 4, 'Hard': 2}, {'TF': 5, 'QA': 1},
+                             rng=random.Random(3))
+    assert selection is not None and len(selection.selected) == 6
+    assert not blocked & {q.id for q in selection.selected}
+    for attr, quota in (('category', {'A': 4, 'B': 2}), ('difficulty', {'Easy': 4, 'Hard': 2}),
+                        ('type', {'TF': 5, 'QA': 1})):
+        assert Counter(q[attr] for q in selection.selected) == Counter(quota)
+
+
+def test_select_exact_returns_none_without_a_solution():
+    store = make_store([(i, 'A', 'Easy', 'TF') for i in range(10)])
+    assert select_exact(store, set(), 3, {'A': 3}, {'Hard': 3}, {'TF': 3}) is None
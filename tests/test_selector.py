@@ -0,0 +1,134 @@
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+from question_store import QuestionStore
+from selector import select_questions
+
+CATEGORIES, DIFFICULTIES, TYPES = ['A', 'B', 'C'], ['Easy', 'Medium', 'Hard'], ['True/False', 'Question Answer']
+
+
+def random_store(rng, size):
+    rows = [(i, rng.choice(CATEGORIES), rng.choices(DIFFICULTIES, [5, 1, 3])[0], rng.choice(TYPES))
+            for i in range(1, size + 1)]
+    return QuestionStore.from_columns([r[0] for r in rows], [f"Question {r[0]}?" for r in rows],
+                                      [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows], 'v')
+
+
+def random_quotas(rng, total):
+    def split(values):
+        cuts = sorted(rng.randint(0, total) for _ in values[1:])
+        return {v: hi - lo for v, lo, hi in zip(values, [0] + cuts, cuts + [total])}
+    return split(CATEGORIES), split(DIFFICULTIES), split(TYPES)
+
+
+def old_route_selection(available, total, cats, diffs, types):
+    """The three passes as generate_test ran them before the selector module"""
+    selected = []
+    remaining = {'category': dict(cats), 'difficulty': dict(diffs), 'type': dict(types)}
+    actual = {attr: defaultdict(int) for attr in remaining}
+    substitutions = {attr: defaultdict(list) for attr in remaining}
+
+    def open_quota(attr, value):
+        return value in remaining[attr] and remaining[attr][value] > 0
+
+    for q in available:
+        if len(selected) >= total:
+            break
+        if all(open_quota(attr, q[attr]) for attr in remaining):
+            selected.append(q)
+            for attr in remaining:
+                remaining[attr][q[attr]] -= 1
+                actual[attr][q[attr]] += 1
+
+    if remaining['difficulty'].get('Medium', 0) > 0:
+        for q in available:
+            if len(selected) >= total:
+                break
+            if q['id'] in [s['id'] for s in selected]:
+                continue
+            if (q['difficulty'] == 'Hard' and remaining['difficulty'].get('Medium', 0) > 0 and
+                    open_quota('category', q['category']) and open_quota('type', q['type'])):
+                selected.append(q)
+                remaining['difficulty']['Medium'] -= 1
+                actual['difficulty']['Hard'] += 1
+                substitutions['difficulty']['Medium'].append('Hard')
+                for attr in ('category', 'type'):
+                    remaining[attr][q[attr]] -= 1
+                    actual[attr][q[attr]] += 1
+
+    for q in available:
+        if len(selected) >= total:
+            break
+        if q['id'] in [s['id'] for s in selected]:
+            continue
+        if any(open_quota(attr, q[attr]) for attr in remaining):
+            selected.append(q)
+            if q['difficulty'] != 'Medium' and remaining['difficulty'].get('Medium', 0) > 0:
+                remaining['difficulty']['Medium'] -= 1
+                substitutions['difficulty']['Medium'].append(q['difficulty'])
+            elif open_quota('difficulty', q['difficulty']):
+                remaining['difficulty'][q['difficulty']] -= 1
+            actual['difficulty'][q['difficulty']] += 1
+            for attr in ('category', 'type'):
+                if open_quota(attr, q[attr]):
+                    remaining[attr][q[attr]] -= 1
+                    actual[attr][q[attr]] += 1
+    return selected, actual, substitutions
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_report_matches_the_old_route(seed):
+    rng = random.Random(seed)
+    store = random_store(rng, rng.randint(5, 80))
+    total = rng.randint(1, 30)
+    quotas = random_quotas(rng, total)
+    available = list(store.questions)
+    rng.shuffle(available)
+
+    selection = select_questions(available, total, *quotas)
+    selected, actual, substitutions = old_route_selection(available, total, *quotas)
+    assert [q.id for q in selection.selected] == [q['id'] for q in selected]
+    assert selection.actual_counts == actual
+    assert selection.substitutions == substitutions
+
+
+def test_excluded_questions_are_skipped():
+    store = random_store(random.Random(0), 40)
+    excluded = {q.id for q in store.questions[::2]}
+    selection = select_questions(list(store.questions), 10, *random_quotas(random.Random(1), 10),
+                                 excluded_ids=excluded)
+    assert not excluded & selection.selected_ids
+    assert len(selection.selected) == len(selection.selected_ids)
+
+
+def test_vectorised_selection_has_the_python_distribution():
+    np = pytest.importorskip('numpy')
+    import vector_select
+
+    store = random_store(random.Random(5), 24)
+    index = vector_select.build_index(store)
+    quotas = ({'A': 3, 'B': 2, 'C': 1}, {'Easy': 2, 'Medium': 3, 'Hard': 1}, {'True/False': 4, 'Question Answer': 2})
+    runs = 4000
+    python_rng, numpy_rng = random.Random(7), np.random.default_rng(7)
+    python_picks, vector_picks, python_reports, vector_reports = Counter(), Counter(), Counter(), Counter()
+    for _ in range(runs):
+        available = list(store.questions)
+        python_rng.shuffle(available)
+        selection = select_questions(available, 6, *quotas)
+        python_picks.update(selection.selected_ids)
+        python_reports[repr(sorted(selection.actual_counts['difficulty'].items()))] += 1
+        selection = vector_select.select_vectorized(index, 6, *quotas, rng=numpy_rng)
+        vector_picks.update(selection.selected_ids)
+        vector_reports[repr(sorted(selection.actual_counts['difficulty'].items()))] += 1
+
+    # Per question inclusion rates and the spread of difficulty reports agree within sampling noise
+    for qid in {q.id for q in store.questions}:
+        p = (python_picks[qid] + vector_picks[qid]) / (2 * runs)
+        tolerance = 5 * (2 * p * (1 - p) / runs) ** 0.5 + 1e-9
+        assert abs(python_picks[qid] - vector_picks[qid]) / runs <= tolerance
+    for report in set(python_reports) | set(vector_reports):
+        p = (python_reports[report] + vector_reports[report]) / (2 * runs)
+        tolerance = 5 * (2 * p * (1 - p) / runs) ** 0.5 + 1e-9
+        assert abs(python_reports[report] - vector_reports[report]) / runs <= tolerance
@@ -0,0 +1,77 @@
+import os
+import re
+import shutil
+
+import pytest
+
+import static_assets
+
+
+@pytest.fixture
+def built(app_module, tmp_path):
+    """Build test.html's assets into the app's asset directory, removed afterwards"""
+    static = tmp_path / 'static'
+    for name in ('css/test.css', 'js/test.js'):
+        (static / name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(os.path.join(app_module.app.root_path, 'static', name), static / name)
+    out = app_module.ASSET_DIR
+
+    def build():
+        return static_assets.build(str(static), out)
+
+    yield static, build
+    shutil.rmtree(out, ignore_errors=True)
+    app_module.static_assets.refresh()
+
+
+def asset_urls(html):
+    return re.findall(r'/assets/[^"\']+', html)
+
+
+def test_pages_link_hashed_assets_with_immutable_caching(app_module, built):
+    _, build = built
+    manifest = build()
+    client = app_module.app.test_client()
+    page = client.get('/test.html')
+    assert page.headers['Cache-Control'] == 'no-cache'
+    urls = asset_urls(page.get_data(as_text=True))
+    assert sorted(urls) == sorted(f"/assets/{manifest['files'][name]['path']}"
+                                  for name in ('css/test.css', 'js/test.js'))
+
+    css_url = next(url for url in urls if url.endswith('.css'))
+    plain = client.get(css_url, headers={'Accept-Encoding': 'identity'})
+    assert plain.status_code == 200
+    assert plain.headers['Cache-Control'] == static_assets.IMMUTABLE
+    assert 'Content-Encoding' not in plain.headers
+    gzipped = client.get(css_url, headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['Vary'] == 'Accept-Encoding'
+    assert client.get(css_url, headers={'If-None-Match': plain.headers['ETag'],
+                                        'Accept-Encoding': 'identity'}).status_code == 304
+    assert client.get('/assets/css/test.000000000000.css').status_code == 404
+    assert client.get('/assets/%2e%2e/manifest.0123456789ab.json').status_code == 404
+
+
+def test_page_cache_follows_a_new_build(app_module, built):
+    static, build = built
+    build()
+    client = app_module.app.test_client()
+    first = client.get('/test.html')
+    assert client.get('/test.html', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    with open(static / 'css' / 'test.css', 'a', encoding='utf-8') as f:
+        f.write('\nbody { margin: 0; }\n')
+    build()
+    second = client.get('/test.html')
+    assert second.headers['ETag'] != first.headers['ETag']
+    new_urls = set(asset_urls(second.get_data(as_text=True)))
+    old_urls = set(asset_urls(first.get_data(as_text=True)))
+    assert len(new_urls - old_urls) == 1 and next(iter(new_urls - old_urls)).endswith('.css')
+    # Files of the earlier build stay, pages rendered before it still load
+    assert all(client.get(url).status_code == 200 for url in old_urls)
+
+
+def test_without_a_build_templates_use_plain_static_urls(app_module):
+    app_module.static_assets.refresh()
+    html = app_module.app.test_client().get('/test.html').get_data(as_text=True)
+    assert '/static/css/test.css' in html and not asset_urls(html)
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('answered_at', ['abc', 'nan', float('inf'), True, [1]])
+def test_invalid_answered_at_is_rejected(app_module, answered_at):
+    client = app_module.app.test_client()
+    response = client.post('/api/submit-answers', json={
+        'student_id': 'bad-clock',
+        'attempts': [{'question_id': 1, 'correct': False, 'answered_at': answered_at}]})
+    assert response.status_code == 400
+    assert app_module.retest_scheduler.due('student:bad-clock') == []
+
+
+def test_valid_answered_at_schedules_a_retest(app_module):
+    client = app_module.app.test_client()
+    response = client.post('/api/submit-answers', json={
+        'student_id': 'clock', 'attempts': [{'question_id': 1, 'correct': False, 'answered_at': '1700000000'}]})
+    assert response.status_code == 202
+    assert app_module.retest_scheduler.due('student:clock') == [1]
+
+
+def test_queued_attempts_are_written_at_exit(tmp_path):
+    # A separate interpreter, so exiting runs the atexit hook for real
+    log_path = tmp_path / 'attempts.db'
+    script = textwrap.dedent("""
+        import app1
+        from attempt_log import Attempt
+        app1.attempt_log.submit([Attempt('exit-user', i, False) for i in range(200)])
+    """)
+    subprocess.run([sys.executable, '-c', script], check=True, cwd=REPO_ROOT, capture_output=True,
+                   env=dict(os.environ, ATTEMPT_LOG=str(log_path)))
+    with sqlite3.connect(log_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM attempts').fetchone()[0] == 200
+
+
+@pytest.mark.parametrize('question_id', [[1], {'id': 1}, 99999, None, True])
+def test_malformed_or_unknown_ids_reject_the_whole_batch(app_module, question_id):
+    client = app_module.app.test_client()
+    response = client.post('/api/submit-answers', json={
+        'student_id': 'bad-id',
+        'attempts': [{'question_id': 2, 'correct': False}, {'question_id': question_id, 'correct': False}]})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert app_module.retest_scheduler.due('student:bad-id') == []
+
+
+def test_numeric_string_ids_are_scheduled_under_the_bank_id(app_module):
+    client = app_module.app.test_client()
+    response = client.post('/api/submit-answers', json={
+        'student_id': 'string-id', 'attempts': [{'question_id': '3', 'correct': False, 'answered_at': 1}]})
+    assert response.status_code == 202
+    assert app_module.retest_scheduler.due('student:string-id') == [3]
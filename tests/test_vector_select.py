@@ -0,0 +1,33 @@
+from collections import Counter
+
+import pytest
+
+from conftest import write_bank
+from question_loader import parse_questions_csv
+
+np = pytest.importorskip('numpy')
+import vector_select  # noqa: E402
+
+
+def one_bucket_store(tmp_path, size):
+    path = tmp_path / 'bank.csv'
+    write_bank(path, [[i, f"Question {i}?", 'A', 'Easy', 'True/False'] for i in range(1, size + 1)])
+    return parse_questions_csv(str(path))
+
+
+@pytest.mark.parametrize('blocked', [2, 17])
+def test_draw_is_uniform_over_open_questions(tmp_path, blocked):
+    # 2 blocked questions are skipped by rejection, 17 of 20 mostly fall back to the mask
+    store = one_bucket_store(tmp_path, 20)
+    index = vector_select.build_index(store)
+    rng = np.random.default_rng(1)
+    excluded = set(range(1, blocked + 1))
+    draws = Counter()
+    for _ in range(3000):
+        selection = vector_select.select_vectorized(
+            index, 1, {'A': 1}, {'Easy': 1}, {'True/False': 1}, excluded_ids=excluded, rng=rng)
+        draws[selection.selected[0]['id']] += 1
+    open_ids = set(range(blocked + 1, 21))
+    assert set(draws) == open_ids
+    expected = 3000 / len(open_ids)
+    assert all(abs(count - expected) < 5 * expected ** 0.5 for count in draws.values())
@@ -0,0 +1,225 @@
+"""Greedy test selection over dictionary-encoded NumPy arrays.
+
+Categories, difficulties and types are encoded once per loaded bank into
+small integer arrays, and rows are grouped by their (category, difficulty,
+type) bucket. A request then only works on per-bucket arrays: boolean
+masks of the buckets still matching the quotas, the open question count
+and the random key of the next question in each bucket. The actual
+question is a random slot of its bucket, redrawn while it hits a taken
+or blocked one.
+
+The passes replay select_questions' shuffled walk exactly in
+distribution, so results keep the generate-test semantics while the work
+per request no longer grows with the size of the bank. NumPy is optional;
+without it build_index returns None and the pure Python selector is used.
+"""
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Optional, selection falls back to selector.select_questions
+    np = None
+
+from selector import Selection, take_retests
+
+MAX_REJECTIONS = 8  # Random slots tried before masking the bucket's open questions
+
+
+def _code_dtype(values):
+    return np.uint8 if len(values) <= 0xFF else np.uint16
+
+
+class VectorIndex:
+    """Encoded attribute arrays of one question store, grouped by bucket"""
+    __slots__ = ('store', 'categories', 'difficulties', 'types', 'bucket_of',
+                 'bucket_category', 'bucket_difficulty', 'bucket_type',
+                 'members', 'starts', 'sizes')
+
+    def __init__(self, store):
+        self.store = store
+        keys = list(store.buckets)
+        values = [sorted({key[i] for key in keys}) for i in range(3)]
+        codes = [{v: code for code, v in enumerate(vals)} for vals in values]
+        self.categories, self.difficulties, self.types = values
+
+        # Per bucket attribute codes, rows point at their bucket
+        self.bucket_category = np.array([codes[0][k[0]] for k in keys], dtype=_code_dtype(values[0]))
+        self.bucket_difficulty = np.array([codes[1][k[1]] for k in keys], dtype=_code_dtype(values[1]))
+        self.bucket_type = np.array([codes[2][k[2]] for k in keys], dtype=_code_dtype(values[2]))
+        self.sizes = np.array([len(store.buckets[k]) for k in keys], dtype=np.int64)
+        self.starts = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(self.sizes, out=self.starts[1:])
+        # Store positions ordered by bucket, bucket b owns members[starts[b]:starts[b + 1]]
+        self.members = np.fromiter(
+            (q.index for key in keys for q in store.buckets[key]),
+            dtype=np.int64, count=len(store))
+        self.bucket_of = np.empty(len(store), dtype=np.int32)
+        self.bucket_of[self.members] = np.repeat(np.arange(len(keys), dtype=np.int32), self.sizes)
+
+    def quota_array(self, values, quotas):
+        """Remaining quota per encoded value, values missing from the bank are dropped"""
+        return np.array([quotas.get(v, 0) for v in values], dtype=np.int64)
+
+
+def build_index(store):
+    """Encode store for vectorised selection, None when NumPy is missing or the store is empty"""
+    if np is None or not store:
+        return None
+    return VectorIndex(store)
+
+
+class _Draw:
+    """Open questions of one request in a lazily drawn random order.
+
+    The shuffled walk of select_questions is a uniformly random order of
+    the candidates. Within a bucket that order is a random permutation of
+    its open questions; across buckets it interleaves by random keys. Each
+    bucket keeps the key of its next untaken question: the minimum of the
+    remaining uniform keys above the previous one, drawn in O(1). A pass
+    visits the fitting bucket with the smallest next key, which replays the
+    walk exactly since a bucket that stops fitting never fits again within
+    the same pass.
+    """
+
+    def __init__(self, index, blocked_ids, rng):
+        self.index = index
+        self.rng = rng
+        self.open = np.ones(len(index.store), dtype=bool)
+        by_id = index.store.by_id
+        blocked = [by_id[qid].index for qid in blocked_ids if qid in by_id]
+        if blocked:
+            blocked = np.array(blocked, dtype=np.int64)
+            self.open[blocked] = False
+            self.counts = index.sizes - np.bincount(
+                index.bucket_of[blocked], minlength=len(index.sizes))
+        else:
+            self.counts = index.sizes.copy()
+        self.last_key = np.zeros(len(self.counts))  # Key of the last question taken per bucket
+        self.next_key = np.full(len(self.counts), np.inf)
+        has_open = self.counts > 0
+        self.next_key[has_open] = 1.0 - rng.random(int(has_open.sum())) ** (1.0 / self.counts[has_open])
+
+    def _redraw(self, bucket):
+        # Smallest of the bucket's remaining keys, all uniform above the last one
+        count = self.counts[bucket]
+        if count > 0:
+            key = self.last_key[bucket]
+            self.next_key[bucket] = key + (1.0 - key) * (1.0 - self.rng.random() ** (1.0 / count))
+        else:
+            self.next_key[bucket] = np.inf
+
+    def remove(self, q):
+        """Drop a question taken outside the walk, e.g. a retest or a near-duplicate"""
+        if self.open[q.index]:
+            self.open[q.index] = False
+            bucket = self.index.bucket_of[q.index]
+            self.counts[bucket] -= 1
+            # It held the bucket's next key with probability 1 / (questions before removal)
+            if self.counts[bucket] == 0 or self.rng.random() * (self.counts[bucket] + 1) < 1.0:
+                self._redraw(bucket)
+
+    def next_bucket(self, fits):
+        """Bucket of the next question the walk would take, None at the end of the pass"""
+        keys = np.where(fits, self.next_key, np.inf)
+        bucket = int(keys.argmin())
+        return bucket if keys[bucket] < np.inf else None
+
+    def take(self, bucket):
+        """Take the bucket's next question, uniformly random among its open ones"""
+        index = self.index
+        start, end = int(index.starts[bucket]), int(index.starts[bucket + 1])
+        for _ in range(MAX_REJECTIONS):
+            position = int(index.members[self.rng.integers(start, end)])
+            if self.open[position]:
+                break
+        else:
+            # Mostly taken bucket, draw among its open questions directly
+            members = index.members[start:end]
+            position = int(self.rng.choice(members[self.open[members]]))
+        self.open[position] = False
+        self.counts[bucket] -= 1
+        self.last_key[bucket] = self.next_key[bucket]
+        self._redraw(bucket)
+        return index.store.questions[position]
+
+
+def select_vectorized(index, total_requested, requested_cats, requested_diffs, requested_types,
+                      retest_questions=(), excluded_ids=(), rng=None, clusters=None, admit=None):
+    """Vectorised equivalent of selector.select_questions over a VectorIndex.
+
+    rng is a numpy.random.Generator. With near-duplicate clusters, taking a
+    question drops the rest of its cluster from the draw. A question that
+    admit(q) refuses leaves the draw without being taken. Returns the same
+    Selection with actual_counts, substitutions and per-pass timings.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    selection = Selection(total_requested, requested_cats, requested_diffs, requested_types, clusters)
+    remaining = selection.remaining_quotas
+    started = time.perf_counter()
+    questions = index.store.questions
+
+    take_retests(selection, retest_questions)
+    draw = _Draw(index, excluded_ids, rng)
+
+    def take(q):
+        # The walk would skip the rest of q's cluster, so they leave the draw now
+        if clusters is not None:
+            for position in clusters.mates(q.index):
+                draw.remove(questions[position])
+        return q
+
+    def draw_next(bucket):
+        # Exposure control refuses some, they are out of the draw all the same
+        q = draw.take(bucket)
+        if admit is not None and not admit(q):
+            return None
+        return take(q)
+
+    for q in selection.selected:
+        draw.remove(take(q))
+    retests_done = time.perf_counter()
+    selection.timings['retest_pass'] = retests_done - started
+
+    def open_quotas():
+        # Per bucket "still has quota" masks for category, difficulty and type
+        return (index.quota_array(index.categories, remaining['category'])[index.bucket_category] > 0,
+                index.quota_array(index.difficulties, remaining['difficulty'])[index.bucket_difficulty] > 0,
+                index.quota_array(index.types, remaining['type'])[index.bucket_type] > 0)
+
+    # First pass: select questions that match all criteria
+    while not selection.full:
+        cat_ok, diff_ok, type_ok = open_quotas()
+        bucket = draw.next_bucket(cat_ok & diff_ok & type_ok)
+        if bucket is None:
+            break
+        q = draw_next(bucket)
+        if q is not None:
+            selection.take_exact(q)
+    first_pass_done = time.perf_counter()
+    selection.timings['first_pass'] = first_pass_done - retests_done
+
+    # Special handling for Medium difficulty substitutions
+    is_hard = np.array([d == 'Hard' for d in index.difficulties])[index.bucket_difficulty]
+    while not selection.full and selection.has_quota('difficulty', 'Medium'):
+        cat_ok, _, type_ok = open_quotas()
+        bucket = draw.next_bucket(is_hard & cat_ok & type_ok)
+        if bucket is None:
+            break
+        q = draw_next(bucket)
+        if q is not None:
+            selection.take_hard_for_medium(q)
+    medium_pass_done = time.perf_counter()
+    selection.timings['medium_substitution_pass'] = medium_pass_done - first_pass_done
+
+    # Second pass: fill remaining with questions that match any criteria
+    while not selection.full:
+        cat_ok, diff_ok, type_ok = open_quotas()
+        bucket = draw.next_bucket(cat_ok | diff_ok | type_ok)
+        if bucket is None:
+            break
+        q = draw_next(bucket)
+        if q is not None:
+            selection.take_closest(q)
+    selection.timings['fill_pass'] = time.perf_counter() - medium_pass_done
+
+    return selection